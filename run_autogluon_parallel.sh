@@ -18,7 +18,7 @@
 #SBATCH --propagate=NONE
 
 # Define job array
-#SBATCH --array=0-1351  # Adjust based on the number of methods
+#SBATCH --array=0-1351  # Adjust based on the number of manifest entries
 
 echo "Workingdir: $PWD"
 echo "Started at $(date)"
@@ -41,19 +41,11 @@ echo "Requirements installed"
 export PYTHONPATH=$PWD/src:$PYTHONPATH
 echo "PYTHONPATH set to $PYTHONPATH"
 
-# Define methods array
-directory_path="../datasets/feature_engineered_datasets/"
-
-# List all files in the directory and store them in an array
-methods=($(ls "$directory_path"))
-# Get the method name based on SLURM_ARRAY_TASK_ID
-method=${methods[$SLURM_ARRAY_TASK_ID]}
-
-# Run the job with the specified method
+# Run the job with the feature engineered dataset of the manifest entry SLURM_ARRAY_TASK_ID
 start=`date +%s`
 
-echo "Running Method: $method"
-python3 src/feature_engineering/run_feature_engineering_parallel.py --method $method
+echo "Running manifest entry: $SLURM_ARRAY_TASK_ID"
+python3 src/autogluon/run_autogluon_parallel.py --job $SLURM_ARRAY_TASK_ID
 
 end=`date +%s`
 runtime=$((end-start))
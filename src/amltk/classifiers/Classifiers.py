@@ -1,16 +1,12 @@
 import numpy as np
 
 from amltk.pipeline import Component, request
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.neural_network import MLPClassifier
-from sklearn.neighbors import KNeighborsClassifier
-from sklearn.svm import SVC
 
 from typing import Any
 from collections.abc import Mapping
 from ConfigSpace import Categorical, Integer, Float
 
-from lightgbm import LGBMClassifier, LGBMRegressor
+# The estimators are imported by the function that needs them, so only the chosen one is loaded
 
 
 def rf_config_transform(config: Mapping[str, Any], _: Any) -> dict[str, Any]:
@@ -21,6 +17,8 @@ def rf_config_transform(config: Mapping[str, Any], _: Any) -> dict[str, Any]:
 
 
 def get_rf_classifier():
+    from sklearn.ensemble import RandomForestClassifier
+
     return Component(
         item=RandomForestClassifier,
         config_transform=rf_config_transform,
@@ -53,6 +51,8 @@ def get_rf_classifier():
 
 
 def get_mlp_classifier():
+    from sklearn.neural_network import MLPClassifier
+
     return Component(
         item=MLPClassifier,
         space={
@@ -72,6 +72,8 @@ def get_mlp_classifier():
 
 
 def get_svc_classifier():
+    from sklearn.svm import SVC
+
     return Component(
         item=SVC,
         config_transform=rf_config_transform,
@@ -93,6 +95,8 @@ def get_svc_classifier():
 
 
 def get_knn_classifier():
+    from sklearn.neighbors import KNeighborsClassifier
+
     return Component(
         item=KNeighborsClassifier,
         space={
@@ -109,6 +113,8 @@ def get_knn_classifier():
 
 
 def get_lgbm_classifier():
+    from lightgbm import LGBMClassifier
+
     return Component(
         item=LGBMClassifier,
         name="lgbm-classifier",
@@ -138,6 +144,8 @@ def get_lgbm_classifier():
 
 
 def get_lgbm_regressor():
+    from lightgbm import LGBMRegressor
+
     return Component(
         item=LGBMRegressor,
         name="lgbm-regressor",
@@ -0,0 +1,58 @@
+from amltk.pipeline import Choice, Component, Sequential, Split
+from sklearn.impute import SimpleImputer
+from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder
+
+from src.amltk.classifiers.Classifiers import get_knn_classifier, get_lgbm_classifier, get_lgbm_regressor, \
+    get_mlp_classifier, get_rf_classifier, get_svc_classifier
+
+# Estimator of every pipeline name. The pipelines are only built, and the estimator modules only imported,
+# by `get_pipeline`, so processes that do not use a pipeline never pay for it.
+pipeline_estimators = {
+    "rf_pipeline": get_rf_classifier,
+    "mlp_pipeline": get_mlp_classifier,  # works on dataset 2 (not for continuous data)
+    "svc_pipeline": get_svc_classifier,  # works on dataset 2 (not on continuous data)
+    "knn_pipeline": get_knn_classifier,  # works on dataset 2 (not on continuous data)
+    "lgbm_classifier_pipeline": get_lgbm_classifier,
+    "lgbm_regressor_pipeline": get_lgbm_regressor,
+}
+
+
+def get_preprocessing():
+    return Split(
+        {
+            "numerical": Component(SimpleImputer, space={"strategy": ["mean", "median"]}),
+            "categorical": [
+                Component(
+                    OrdinalEncoder,
+                    config={
+                        "categories": "auto",
+                        "handle_unknown": "use_encoded_value",
+                        "unknown_value": -1,
+                        "encoded_missing_value": -2,
+                    },
+                ),
+                Choice(
+                    "passthrough",
+                    Component(
+                        OneHotEncoder,
+                        space={"max_categories": (2, 20)},
+                        config={
+                            "categories": "auto",
+                            "drop": None,
+                            "sparse_output": False,
+                            "handle_unknown": "infrequent_if_exist",
+                        },
+                    ),
+                    name="one_hot",
+                ),
+            ],
+        },
+        name="preprocessing",
+    )
+
+
+def get_pipeline(pipeline_name) -> Sequential:
+    """Build the preprocessing and estimator pipeline of the name, e.g. "lgbm_classifier_pipeline"."""
+    if pipeline_name not in pipeline_estimators:
+        raise ValueError(f"Unknown pipeline {pipeline_name}, choose one of {list(pipeline_estimators)}")
+    return Sequential(get_preprocessing(), pipeline_estimators[pipeline_name](), name=pipeline_name)
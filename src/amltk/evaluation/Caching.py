@@ -0,0 +1,29 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+from amltk import Node, Trial
+
+
+def get_data_key(X, y, splitter) -> str:
+    """Fingerprint of the data and the splits, so cached results of other datasets or seeds are never reused."""
+    data_hash = pd.util.hash_pandas_object(pd.DataFrame(X), index=False).sum()
+    target_hash = pd.util.hash_pandas_object(pd.Series(np.asarray(y)), index=False).sum()
+    return hashlib.sha1(repr((data_hash, target_hash, repr(splitter))).encode()).hexdigest()
+
+
+def get_preprocessing_key(data_key: str, trial: Trial, pipeline: Node, split: int, *estimator_params) -> str:
+    """Key of a split's intermediate result, shared by all configs with the same preprocessing.
+
+    The config of the estimator at the end of the pipeline is left out, only the given
+    `estimator_params` that the result depends on are part of the key.
+    """
+    estimator_prefix = f"{pipeline.name}:{pipeline.nodes[-1].name}:"
+    preprocessing_config = sorted(
+        (key, str(value)) for key, value in trial.config.items() if not key.startswith(estimator_prefix)
+    )
+    return hashlib.sha1(repr((data_key, split, preprocessing_config, estimator_params)).encode()).hexdigest()
+
+
+def take(data, index):
+    return data.iloc[index] if hasattr(data, "iloc") else data[index]
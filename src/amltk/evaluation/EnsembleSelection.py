@@ -0,0 +1,75 @@
+import numpy as np
+from sklearn.metrics import roc_auc_score
+
+from src.amltk.evaluation.Metrics import roc_auc_ovo_split_scores
+from src.amltk.storage.PredictionStore import PredictionStore
+
+
+def get_ensemble_score(y, predictions) -> float:
+    """ROC AUC (one-vs-one for multiclass) of averaged class probabilities."""
+    if predictions.shape[1] == 2:
+        return roc_auc_score(y, predictions[:, 1])
+    return roc_auc_score(y, predictions / predictions.sum(axis=1, keepdims=True), multi_class="ovo")
+
+
+def get_batch_scores(y, predictions) -> np.ndarray:
+    """`get_ensemble_score` of every set of predictions of shape (sets, rows, classes), in one pass."""
+    n_sets, n_rows, n_classes = predictions.shape
+    return roc_auc_ovo_split_scores(
+        np.tile(y, n_sets), predictions.reshape(n_sets * n_rows, n_classes), np.repeat(np.arange(n_sets), n_rows)
+    )
+
+
+def get_ensemble_selection(
+        store: PredictionStore,
+        y,
+        n_candidates=50,
+        ensemble_size=25,
+        batch_score_func=get_batch_scores,
+) -> tuple[dict[str, float], float, np.ndarray | None]:
+    """Greedy ensemble selection with replacement (Caruana et al., 2004) on the stored predictions.
+
+    Starting from the best single trial, the trial whose addition gives the best out-of-fold
+    score of the averaged probabilities is added `ensemble_size` times. Only the
+    `n_candidates` best trials are considered, and no model is refitted. All candidates of a
+    step are scored at once by `batch_score_func`.
+
+    Returns:
+        The weight of every selected trial, the out-of-fold score of the ensemble and its
+        test predictions (None if the store holds no test predictions).
+    """
+    y = np.asarray(y)
+    n_trials = len(store)
+    if n_trials == 0:
+        return {}, np.nan, None
+    # Only rows with an out-of-fold prediction of every trial (all rows, unless trials were evaluated on a holdout split)
+    has_prediction = np.ones(len(y), dtype=bool)
+    for row in range(n_trials):
+        has_prediction &= ~np.isnan(store.get_oof_predictions([row])[0]).any(axis=1)
+    y = y[has_prediction]
+    single_scores = np.concatenate([
+        batch_score_func(y, store.get_oof_predictions(rows)[:, has_prediction].astype(np.float64))
+        for rows in np.array_split(np.arange(n_trials), int(np.ceil(n_trials / n_candidates)))
+    ])
+    candidates = np.argsort(-single_scores)[:n_candidates]
+    oof_predictions = store.get_oof_predictions(candidates)[:, has_prediction].astype(np.float64)
+
+    counts = np.zeros(len(candidates), dtype=int)
+    ensemble_sum = np.zeros(oof_predictions.shape[1:])
+    best_score = -np.inf
+    for size in range(1, ensemble_size + 1):
+        scores = batch_score_func(y, (ensemble_sum + oof_predictions) / size)
+        best = int(np.argmax(scores))
+        counts[best] += 1
+        ensemble_sum += oof_predictions[best]
+        best_score = scores[best]
+
+    selected = np.flatnonzero(counts)
+    weights = {store.names[candidates[i]]: float(counts[i] / ensemble_size) for i in selected}
+    test_predictions = None
+    if store.meta["n_test"] > 0:
+        test_predictions = np.tensordot(
+            counts[selected] / ensemble_size, store.get_test_predictions(candidates[selected]), axes=1
+        )
+    return weights, float(best_score), test_predictions
+
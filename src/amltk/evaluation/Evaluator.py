@@ -1,16 +1,27 @@
+from functools import partial
+
+import numpy as np
+
 from amltk import Trial, Node
 from amltk.sklearn import CVEvaluation
 
+from src.amltk.evaluation.Caching import take
+from src.amltk.evaluation.Instrumentation import pop_metric_predictions, record_split_times
+from src.amltk.evaluation.Resampling import get_resampling
+from src.amltk.storage.PredictionStore import add_split_predictions, store_trial_predictions
 
-def get_cv_evaluator(X, y, X_test, y_test, inner_fold_seed, on_trial_exception, task_hint,):
-    return CVEvaluation(
-        # Provide data, number of times to split, cross-validation and a hint of the task type
+
+def get_cv_evaluator(X, y, X_test, y_test, inner_fold_seed, on_trial_exception, task_hint, store_predictions=False,
+                     time_budget=None):
+    resampling, splitter = get_resampling(len(X), y, time_budget, task_hint, inner_fold_seed)
+    print(f"Evaluating trials by {resampling} resampling")
+    cv_evaluator = CVEvaluation(
+        # Provide data, the splitter chosen from the data and time budget, and a hint of the task type
         X=X,
         y=y,
         X_test=X_test,
         y_test=y_test,
-        splitter="cv",
-        n_splits=8,
+        splitter=splitter,
         task_hint=task_hint,
         # Seeding for reproducibility
         random_state=inner_fold_seed,
@@ -23,9 +34,9 @@ def get_cv_evaluator(X, y, X_test, y_test, inner_fold_seed, on_trial_exception,
         # Whether you want models to be store on disk under working_dir
         store_models=False,
         # A callback to be called at the end of each split
-        post_split=do_something_after_a_split_was_evaluated,
+        post_split=partial(do_something_after_a_split_was_evaluated, store_predictions=store_predictions),
         # Some callback that is called at the end of all fold evaluations
-        post_processing=do_something_after_a_complete_trial_was_evaluated,
+        post_processing=partial(do_something_after_a_complete_trial_was_evaluated, store_predictions=store_predictions),
         # Whether the post_processing callback requires models will require models, i.e.
         # to compute some bagged average over all fold models. If `False` will discard models eagerly
         # to save space.
@@ -37,18 +48,95 @@ def get_cv_evaluator(X, y, X_test, y_test, inner_fold_seed, on_trial_exception,
         # such as `sample_weight`
         params=None,
     )
+    cv_evaluator.fn = partial(evaluate_with_resampling, fn=cv_evaluator.fn, resampling=resampling)
+    cv_evaluator.resampling = resampling
+    return cv_evaluator
+
+
+def evaluate_with_resampling(trial: Trial, pipeline: Node, *, fn, resampling) -> Trial.Report:
+    """Evaluate the trial with `fn` and record the resampling in the summary, unless `fn` records another one."""
+    trial.summary["evaluation"] = resampling
+    return fn(trial, pipeline)
+
+
+def get_evaluator(pipeline: Node, X, y, X_test, y_test, inner_fold_seed, on_trial_exception, task_hint,
+                  store_predictions=False, time_budget=None):
+    """Evaluator of the pipeline, with a faster evaluation for estimators that support one.
+
+    With `store_predictions`, the out-of-fold and test probabilities of every successful
+    trial are put into its bucket, see `PredictionStore.add`. SVC pipelines are scored by
+    their decision function and store no probabilities, so they are left out of ensemble
+    selection. The resampling is chosen by `get_resampling` from the data and the
+    `time_budget` in seconds.
+    """
+    cv_evaluator = get_cv_evaluator(X, y, X_test, y_test, inner_fold_seed, on_trial_exception, task_hint,
+                                    store_predictions, time_budget)
+    estimator = pipeline.nodes[-1].item
+    on_error = "raise" if on_trial_exception == "raise" else "fail"
+    # Dispatched by name, so only the evaluator of the estimator is imported
+    if estimator.__name__ == "KNeighborsClassifier":
+        from src.amltk.evaluation.KNNEvaluator import KNNEvaluation
+        evaluator = KNNEvaluation(cv_evaluator, on_error=on_error, store_predictions=store_predictions)
+    elif estimator.__name__ == "RandomForestClassifier":
+        from src.amltk.evaluation.OOBEvaluator import OOBEvaluation
+        evaluator = OOBEvaluation(cv_evaluator, on_error=on_error, store_predictions=store_predictions)
+    elif estimator.__name__ == "SVC":
+        from src.amltk.evaluation.SVCEvaluator import SVCEvaluation
+        if store_predictions:
+            print("SVC trials store no predictions, they are left out of ensemble selection")
+        evaluator = SVCEvaluation(cv_evaluator, on_error=on_error)
+    else:
+        return cv_evaluator
+    evaluator.fn = partial(evaluate_with_resampling, fn=evaluator.fn, resampling=cv_evaluator.resampling)
+    return evaluator
+
 
 def do_something_after_a_split_was_evaluated(
         trial: Trial,
         fold: int,
         info: CVEvaluation.PostSplitInfo,
+        store_predictions=False,
 ) -> CVEvaluation.PostSplitInfo:
+    # Before the split times, which drop the kept predictions
+    scored_predictions = pop_metric_predictions()
+    record_split_times(trial, fold)
+    if store_predictions:
+        val_predictions, test_predictions = get_scored_predictions(info, scored_predictions)
+        if val_predictions is None:
+            val_predictions = info.model.predict_proba(take(info.X, info.i_val))
+        if test_predictions is None and info.X_test is not None:
+            test_predictions = info.model.predict_proba(info.X_test)
+        add_split_predictions(trial, len(info.X), info.i_val, val_predictions, test_predictions)
     return info
 
 
+def get_scored_predictions(info: CVEvaluation.PostSplitInfo, scored_predictions) -> tuple:
+    """The validation and test probabilities the metric scored in the split, None where they were not kept.
+
+    CVEvaluation scores the train, validation and test rows in this order, so the test
+    probabilities are the last ones and the validation probabilities come right before.
+    Binary scorers get the probability of the positive class only.
+    """
+    def get_probabilities(predictions, n_rows):
+        predictions = np.asarray(predictions)
+        if len(predictions) != n_rows:
+            return None
+        return np.column_stack([1 - predictions, predictions]) if predictions.ndim == 1 else predictions
+
+    val_predictions, test_predictions = None, None
+    if info.X_test is not None and scored_predictions:
+        test_predictions = get_probabilities(scored_predictions.pop(), len(info.X_test))
+    if scored_predictions:
+        val_predictions = get_probabilities(scored_predictions.pop(), len(info.i_val))
+    return val_predictions, test_predictions
+
+
 def do_something_after_a_complete_trial_was_evaluated(
         report: Trial.Report,
         pipeline: Node,
         info: CVEvaluation.CompleteEvalInfo,
+        store_predictions=False,
 ) -> Trial.Report:
+    if store_predictions:
+        store_trial_predictions(report)
     return report
\ No newline at end of file
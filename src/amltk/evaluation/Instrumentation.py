@@ -0,0 +1,164 @@
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from amltk import Trial
+from sklearn.metrics import make_scorer
+
+from src.amltk.storage.Parquet import PartWriter
+
+# Durations of the metric calls since the last split, filled inside the worker process
+_metric_times: list[float] = []
+# Probabilities the metric calls since the last split were given, in the order of the calls
+_metric_predictions: list[np.ndarray] = []
+
+
+class TimedScoreFunction:
+    """Score function wrapper that records how long the metric itself takes.
+
+    With `keep_predictions`, the predictions it scores are kept until `pop_metric_predictions`,
+    so the probabilities of a split can be stored without predicting again.
+    """
+
+    def __init__(self, score_func, keep_predictions=False):
+        self.score_func = score_func
+        self.keep_predictions = keep_predictions
+        self.__name__ = getattr(score_func, "__name__", "score_func")
+
+    def __call__(self, y_true, y_pred, **kwargs):
+        if self.keep_predictions:
+            _metric_predictions.append(y_pred)
+        start_time = time.perf_counter()
+        score = self.score_func(y_true, y_pred, **kwargs)
+        _metric_times.append(time.perf_counter() - start_time)
+        return score
+
+
+def get_timed_scorer(score_func, response_method, greater_is_better=True, **kwargs):
+    """Like `make_scorer`, but the time spent in `score_func` is recorded for every split.
+
+    `get_timed_scorer(roc_auc_score, "predict_proba", multi_class="ovo")` scores exactly
+    like `get_scorer("roc_auc_ovo")`.
+    """
+    return make_scorer(
+        TimedScoreFunction(score_func, keep_predictions=response_method == "predict_proba"),
+        response_method=response_method,
+        greater_is_better=greater_is_better,
+        **kwargs,
+    )
+
+
+def start_trial(trial: Trial) -> None:
+    """Mark the start of a trial inside the worker."""
+    _metric_times.clear()
+    _metric_predictions.clear()
+    trial.summary["started_at"] = time.time()
+
+
+def record_split_times(trial: Trial, fold: int) -> None:
+    """Record the fit, predict and metric time of the split that was just evaluated.
+
+    The profiler of the trial only keeps the intervals of the latest split, so this
+    has to be called from the `post_split` callback. Predict time is the time of all
+    scoring calls (train, val and test) without the time spent in the metric.
+    """
+    profiles = trial.profiles
+    fit_time = profiles["cv:fit"].time.duration if "cv:fit" in profiles else np.nan
+    score_time = sum(
+        profiles[key].time.duration
+        for key in ("cv:train_score", "cv:score", "cv:test_score")
+        if key in profiles
+    )
+    metric_time = pop_metric_time()
+    set_split_times(trial, fold, fit_time, score_time - metric_time, metric_time)
+
+
+def pop_metric_time() -> float:
+    """Time spent in timed metrics since the last call.
+
+    Called once per split by every evaluator, so it also drops the probabilities kept since
+    then. A `post_split` callback that stores them has to `pop_metric_predictions` first.
+    """
+    metric_time = sum(_metric_times)
+    _metric_times.clear()
+    _metric_predictions.clear()
+    return metric_time
+
+
+def pop_metric_predictions() -> list[np.ndarray]:
+    """Probabilities scored by timed metrics since the last call, in the order of the calls."""
+    predictions = list(_metric_predictions)
+    _metric_predictions.clear()
+    return predictions
+
+
+def set_split_times(trial: Trial, fold: int, fit_time, predict_time, metric_time) -> None:
+    trial.summary[f"split_{fold}:fit_time"] = fit_time
+    trial.summary[f"split_{fold}:predict_time"] = max(0.0, predict_time)
+    trial.summary[f"split_{fold}:metric_time"] = metric_time
+
+
+class AnytimeLog:
+    """Incrementally written log of trial timings and the incumbent over wall-clock time.
+
+    One record is written per finished trial, holding when it was submitted, started and
+    ended, its queue wait, the fit time of each fold, the predict and metric time, its
+    value and the incumbent value at that moment.
+    """
+
+    def __init__(self, directory, dataset, method, fold, metric_name, minimize=False, **writer_kwargs):
+        self.writer = PartWriter(directory, **writer_kwargs)
+        self.dataset = dataset
+        self.method = method
+        self.fold = fold
+        self.metric_name = metric_name
+        self.minimize = minimize
+        self.run_start = time.time()
+        self.incumbent = np.nan
+
+    def add(self, report: Trial.Report) -> None:
+        summary = report.summary
+        submitted = report.trial.created_at.timestamp()
+        started = summary.get("started_at", np.nan)
+        ended = report.reported_at.timestamp()
+        n_splits = len([key for key in summary if key.endswith(":fit_time")])
+        fit_times = [float(summary[f"split_{i}:fit_time"]) for i in range(n_splits)]
+        predict_time = float(sum(summary[f"split_{i}:predict_time"] for i in range(n_splits)))
+        metric_time = float(sum(summary[f"split_{i}:metric_time"] for i in range(n_splits)))
+
+        value = report.values.get(self.metric_name, np.nan)
+        if not np.isnan(value) and (
+            np.isnan(self.incumbent) or (value < self.incumbent if self.minimize else value > self.incumbent)
+        ):
+            self.incumbent = value
+
+        self.writer.append({
+            "dataset": self.dataset,
+            "method": self.method,
+            "fold": self.fold,
+            "trial": report.name,
+            "status": str(report.status),
+            "submitted": submitted,
+            "started": started,
+            "ended": ended,
+            "elapsed": ended - self.run_start,
+            "queue_wait": started - submitted,
+            "fit_times": fit_times,
+            "fit_time": float(sum(fit_times)),
+            "predict_time": predict_time,
+            "metric_time": metric_time,
+            "overhead_time": (ended - started) - sum(fit_times) - predict_time - metric_time,
+            "value": value,
+            "incumbent": self.incumbent,
+        })
+
+    def close(self) -> None:
+        self.writer.flush()
+
+
+def load_anytime_log(directory) -> pd.DataFrame:
+    """Read a log written by `AnytimeLog`, ordered by the end of the trials."""
+    if not Path(directory).is_dir():
+        return pd.DataFrame()
+    return pd.read_parquet(directory).sort_values("ended").reset_index(drop=True)
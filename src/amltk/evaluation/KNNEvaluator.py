@@ -0,0 +1,228 @@
+import os
+import time
+from collections import defaultdict
+from functools import partial
+from pathlib import Path
+
+import amltk.randomness
+import numpy as np
+from amltk import Node, Trial
+from amltk.exceptions import TrialError
+from amltk.sklearn import CVEvaluation
+from sklearn.base import BaseEstimator, ClassifierMixin, clone
+from sklearn.metrics import get_scorer
+from sklearn.neighbors import NearestNeighbors
+
+from src.amltk.evaluation.Caching import get_data_key, get_preprocessing_key, take
+from src.amltk.evaluation.Instrumentation import pop_metric_time, set_split_times
+from src.amltk.storage.PredictionStore import add_split_predictions, store_trial_predictions
+
+# Neighbour graphs already loaded or computed by this worker process
+_graphs: dict[str, dict[str, np.ndarray]] = {}
+
+
+class PrecomputedKNeighborsClassifier(ClassifierMixin, BaseEstimator):
+    """k-nearest neighbours classifier on a precomputed neighbour graph.
+
+    Instead of feature rows, `predict_proba` takes the graph of the query points, i.e.
+    the distances and the indices of their `k_max` nearest training points side by side.
+    Any `n_neighbors <= k_max` is answered from the first columns of the graph in
+    O(n * k), with the same votes as `KNeighborsClassifier`.
+    """
+
+    def __init__(self, n_neighbors=5, weights="uniform"):
+        self.n_neighbors = n_neighbors
+        self.weights = weights
+
+    def fit(self, X, y):
+        """Fit on the labels of the training points, X is ignored."""
+        self.classes_, self._y = np.unique(np.asarray(y), return_inverse=True)
+        return self
+
+    def predict_proba(self, X):
+        k_max = X.shape[1] // 2
+        if self.n_neighbors > k_max:
+            raise ValueError(f"The graph holds {k_max} neighbours, but {self.n_neighbors} were requested")
+        distances = X[:, :self.n_neighbors]
+        indices = X[:, k_max:k_max + self.n_neighbors].astype(np.intp)
+        if self.weights == "distance":
+            # Training points at distance zero get all the weight, as in sklearn
+            with np.errstate(divide="ignore"):
+                weights = 1.0 / distances
+            inf_mask = np.isinf(weights)
+            inf_row = np.any(inf_mask, axis=1)
+            weights[inf_row] = inf_mask[inf_row]
+        else:
+            weights = np.ones_like(distances)
+        all_rows = np.arange(len(X))
+        labels = self._y[indices]
+        probabilities = np.zeros((len(X), len(self.classes_)))
+        for i in range(self.n_neighbors):
+            probabilities[all_rows, labels[:, i]] += weights[:, i]
+        return probabilities / probabilities.sum(axis=1)[:, np.newaxis]
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+def compute_neighbour_graph(preprocessor, knn, X_train, y_train, X_queries: dict, k) -> dict[str, np.ndarray]:
+    """Fit the preprocessing and compute the k nearest training points of every query set."""
+    preprocessor = clone(preprocessor)
+    Xt_train = preprocessor.fit_transform(X_train, y_train)
+    neighbours = NearestNeighbors(
+        n_neighbors=min(k, len(Xt_train)),
+        algorithm=knn.algorithm,
+        leaf_size=knn.leaf_size,
+        metric=knn.metric,
+        p=knn.p,
+        metric_params=knn.metric_params,
+        n_jobs=knn.n_jobs,
+    ).fit(Xt_train)
+    graph = {}
+    for name, X_query in X_queries.items():
+        # The training points are queried like in `KNeighborsClassifier.predict(X_train)`, including themselves
+        Xt_query = Xt_train if X_query is X_train else preprocessor.transform(X_query)
+        distances, indices = neighbours.kneighbors(Xt_query)
+        graph[name] = np.hstack([distances, indices.astype(distances.dtype)])
+    return graph
+
+
+def get_neighbour_graph(cache_dir: Path, key: str, k: int, compute) -> tuple[dict[str, np.ndarray], float]:
+    """Load the neighbour graph of the key from memory or disk, or compute and store it.
+
+    Returns:
+        The graph and the seconds spent computing it (0 if it was cached).
+    """
+    graph = _graphs.get(key)
+    path = cache_dir / f"{key}.npz"
+    if graph is None and path.is_file():
+        with np.load(path) as stored:
+            graph = {name: stored[name] for name in stored.files}
+    if graph is not None and all(query.shape[1] // 2 >= k for query in graph.values()):
+        _graphs[key] = graph
+        return graph, 0.0
+    start_time = time.perf_counter()
+    graph = compute(k)
+    compute_time = time.perf_counter() - start_time
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    # Written to a hidden name first, so other workers never load a half written graph
+    tmp_path = cache_dir / f".{key}-{os.getpid()}.npz"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **graph)
+    tmp_path.rename(path)
+    _graphs[key] = graph
+    return graph, compute_time
+
+
+def knn_cross_validate_task(
+        trial: Trial,
+        pipeline: Node,
+        *,
+        X,
+        y,
+        X_test=None,
+        y_test=None,
+        splitter,
+        cache_dir: Path,
+        data_key: str,
+        k_max: int,
+        train_score: bool = False,
+        on_error="fail",
+        store_predictions: bool = False,
+) -> Trial.Report:
+    """Cross-validate a kNN pipeline like `CVEvaluation`, but from cached neighbour graphs."""
+    configured_pipeline = pipeline.configure(
+        trial.config,
+        params={"random_state": amltk.randomness.as_randomstate(trial.seed)},
+    )
+    estimator = configured_pipeline.build("sklearn")
+    preprocessor, knn = estimator[:-1], estimator[-1]
+    knn_params = knn.get_params()
+    scorers = {name: get_scorer(name) if metric.fn is None else metric.fn for name, metric in trial.metrics.items()}
+    scores = {"val": defaultdict(list), "train": defaultdict(list), "test": defaultdict(list)}
+    X, y = X.load(), y.load()
+    X_test = X_test.load() if X_test is not None else None
+    y_test = y_test.load() if y_test is not None else None
+    try:
+        with trial.profile("cv"):
+            for i, (train_index, val_index) in enumerate(splitter.split(X, y)):
+                X_train, y_train = take(X, train_index), take(y, train_index)
+                queries = {"val": (take(X, val_index), take(y, val_index))}
+                if train_score:
+                    queries["train"] = (X_train, y_train)
+                if X_test is not None:
+                    queries["test"] = (X_test, y_test)
+                graph, fit_time = get_neighbour_graph(
+                    cache_dir,
+                    get_preprocessing_key(
+                        data_key, trial, pipeline, i, knn_params["metric"], knn_params["p"], knn_params["metric_params"]
+                    ),
+                    max(k_max, knn.n_neighbors),
+                    partial(
+                        compute_neighbour_graph,
+                        preprocessor, knn, X_train, y_train, {name: X_query for name, (X_query, _) in queries.items()},
+                    ),
+                )
+                classifier = PrecomputedKNeighborsClassifier(knn.n_neighbors, knn.weights).fit(None, y_train)
+                pop_metric_time()
+                start_time = time.perf_counter()
+                for name, (_, y_query) in queries.items():
+                    for metric_name, scorer in scorers.items():
+                        score = scorer(classifier, graph[name], y_query)
+                        trial.summary[f"split_{i}:{name}_{metric_name}"] = score
+                        scores[name][metric_name].append(score)
+                score_time = time.perf_counter() - start_time
+                metric_time = pop_metric_time()
+                set_split_times(trial, i, fit_time, score_time - metric_time, metric_time)
+                if store_predictions:
+                    add_split_predictions(
+                        trial,
+                        len(X),
+                        val_index,
+                        classifier.predict_proba(graph["val"]),
+                        classifier.predict_proba(graph["test"]) if "test" in queries else None,
+                    )
+    except Exception as e:  # noqa: BLE001
+        trial.dump_exception(e)
+        report = trial.fail(e)
+        store_trial_predictions(report)
+        if on_error == "raise":
+            raise TrialError(f"Trial failed: {report}") from e
+        return report
+
+    for name, split_scores in scores.items():
+        for metric_name, values in split_scores.items():
+            trial.summary[f"{name}_mean_{metric_name}"] = float(np.mean(values))
+            trial.summary[f"{name}_std_{metric_name}"] = float(np.std(values))
+    report = trial.success(**{name: trial.summary[f"val_mean_{name}"] for name in trial.metrics})
+    store_trial_predictions(report)
+    return report
+
+
+class KNNEvaluation:
+    """Evaluation of kNN pipelines that computes every neighbour graph only once.
+
+    Uses the data and splits of a `CVEvaluation`. For every split, the `k_max` nearest
+    training points of the validation, training and test points are computed once per
+    preprocessing config and distance metric and cached on disk, so that all workers
+    share them. Trials that only differ in `n_neighbors`, `weights` or `algorithm` are
+    then scored without refitting anything.
+    """
+
+    def __init__(self, cv_evaluation: CVEvaluation, k_max=8, on_error="fail", store_predictions=False):
+        self.cache_dir = Path(cv_evaluation.bucket.path) / "neighbour_graphs"
+        data_key = get_data_key(cv_evaluation.X_stored.load(), cv_evaluation.y_stored.load(), cv_evaluation.splitter)
+        self.fn = partial(
+            knn_cross_validate_task,
+            X=cv_evaluation.X_stored,
+            y=cv_evaluation.y_stored,
+            X_test=cv_evaluation.X_test_stored,
+            y_test=cv_evaluation.y_test_stored,
+            splitter=cv_evaluation.splitter,
+            cache_dir=self.cache_dir,
+            data_key=data_key,
+            k_max=k_max,
+            train_score=cv_evaluation.train_score,
+            on_error=on_error,
+            store_predictions=store_predictions,
+        )
@@ -0,0 +1,126 @@
+import warnings
+
+import numpy as np
+from sklearn.exceptions import UndefinedMetricWarning
+
+
+def get_pair_wins(y_index, scores, groups, n_groups, n_classes, positive) -> np.ndarray:
+    """Count, per group and class b, the pairs of a `positive` class sample and a class b sample ranked correctly.
+
+    A sample wins against every sample of the same group with a lower score, ties count half.
+    All groups are ranked in a single sort of (group, score).
+
+    Returns:
+        The wins of the `positive` samples of every group against the samples of every class,
+        shape (n_groups, n_classes).
+    """
+    order = np.argsort(scores) if n_groups == 1 else np.lexsort((scores, groups))
+    scores, groups, y_index = scores[order], groups[order], y_index[order]
+    # Blocks of tied scores of the same group
+    new_block = np.ones(len(scores), dtype=bool)
+    new_block[1:] = (scores[1:] != scores[:-1]) | (groups[1:] != groups[:-1])
+    block = np.cumsum(new_block) - 1
+    n_blocks = block[-1] + 1
+    block_counts = np.bincount(block * n_classes + y_index, minlength=n_blocks * n_classes)
+    block_counts = block_counts.reshape(n_blocks, n_classes).astype(np.float64)
+    block_groups = groups[new_block]
+    group_starts = np.searchsorted(block_groups, np.arange(n_groups))
+    counts_before = np.cumsum(block_counts, axis=0) - block_counts
+    lower = counts_before - counts_before[group_starts][block_groups]
+    wins = block_counts[:, positive, np.newaxis] * (lower + 0.5 * block_counts)
+    pair_wins = np.zeros((n_groups, n_classes))
+    present = np.unique(block_groups)
+    pair_wins[present] = np.add.reduceat(wins, group_starts[present], axis=0)
+    return pair_wins
+
+
+def get_grouped_roc_auc_ovo(y_index, y_score, groups, n_groups) -> np.ndarray:
+    """One-vs-one ROC AUC (macro average) of every group, like `roc_auc_score(multi_class="ovo")`.
+
+    `y_index` are the column indices of the true classes. With two columns, the AUC of the
+    second column is returned, like the binary `roc_auc_score`. Pairs of classes that are not
+    both present in a group are left out of its average.
+    """
+    n_classes = y_score.shape[1]
+    class_counts = np.bincount(groups * n_classes + y_index, minlength=n_groups * n_classes)
+    class_counts = class_counts.reshape(n_groups, n_classes).astype(np.float64)
+    if n_classes == 2:
+        pair_wins = get_pair_wins(y_index, y_score[:, 1], groups, n_groups, 2, positive=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return pair_wins[:, 0] / (class_counts[:, 0] * class_counts[:, 1])
+
+    # AUC of class a against class b ranks the samples of both classes by the probability of a
+    auc = np.zeros((n_groups, n_classes, n_classes))
+    for a in range(n_classes):
+        auc[:, a] = get_pair_wins(y_index, y_score[:, a], groups, n_groups, n_classes, positive=a)
+    pair_counts = class_counts[:, :, np.newaxis] * class_counts[:, np.newaxis, :]
+    upper = np.triu(np.ones((n_classes, n_classes), dtype=bool), k=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pair_auc = (auc + auc.transpose(0, 2, 1)) / (2 * pair_counts)
+    has_pair = (pair_counts > 0) & upper
+    return np.where(has_pair, pair_auc, 0.0).sum(axis=(1, 2)) / has_pair.sum(axis=(1, 2))
+
+
+def roc_auc_ovo_score(y_true, y_score) -> float:
+    """Rank-based ROC AUC, the same as `roc_auc_score(y_true, y_score, multi_class="ovo")`.
+
+    All class pairs are scored from one sort per class, instead of one `roc_auc_score` per pair.
+    Can be used as `Metric(fn=get_timed_scorer(roc_auc_ovo_score, "predict_proba"))`.
+    """
+    y_true = np.asarray(y_true).ravel()
+    y_score = np.asarray(y_score, dtype=np.float64)
+    classes, y_index = np.unique(y_true, return_inverse=True)
+    if y_score.ndim == 1:
+        y_score = np.column_stack([-y_score, y_score])
+    elif len(classes) <= 2 and y_score.shape[1] <= 2:
+        # Binary scores must be those of the positive class, as in sklearn
+        raise ValueError(f"y should be a 1d array, got an array of shape {y_score.shape} instead.")
+    else:
+        if not np.allclose(1, y_score.sum(axis=1)):
+            raise ValueError(
+                "Target scores need to be probabilities for multiclass "
+                "roc_auc, i.e. they should sum up to 1.0 over classes"
+            )
+        if len(classes) != y_score.shape[1]:
+            raise ValueError("Number of classes in y_true not equal to the number of columns in 'y_score'")
+    if len(classes) < 2:
+        warnings.warn(
+            "Only one class is present in y_true. ROC AUC score is not defined in that case.",
+            UndefinedMetricWarning,
+        )
+        return np.nan
+    return float(get_grouped_roc_auc_ovo(y_index, y_score, np.zeros(len(y_true), dtype=np.intp), 1)[0])
+
+
+def roc_auc_ovo_split_scores(y_true, y_score, splits) -> np.ndarray:
+    """ROC AUC of every split (e.g. the folds of a trial) in one pass, `splits` holds the split of every sample."""
+    y_true = np.asarray(y_true).ravel()
+    y_score = np.asarray(y_score, dtype=np.float64)
+    if y_score.ndim == 1:
+        y_score = np.column_stack([-y_score, y_score])
+    _, y_index = np.unique(y_true, return_inverse=True)
+    split_names, split_index = np.unique(np.asarray(splits), return_inverse=True)
+    return get_grouped_roc_auc_ovo(y_index, y_score, split_index, len(split_names))
+
+
+def log_loss_score(y_true, y_pred) -> float:
+    """The same as `log_loss(y_true, y_pred)`, with the probabilities clipped to [eps, 1 - eps]."""
+    y_true = np.asarray(y_true).ravel()
+    y_pred = np.asarray(y_pred)
+    if y_pred.ndim == 1:
+        y_pred = np.column_stack([1 - y_pred, y_pred])
+    classes, y_index = np.unique(y_true, return_inverse=True)
+    if len(classes) != y_pred.shape[1]:
+        raise ValueError(
+            f"y_true and y_pred contain different number of classes {len(classes)}, {y_pred.shape[1]}"
+        )
+    eps = np.finfo(y_pred.dtype).eps
+    y_pred = np.clip(y_pred, eps, 1 - eps)
+    return float(-np.mean(np.log(y_pred[np.arange(len(y_true)), y_index])))
+
+
+def rmse_score(y_true, y_pred) -> float:
+    """The same as `root_mean_squared_error(y_true, y_pred)` for a single target."""
+    y_true = np.asarray(y_true, dtype=np.float64).ravel()
+    y_pred = np.asarray(y_pred, dtype=np.float64).ravel()
+    return float(np.sqrt(np.mean((y_true - y_pred) ** 2)))
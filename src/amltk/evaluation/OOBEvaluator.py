@@ -0,0 +1,120 @@
+import time
+from functools import partial
+
+import amltk.randomness
+import numpy as np
+from amltk import Node, Trial
+from amltk.exceptions import TrialError
+from amltk.sklearn import CVEvaluation
+from sklearn.metrics import get_scorer
+
+from src.amltk.evaluation.Instrumentation import pop_metric_time, set_split_times
+from src.amltk.evaluation.Precomputed import PrecomputedClassifier
+from src.amltk.storage.PredictionStore import add_split_predictions, store_trial_predictions
+
+
+def oob_evaluate_task(
+        trial: Trial,
+        pipeline: Node,
+        *,
+        X,
+        y,
+        X_test=None,
+        y_test=None,
+        cv_fn,
+        train_score: bool = False,
+        on_error="fail",
+        store_predictions: bool = False,
+) -> Trial.Report:
+    """Score a bagging pipeline by the out-of-bag predictions of a single fit on all data.
+
+    Configs without `bootstrap` have no out-of-bag samples and are cross-validated with `cv_fn`.
+    """
+    configured_pipeline = pipeline.configure(
+        trial.config,
+        params={"random_state": amltk.randomness.as_randomstate(trial.seed)},
+    )
+    estimator = configured_pipeline.build("sklearn")
+    step_name, forest = estimator.steps[-1]
+    if not forest.get_params().get("bootstrap", False):
+        trial.summary.setdefault("evaluation", "cv")
+        return cv_fn(trial, pipeline)
+
+    trial.summary["evaluation"] = "oob"
+    estimator.set_params(**{f"{step_name}__oob_score": True})
+    scorers = {name: get_scorer(name) if metric.fn is None else metric.fn for name, metric in trial.metrics.items()}
+    X, y = X.load(), y.load()
+    X_test = X_test.load() if X_test is not None else None
+    y_test = y_test.load() if y_test is not None else None
+    try:
+        with trial.profile("oob"):
+            start_time = time.perf_counter()
+            estimator.fit(X, y)
+            fit_time = time.perf_counter() - start_time
+
+            pop_metric_time()
+            start_time = time.perf_counter()
+            oob_predictions = forest.oob_decision_function_
+            # Samples that were in the bag of every tree have no out-of-bag prediction, their
+            # row is NaN or all zero depending on the sklearn version
+            has_prediction = np.nan_to_num(oob_predictions).sum(axis=1) > 0
+            oob_classifier = PrecomputedClassifier(forest.classes_).fit()
+            for name, scorer in scorers.items():
+                trial.summary[f"split_0:val_{name}"] = scorer(
+                    oob_classifier, oob_predictions[has_prediction], np.asarray(y)[has_prediction]
+                )
+                if train_score:
+                    trial.summary[f"split_0:train_{name}"] = scorer(estimator, X, y)
+                if X_test is not None:
+                    trial.summary[f"split_0:test_{name}"] = scorer(estimator, X_test, y_test)
+            score_time = time.perf_counter() - start_time
+            metric_time = pop_metric_time()
+            set_split_times(trial, 0, fit_time, score_time - metric_time, metric_time)
+            if store_predictions:
+                # Samples without out-of-bag prediction get the uniform prediction
+                oob_predictions = np.where(has_prediction[:, np.newaxis], oob_predictions, 1 / len(forest.classes_))
+                add_split_predictions(
+                    trial,
+                    len(X),
+                    np.arange(len(X)),
+                    oob_predictions,
+                    estimator.predict_proba(X_test) if X_test is not None else None,
+                )
+    except Exception as e:  # noqa: BLE001
+        trial.dump_exception(e)
+        report = trial.fail(e)
+        store_trial_predictions(report)
+        if on_error == "raise":
+            raise TrialError(f"Trial failed: {report}") from e
+        return report
+
+    for split_name in ("val", "train", "test"):
+        for name in scorers:
+            if f"split_0:{split_name}_{name}" in trial.summary:
+                trial.summary[f"{split_name}_mean_{name}"] = float(trial.summary[f"split_0:{split_name}_{name}"])
+                trial.summary[f"{split_name}_std_{name}"] = 0.0
+    report = trial.success(**{name: trial.summary[f"val_mean_{name}"] for name in trial.metrics})
+    store_trial_predictions(report)
+    return report
+
+
+class OOBEvaluation:
+    """Evaluation of random forests by their out-of-bag predictions instead of cross-validation.
+
+    With `bootstrap=True` every tree leaves out about a third of the samples, so a single fit
+    on all data gives a validation score for every sample, about `n_splits` times cheaper
+    than cross-validation. Configs with `bootstrap=False` fall back to the `CVEvaluation`.
+    """
+
+    def __init__(self, cv_evaluation: CVEvaluation, on_error="fail", store_predictions=False):
+        self.fn = partial(
+            oob_evaluate_task,
+            X=cv_evaluation.X_stored,
+            y=cv_evaluation.y_stored,
+            X_test=cv_evaluation.X_test_stored,
+            y_test=cv_evaluation.y_test_stored,
+            cv_fn=cv_evaluation.fn,
+            train_score=cv_evaluation.train_score,
+            on_error=on_error,
+            store_predictions=store_predictions,
+        )
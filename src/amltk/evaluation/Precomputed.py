@@ -0,0 +1,30 @@
+import numpy as np
+from sklearn.base import BaseEstimator, ClassifierMixin
+
+
+class PrecomputedClassifier(ClassifierMixin, BaseEstimator):
+    """Classifier whose input already are its predictions.
+
+    `predict_proba` and `decision_function` return X unchanged, so sklearn scorers can
+    score predictions that were computed elsewhere, e.g. out-of-bag probabilities:
+    `scorer(PrecomputedClassifier(classes), probabilities, y)`.
+    """
+
+    def __init__(self, classes=None):
+        self.classes = classes
+
+    def fit(self, X=None, y=None):
+        self.classes_ = np.asarray(self.classes) if self.classes is not None else np.unique(y)
+        return self
+
+    def predict_proba(self, X):
+        return np.asarray(X)
+
+    def decision_function(self, X):
+        return np.asarray(X)
+
+    def predict(self, X):
+        X = np.asarray(X)
+        if X.ndim == 1:
+            return self.classes_[(X > 0).astype(int)]
+        return self.classes_[np.argmax(X, axis=1)]
@@ -0,0 +1,128 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class TraceRecorder:
+    """Timed spans of the stages of a run, written as a Chrome trace-event JSON file.
+
+    Open the file in chrome://tracing or https://ui.perfetto.dev (loaded locally in the
+    browser). Without a path the recorder is disabled and `span` costs nothing, so the
+    runners can always wrap their stages in it.
+    """
+
+    def __init__(self, path=None):
+        self.path = None if path is None else Path(path)
+        self._events = []
+        self._start = time.perf_counter()
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    @contextmanager
+    def span(self, name, category="stage", **args):
+        """Record the time spent in the `with` block, `args` are shown with the span."""
+        if not self.enabled:
+            yield
+            return
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._events.append({
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": (start_time - self._start) * 1e6,  # microseconds
+                "dur": (time.perf_counter() - start_time) * 1e6,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": {key: str(value) for key, value in args.items()},
+            })
+            self.save()  # A killed run keeps the spans that finished
+
+    def move(self, path) -> None:
+        """Write the trace to `path` from now on, e.g. once the name of the dataset is known."""
+        if not self.enabled:
+            return
+        self.path.unlink(missing_ok=True)
+        self.path = Path(path)
+        self.save()
+
+    def save(self) -> None:
+        if not self.enabled:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "w") as f:
+            json.dump({"traceEvents": self._events, "displayTimeUnit": "ms"}, f)
+
+
+class StackSampler:
+    """Sampling profiler of the Python stacks of all threads of this process.
+
+    A thread records the stack of every other thread each `interval` seconds. `save`
+    writes them in the collapsed stack format ("outer;inner count" per line) of
+    flamegraph.pl, speedscope or inferno.
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self) -> "StackSampler":
+        self._thread = threading.Thread(target=self._sample, name="stack-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _sample(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def save(self, path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class SampledCall:
+    """Calls `fn` under a StackSampler and writes the collapsed stacks to `path`.
+
+    The sampler runs in the process that makes the call, so wrap the function that is
+    given to pynisher to profile the FE subprocess, e.g. `limit(SampledCall(fn, path), ...)`.
+    """
+
+    def __init__(self, fn, path, interval=0.01):
+        self.fn = fn
+        self.path = path
+        self.interval = interval
+
+    def __call__(self, *args, **kwargs):
+        sampler = StackSampler(self.interval)
+        try:
+            with sampler:
+                return self.fn(*args, **kwargs)
+        finally:
+            sampler.save(self.path)
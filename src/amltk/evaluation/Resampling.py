@@ -0,0 +1,39 @@
+import numpy as np
+from sklearn.model_selection import KFold, RepeatedKFold, RepeatedStratifiedKFold, ShuffleSplit, StratifiedKFold, \
+    StratifiedShuffleSplit
+
+holdout_rows = 50000  # From this size on, a single holdout split is precise enough
+large_rows = 10000  # From this size on, fewer folds are used, and holdout if the time budget is short
+small_rows = 2000  # Below this size, the k-fold estimate is repeated if the time budget allows it
+short_time_budget = 1800  # Seconds
+holdout_size = 0.2
+
+
+def get_resampling(n_rows, y=None, time_budget=None, task_hint="classification", seed=None) -> tuple[str, object]:
+    """Choose holdout, k-fold or repeated k-fold from the data size, class balance and time budget.
+
+    Large datasets give precise estimates from few validation splits, so their trials are
+    evaluated on a holdout split (or 5 folds), which leaves time for many more trials.
+    Small datasets give noisy estimates, so they get 5 folds repeated 3 times if the time
+    budget (in seconds, None for unlimited) is not short, medium ones get 8 folds.
+    Stratified splits never use more folds than the smallest class has samples.
+
+    Returns:
+        A name of the resampling for the history, e.g. "holdout", "8-fold" or "3x5-fold",
+        and the sklearn splitter.
+    """
+    stratify = "regression" not in task_hint and y is not None
+    min_class_count = int(np.unique(np.asarray(y), return_counts=True)[1].min()) if stratify else n_rows
+    short_time = time_budget is not None and time_budget < short_time_budget
+    if n_rows >= holdout_rows or (n_rows >= large_rows and short_time) or min_class_count < 2:
+        splitter_cls = StratifiedShuffleSplit if stratify and min_class_count >= 2 else ShuffleSplit
+        return "holdout", splitter_cls(n_splits=1, test_size=holdout_size, random_state=seed)
+
+    n_splits = min(5 if n_rows >= large_rows else 8, min_class_count)
+    if n_rows < small_rows and not short_time:
+        n_repeats = 3
+        n_splits = min(5, n_splits)
+        splitter_cls = RepeatedStratifiedKFold if stratify else RepeatedKFold
+        return f"{n_repeats}x{n_splits}-fold", splitter_cls(n_splits=n_splits, n_repeats=n_repeats, random_state=seed)
+    splitter_cls = StratifiedKFold if stratify else KFold
+    return f"{n_splits}-fold", splitter_cls(n_splits=n_splits, shuffle=True, random_state=seed)
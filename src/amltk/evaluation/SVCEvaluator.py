@@ -0,0 +1,248 @@
+import time
+from collections import OrderedDict, defaultdict
+from functools import partial
+
+import amltk.randomness
+import numpy as np
+from amltk import History, Metric, Node, Trial
+from amltk.exceptions import TrialError
+from amltk.sklearn import CVEvaluation
+from scipy.special import softmax
+from sklearn.base import clone
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.metrics import get_scorer, roc_auc_score
+from sklearn.metrics.pairwise import pairwise_kernels
+
+from src.amltk.evaluation.Caching import get_data_key, get_preprocessing_key, take
+from src.amltk.evaluation.Instrumentation import get_timed_scorer, pop_metric_predictions, pop_metric_time, \
+    set_split_times
+from src.amltk.evaluation.Precomputed import PrecomputedClassifier
+
+# Kernel matrices computed by this worker process, least recently used first
+_kernels: OrderedDict[str, dict[str, np.ndarray]] = OrderedDict()
+kernel_cache_size = 2 ** 30  # Bytes of kernel matrices a worker keeps
+
+
+def decision_roc_auc_score(y_true, y_score, **kwargs):
+    """ROC AUC of decision function values, multiclass values are turned into scores that sum to one.
+
+    Binary AUCs equal those of Platt scaled probabilities, as the scaling is monotone. The
+    multiclass scores are the softmax of the one-vs-rest decision values, which ranks the
+    samples differently than calibrated probabilities, so multiclass SVC trial scores only
+    compare SVC configs with each other. The test score of the final config is computed
+    from calibrated probabilities, see `get_calibrated_result`.
+    """
+    y_score = np.asarray(y_score)
+    if y_score.ndim == 2:
+        y_score = softmax(y_score, axis=1)
+    return roc_auc_score(y_true, y_score, **kwargs)
+
+
+def get_decision_scorer(metric_name, scorer):
+    """Scorer that uses `decision_function` instead of `predict_proba` for the ROC AUC metrics."""
+    if metric_name in ("roc_auc", "roc_auc_ovo", "roc_auc_ovr"):
+        multi_class = "ovo" if metric_name == "roc_auc_ovo" else "ovr"
+        return get_timed_scorer(decision_roc_auc_score, "decision_function", multi_class=multi_class)
+    return scorer
+
+
+def get_gamma(gamma, X) -> float:
+    """Numeric gamma like SVC computes it for "scale" and "auto"."""
+    if gamma == "scale":
+        variance = X.var()
+        return 1.0 / (X.shape[1] * variance) if variance != 0 else 1.0
+    elif gamma == "auto":
+        return 1.0 / X.shape[1]
+    return gamma
+
+
+def compute_kernels(preprocessor, svc_params, X_train, y_train, X_queries: dict) -> dict[str, np.ndarray]:
+    """Fit the preprocessing and compute the kernel matrix of the training points with every query set."""
+    preprocessor = clone(preprocessor)
+    Xt_train = np.asarray(preprocessor.fit_transform(X_train, y_train), dtype=float)
+    kernel = svc_params["kernel"]
+    kernel_params = {}
+    if kernel in ("rbf", "poly", "sigmoid"):
+        kernel_params["gamma"] = get_gamma(svc_params["gamma"], Xt_train)
+    if kernel in ("poly", "sigmoid"):
+        kernel_params["coef0"] = svc_params["coef0"]
+    if kernel == "poly":
+        kernel_params["degree"] = svc_params["degree"]
+    kernels = {}
+    for name, X_query in X_queries.items():
+        Xt_query = Xt_train if X_query is X_train else np.asarray(preprocessor.transform(X_query), dtype=float)
+        kernels[name] = pairwise_kernels(Xt_query, Xt_train, metric=kernel, **kernel_params)
+    return kernels
+
+
+def get_kernels(key: str, compute) -> tuple[dict[str, np.ndarray], float]:
+    """Get the kernel matrices of the key from the cache of the worker, or compute them.
+
+    Returns:
+        The kernel matrices and the seconds spent computing them (0 if they were cached).
+    """
+    if key in _kernels:
+        _kernels.move_to_end(key)
+        return _kernels[key], 0.0
+    start_time = time.perf_counter()
+    kernels = compute()
+    compute_time = time.perf_counter() - start_time
+    _kernels[key] = kernels
+    while sum(matrix.nbytes for matrices in _kernels.values() for matrix in matrices.values()) > kernel_cache_size:
+        if len(_kernels) == 1:
+            break
+        _kernels.popitem(last=False)
+    return kernels, compute_time
+
+
+def svc_cross_validate_task(
+        trial: Trial,
+        pipeline: Node,
+        *,
+        X,
+        y,
+        X_test=None,
+        y_test=None,
+        splitter,
+        data_key: str,
+        train_score: bool = False,
+        on_error="fail",
+) -> Trial.Report:
+    """Cross-validate an SVC pipeline like `CVEvaluation`, scoring ROC AUC by the decision function.
+
+    The SVC is fitted without `probability=True`, which saves its internal 5-fold Platt
+    scaling. Kernel matrices are cached per split, preprocessing config and kernel, and
+    shared by configs that only differ in `C`, if all matrices of a split fit into the cache.
+    """
+    configured_pipeline = pipeline.configure(
+        trial.config,
+        params={"random_state": amltk.randomness.as_randomstate(trial.seed)},
+    )
+    estimator = configured_pipeline.build("sklearn")
+    # Multiclass decision values of every class against the rest, see decision_roc_auc_score
+    estimator.set_params(**{
+        f"{estimator.steps[-1][0]}__probability": False,
+        f"{estimator.steps[-1][0]}__decision_function_shape": "ovr",
+    })
+    preprocessor, svc = estimator[:-1], estimator[-1]
+    svc_params = svc.get_params()
+    scorers = {
+        name: get_decision_scorer(name, get_scorer(name) if metric.fn is None else metric.fn)
+        for name, metric in trial.metrics.items()
+    }
+    scores = {"val": defaultdict(list), "train": defaultdict(list), "test": defaultdict(list)}
+    X, y = X.load(), y.load()
+    X_test = X_test.load() if X_test is not None else None
+    y_test = y_test.load() if y_test is not None else None
+    try:
+        with trial.profile("cv"):
+            for i, (train_index, val_index) in enumerate(splitter.split(X, y)):
+                X_train, y_train = take(X, train_index), take(y, train_index)
+                queries = {"val": (take(X, val_index), take(y, val_index))}
+                if train_score:
+                    queries["train"] = (X_train, y_train)
+                if X_test is not None:
+                    queries["test"] = (X_test, y_test)
+
+                # The kernel of the training points is needed for fitting, even without train scores
+                kernel_queries = {"train": X_train, **{name: X_query for name, (X_query, _) in queries.items()}}
+                n_kernel_rows = sum(len(X_query) for X_query in kernel_queries.values())
+                start_time = time.perf_counter()
+                if n_kernel_rows * len(X_train) * 8 <= kernel_cache_size:
+                    kernel = svc_params["kernel"]
+                    kernels, _ = get_kernels(
+                        get_preprocessing_key(
+                            data_key, trial, pipeline, i,
+                            kernel,
+                            svc_params["gamma"] if kernel != "linear" else None,
+                            svc_params["coef0"] if kernel in ("poly", "sigmoid") else None,
+                            svc_params["degree"] if kernel == "poly" else None,
+                        ),
+                        partial(compute_kernels, preprocessor, svc_params, X_train, y_train, kernel_queries),
+                    )
+                    model = clone(svc).set_params(kernel="precomputed").fit(kernels["train"], y_train)
+                    predictions = {name: model.decision_function(kernels[name]) for name in queries}
+                else:
+                    model = clone(estimator).fit(X_train, y_train)
+                    predictions = {name: model.decision_function(X_query) for name, (X_query, _) in queries.items()}
+                fit_time = time.perf_counter() - start_time
+
+                classifier = PrecomputedClassifier(model.classes_).fit()
+                pop_metric_time()
+                start_time = time.perf_counter()
+                for name, (_, y_query) in queries.items():
+                    for metric_name, scorer in scorers.items():
+                        score = scorer(classifier, predictions[name], y_query)
+                        trial.summary[f"split_{i}:{name}_{metric_name}"] = score
+                        scores[name][metric_name].append(score)
+                score_time = time.perf_counter() - start_time
+                metric_time = pop_metric_time()
+                set_split_times(trial, i, fit_time, score_time - metric_time, metric_time)
+    except Exception as e:  # noqa: BLE001
+        trial.dump_exception(e)
+        report = trial.fail(e)
+        if on_error == "raise":
+            raise TrialError(f"Trial failed: {report}") from e
+        return report
+
+    for name, split_scores in scores.items():
+        for metric_name, values in split_scores.items():
+            trial.summary[f"{name}_mean_{metric_name}"] = float(np.mean(values))
+            trial.summary[f"{name}_std_{metric_name}"] = float(np.std(values))
+    return trial.success(**{name: trial.summary[f"val_mean_{name}"] for name in trial.metrics})
+
+
+def get_calibrated_svc(pipeline: Node, config: dict, X, y, seed=None):
+    """Fit the chosen SVC config on all data, with Platt scaled probabilities like `probability=True`."""
+    configured_pipeline = pipeline.configure(config, params={"random_state": amltk.randomness.as_randomstate(seed)})
+    estimator = configured_pipeline.build("sklearn")
+    step_name, svc = estimator.steps[-1]
+    calibrated_svc = CalibratedClassifierCV(clone(svc).set_params(probability=False), method="sigmoid", ensemble=False)
+    estimator.set_params(**{step_name: calibrated_svc})
+    return estimator.fit(X, y)
+
+
+def get_calibrated_result(history: History, pipeline: Node, metric: Metric, X, y, X_test, y_test, seed=None) -> dict | None:
+    """Refit the best config of an SVC run with calibrated probabilities and score it on the test data.
+
+    The test score is computed from probabilities by `metric.fn`, like the scores of the
+    other pipelines. None if no trial succeeded.
+    """
+    successful = history.filter(lambda report: report.status is Trial.Status.SUCCESS)
+    if len(successful) == 0:
+        return None
+    best = successful.best(metric)
+    estimator = get_calibrated_svc(pipeline, best.config, X, y, seed)
+    scorer = get_scorer(metric.name) if metric.fn is None else metric.fn
+    test_score = float(scorer(estimator, X_test, y_test))
+    pop_metric_predictions()  # kept by a timed scorer, not stored for the refit
+    return {
+        "trial": best.name,
+        "config": best.config,
+        f"val_{metric.name}": best.values[metric.name],
+        f"test_{metric.name}": test_score,
+    }
+
+
+class SVCEvaluation:
+    """Evaluation of SVC pipelines without the Platt scaling of `probability=True`.
+
+    Uses the data and splits of a `CVEvaluation`. ROC AUC is computed from the decision
+    function, and kernel matrices are shared between configs with the same preprocessing,
+    kernel and gamma on the same split. Calibrated probabilities are only computed for the
+    final config, see `get_calibrated_result`.
+    """
+
+    def __init__(self, cv_evaluation: CVEvaluation, on_error="fail"):
+        data_key = get_data_key(cv_evaluation.X_stored.load(), cv_evaluation.y_stored.load(), cv_evaluation.splitter)
+        self.fn = partial(
+            svc_cross_validate_task,
+            X=cv_evaluation.X_stored,
+            y=cv_evaluation.y_stored,
+            X_test=cv_evaluation.X_test_stored,
+            y_test=cv_evaluation.y_test_stored,
+            splitter=cv_evaluation.splitter,
+            data_key=data_key,
+            train_score=cv_evaluation.train_score,
+            on_error=on_error,
+        )
@@ -0,0 +1,158 @@
+from functools import partial
+from pathlib import Path
+from typing import Literal
+
+from amltk import History, Metric, Node, Scheduler, Trial
+
+from src.amltk.evaluation.Instrumentation import start_trial
+from src.amltk.resources.Cores import CoreAllocation, core_quota
+from src.amltk.resources.Memory import MemoryBudget, MemoryEstimator
+
+
+def evaluate_with_threads(trial: Trial, pipeline: Node, *, target, n_jobs: int) -> Trial.Report:
+    """Run the target under a core quota of n_jobs, which limits the BLAS/OpenMP thread pools of the worker."""
+    start_trial(trial)
+    with core_quota(n_jobs):
+        return target(trial, pipeline)
+
+
+def get_n_jobs_key(pipeline: Node) -> str | None:
+    """Config key of the `n_jobs` parameter of the estimator at the end of the pipeline, if it has one."""
+    estimator = pipeline.nodes[-1]
+    if estimator.config is None or "n_jobs" not in estimator.config:
+        return None
+    return f"{pipeline.name}:{estimator.name}:n_jobs"
+
+
+def optimize(
+        pipeline: Node,
+        target,
+        metric: Metric,
+        optimizer_cls,
+        allocation: CoreAllocation,
+        *,
+        seed: int,
+        max_trials: int,
+        timeout: float,
+        working_dir: str | Path | None = None,
+        on_trial_exception: Literal["raise", "end", "continue"] = "raise",
+        display: bool = False,
+        wait: bool = True,
+        on_report=None,
+        memory_budget: MemoryBudget | None = None,
+        memory_estimator: MemoryEstimator | None = None,
+        optimizer_kwargs: dict | None = None,
+) -> History:
+    """Optimize the pipeline like `pipeline.optimize`, but with an adaptive split of the cores.
+
+    A process pool with `allocation.n_workers` processes is created and as many trials are
+    evaluated at once, each with `allocation.n_jobs` estimator threads. When the split moves
+    to fewer workers, fewer trials are submitted, when it moves to more workers than the pool
+    has processes, the pool size stays the limit. The
+    thread count of a trial is written to its config, so it is recorded in the history.
+    Estimators without an `n_jobs` parameter only get their BLAS/OpenMP threads limited.
+    Trials of configs the optimizer already has a report for are not evaluated again.
+    Reports of an earlier run are replayed (see `RandomSearch.get_cached_report`), while
+    duplicates of a config of this run are dropped, they are neither added to the history
+    nor passed to `on_report` nor counted towards `max_trials`.
+
+    With a memory budget, a trial is only submitted while its estimated memory fits next
+    to the running trials, otherwise it waits for them to finish. Trials that exceed the
+    whole budget are not run, but recorded as failed with a `MemoryError`.
+
+    Args:
+        pipeline: The pipeline to optimize.
+        target: The evaluation function, e.g. `evaluator.fn`.
+        metric: The metric to optimize.
+        optimizer_cls: The optimizer class, e.g. `RandomSearch`.
+        allocation: The split of cores between workers and estimator threads.
+        seed: The seed of the optimizer.
+        max_trials: The maximum number of trials to evaluate.
+        timeout: The time budget in seconds.
+        working_dir: The directory of the trial buckets.
+        on_trial_exception: What to do with failed trials, as in `pipeline.optimize`.
+        display: Whether to display the scheduler.
+        wait: Whether to wait for running trials after the timeout.
+        on_report: Called with every report as soon as it arrives, e.g. `AnytimeLog.add`.
+        memory_budget: The memory shared by the running trials, no admission control if None.
+        memory_estimator: Estimates the memory of a trial, required with a memory budget.
+        optimizer_kwargs: Extra arguments of `optimizer_cls.create`, e.g. `warm_start_configs`.
+    """
+    n_processes = allocation.n_workers
+    scheduler = Scheduler.with_processes(n_processes)
+    task = scheduler.task(partial(evaluate_with_threads, target=target))
+    optimizer = optimizer_cls.create(
+        space=pipeline, metrics=metric, bucket=working_dir, seed=seed, **(optimizer_kwargs or {})
+    )
+    history = History()
+    n_jobs_key = get_n_jobs_key(pipeline)
+    n_submitted = 0
+    waiting_trial = None  # Trial that did not fit into the free memory yet
+
+    def add(report: Trial.Report) -> None:
+        optimizer.tell(report)
+        if "duplicate_of" in report.summary:
+            return  # Not evaluated, the report of the same config is already recorded
+        history.add(report)
+        if on_report is not None:
+            on_report(report)
+
+    def submit_trials() -> None:
+        nonlocal n_submitted, waiting_trial
+        n_workers = min(allocation.n_workers, n_processes)
+        while scheduler.running() and task.n_running < n_workers and n_submitted < max_trials:
+            if waiting_trial is not None:
+                trial, waiting_trial = waiting_trial, None
+            else:
+                trial = optimizer.ask()
+                # Configs that were already evaluated are not evaluated again
+                cached_report = optimizer.get_cached_report(trial) if hasattr(optimizer, "get_cached_report") else None
+                if cached_report is not None:
+                    if "duplicate_of" not in cached_report.summary:
+                        n_submitted += 1  # Replays of an earlier run count, duplicates of this run do not
+                    add(cached_report)
+                    if getattr(optimizer, "exhausted", False):
+                        # Only replays are left, end once the running trials are done
+                        if task.n_running == 0:
+                            scheduler.stop(stop_msg="The search space is exhausted")
+                        return
+                    continue
+            if memory_budget is not None:
+                trial_memory = memory_estimator.estimate(pipeline, trial.config)
+                if not memory_budget.can_ever_fit(trial_memory):
+                    n_submitted += 1
+                    add(trial.fail(MemoryError(
+                        f"Estimated memory of {trial_memory / 2 ** 20:.0f} MB exceeds the budget of "
+                        f"{memory_budget.total / 2 ** 20:.0f} MB"
+                    )))
+                    continue
+                if task.n_running > 0 and not memory_budget.fits(trial_memory):
+                    waiting_trial = trial
+                    return
+                memory_budget.reserve(trial.name, trial_memory)
+            n_jobs = allocation.n_jobs
+            if n_jobs_key is not None:
+                trial.config = {**trial.config, n_jobs_key: n_jobs}
+            task.submit(trial, pipeline, n_jobs=n_jobs)
+            n_submitted += 1
+
+    @task.on_result
+    def add_report(_, report: Trial.Report) -> None:
+        if memory_budget is not None:
+            memory_budget.release(report.trial.name)
+        add(report)
+        if report.status is not Trial.Status.SUCCESS:
+            if on_trial_exception == "raise":
+                raise report.exception if report.exception is not None else RuntimeError(report.status)
+            elif on_trial_exception == "end":
+                scheduler.stop(stop_msg=f"Trial finished with status {report.status}", exception=report.exception)
+                return
+        # From the start of the trial in the worker, the time it waited in the queue or for memory does not count
+        started_at = report.summary.get("started_at")
+        if started_at is not None:
+            allocation.update(report.reported_at.timestamp() - started_at)
+        submit_trials()
+
+    scheduler.on_start(submit_trials)
+    scheduler.run(timeout=timeout, wait=wait, display=display)
+    return history
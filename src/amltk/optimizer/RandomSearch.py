@@ -1,17 +1,67 @@
-from collections.abc import Sequence, Iterable
+import hashlib
+from collections import deque
+from collections.abc import Mapping, Sequence, Iterable
 from datetime import datetime
 from pathlib import Path
 from typing import overload, Literal
 
-from ConfigSpace import ConfigurationSpace
+from ConfigSpace import Configuration, ConfigurationSpace
+from ConfigSpace.hyperparameters import (
+    CategoricalHyperparameter,
+    FloatHyperparameter,
+    IntegerHyperparameter,
+    OrdinalHyperparameter,
+)
 from amltk import Optimizer, PathBucket, Metric, Node, Trial
 from amltk.randomness import as_int, randuid
 from amltk.types import Seed
+import pandas as pd
 from typing_extensions import override, Self
 
+from src.amltk.storage.TrialMemo import TrialMemo
+
+
+def get_config_hash(config: Mapping) -> str:
+    """Hash of a config that does not depend on the order of its values or on numpy scalar types.
+
+    Values are hashed by their type and repr, so 1 and 1.0 or True and "True" differ. Configs
+    of RandomSearch hold the types of their hyperparameters (see `get_hyperparameter_value`).
+    """
+    items = []
+    for key, value in sorted(config.items()):
+        value = value.item() if hasattr(value, "item") else value  # numpy scalar -> Python
+        items.append((key, type(value).__name__, repr(value)))
+    return hashlib.sha1(repr(items).encode()).hexdigest()
+
+
+def get_hyperparameter_value(hyperparameter, value):
+    """The value in the type of the hyperparameter, e.g. an int stored as float in a results table."""
+    value = value.item() if hasattr(value, "item") else value
+    if isinstance(hyperparameter, IntegerHyperparameter):
+        return int(value)
+    if isinstance(hyperparameter, FloatHyperparameter):
+        return float(value)
+    if isinstance(hyperparameter, (CategoricalHyperparameter, OrdinalHyperparameter)):
+        choices = hyperparameter.choices if isinstance(hyperparameter, CategoricalHyperparameter) else hyperparameter.sequence
+        for choice in choices:
+            if choice == value or str(choice) == str(value):
+                return choice
+    return value
+
 
 class RandomSearch(Optimizer[None]):
-    """An optimizer that uses ConfigSpace for random search."""
+    """An optimizer that uses ConfigSpace for random search.
+
+    Configs are sampled in batches and every config is only asked for once. If no new
+    config is found in `max_duplicate_draws` draws, the search space is considered
+    exhausted and configs are asked for again, their earlier reports can be replayed
+    with `get_cached_report` instead of evaluating them twice.
+
+    Warm start configs, e.g. the best configs of an earlier run, are asked for first.
+    With a `TrialMemo`, every successful report is stored, and the stored reports of a killed
+    run are replayed when its configs are asked for again. As the configs are drawn in the
+    same order for the same seed, a restarted run only evaluates the configs it did not reach.
+    """
 
     def __init__(
             self,
@@ -20,6 +70,10 @@ class RandomSearch(Optimizer[None]):
             bucket: PathBucket | None = None,
             metrics: Metric | Sequence[Metric],
             seed: Seed | None = None,
+            batch_size: int = 1000,
+            max_duplicate_draws: int = 10000,
+            warm_start_configs: Iterable[Mapping] = (),
+            memo: TrialMemo | None = None,
     ) -> None:
         """Initialize the optimizer.
 
@@ -28,6 +82,10 @@ class RandomSearch(Optimizer[None]):
             bucket: The bucket given to trials generated by this optimizer.
             metrics: The metrics to optimize. Unused for RandomSearch.
             seed: The seed to use for the optimization.
+            batch_size: The number of configs sampled at once.
+            max_duplicate_draws: The number of duplicate draws in a row after which the space is exhausted.
+            warm_start_configs: Configs to ask for first, values of unknown or inactive hyperparameters are ignored.
+            memo: Stores the reports of this run and replays those of earlier runs.
         """
         metrics = metrics if isinstance(metrics, Sequence) else [metrics]
         super().__init__(metrics=metrics, bucket=bucket)
@@ -36,6 +94,14 @@ class RandomSearch(Optimizer[None]):
         self._counter = 0
         self.seed = seed
         self.space = space
+        self.batch_size = batch_size
+        self.max_duplicate_draws = max_duplicate_draws
+        self.exhausted = False
+        self.memo = memo
+        self._batch = deque(self._get_valid_configs(warm_start_configs))
+        self._asked: set[str] = set()
+        self._trial_hashes: dict[str, str] = {}
+        self._reports: dict[str, Trial.Report[None]] = {}
 
     @override
     @classmethod
@@ -46,6 +112,7 @@ class RandomSearch(Optimizer[None]):
             metrics: Metric | Sequence[Metric],
             bucket: PathBucket | str | Path | None = None,
             seed: Seed | None = None,
+            **kwargs,
     ) -> Self:
         """Create a random search optimizer.
 
@@ -54,6 +121,7 @@ class RandomSearch(Optimizer[None]):
             metrics: The metrics to optimize
             bucket: The bucket to store the results in
             seed: The seed to use for the optimization
+            **kwargs: Passed to the optimizer, e.g. `warm_start_configs`
         """
         seed = as_int(seed)
         match bucket:
@@ -74,6 +142,7 @@ class RandomSearch(Optimizer[None]):
             seed=seed,
             bucket=bucket,
             metrics=metrics,
+            **kwargs,
         )
 
     @overload
@@ -98,10 +167,7 @@ class RandomSearch(Optimizer[None]):
         Returns:
             The trial info for the new config.
         """
-        if n is None:
-            configs = [self.space.sample_configuration()]
-        else:
-            configs = self.space.sample_configuration(n)
+        configs = [self._sample_config() for _ in range(1 if n is None else n)]
 
         trials: list[Trial[None]] = []
         for config in configs:
@@ -116,6 +182,7 @@ class RandomSearch(Optimizer[None]):
                 bucket=self.bucket / unique_name,
                 metrics=self.metrics,
             )
+            self._trial_hashes[unique_name] = get_config_hash(config)
             trials.append(trial)
 
         if n is None:
@@ -123,15 +190,66 @@ class RandomSearch(Optimizer[None]):
 
         return trials
 
+    def _get_valid_configs(self, configs: Iterable[Mapping]) -> list[Configuration]:
+        valid_configs = []
+        for config in configs:
+            values = {
+                key: get_hyperparameter_value(self.space[key], value)
+                for key, value in config.items()
+                if key in self.space and not pd.isna(value)
+            }
+            try:
+                valid_configs.append(Configuration(self.space, values=values))
+            except (ValueError, KeyError) as e:
+                print(f"Skipping warm start config {values}: {e}")
+        return valid_configs
+
+    def _sample_config(self) -> dict:
+        """Draw the next config that was not asked for yet, or any config once the space is exhausted."""
+        n_draws = 0
+        while True:
+            if not self._batch:
+                self._batch.extend(self.space.sample_configuration(self.batch_size))
+            config = dict(self._batch.popleft())
+            config_hash = get_config_hash(config)
+            if self.exhausted or config_hash not in self._asked:
+                self._asked.add(config_hash)
+                return config
+            n_draws += 1
+            if n_draws >= self.max_duplicate_draws:
+                print(f"No new config in {n_draws} draws, the search space is exhausted")
+                self.exhausted = True
+
+    def get_cached_report(self, trial: Trial[None]) -> Trial.Report[None] | None:
+        """Report of the trial replayed from an earlier trial with the same config, if there is one."""
+        config_hash = self._trial_hashes.get(trial.name)
+        report = self._reports.get(config_hash)
+        if report is not None:
+            trial.summary.update(report.summary)
+            trial.summary["duplicate_of"] = report.name
+        elif self.memo is not None and (report := self.memo.get(config_hash, trial.seed)) is not None:
+            trial.summary.update(report.summary)
+            trial.summary["replayed_from"] = report.name
+        else:
+            return None
+        if report.status is Trial.Status.SUCCESS:
+            return trial.success(**report.values)
+        return trial.fail(report.exception)
+
     @override
     def tell(self, report: Trial.Report[None]) -> None:
         """Tell the optimizer about the result of a trial.
 
-        Does nothing for random search.
+        The report is kept to be replayed for trials of the same config, and stored in the memo.
 
         Args:
             report: The report of the trial.
         """
+        config_hash = self._trial_hashes.pop(report.name, None)
+        if config_hash is not None and config_hash not in self._reports:
+            self._reports[config_hash] = report
+            if self.memo is not None:
+                self.memo.add(config_hash, report)
 
     @override
     @classmethod
@@ -0,0 +1,142 @@
+import os
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+from threadpoolctl import threadpool_limits
+
+core_quota_variable = "FE_AUTOML_CORE_QUOTA"
+# Read by the BLAS/OpenMP libraries when they are loaded, so child processes start with the quota
+thread_variables = [
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "BLIS_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+]
+
+
+def get_available_cores() -> int:
+    """Number of cores this process may use, respecting SLURM and CPU affinity."""
+    slurm_cpus = os.environ.get("SLURM_CPUS_PER_TASK")
+    if slurm_cpus is not None:
+        return max(1, int(slurm_cpus))
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except AttributeError:  # not available on Mac
+        return max(1, os.cpu_count() or 1)
+
+
+def get_core_quota() -> int:
+    """Number of cores this process may keep busy, set by `set_core_quota` here or in a parent process.
+
+    Without a quota the process may use all available cores.
+    """
+    quota = os.environ.get(core_quota_variable)
+    available = get_available_cores()
+    return available if quota is None else max(1, min(int(quota), available))
+
+
+def set_core_quota(n_cores) -> int:
+    """Give this process and the processes it starts afterwards a quota of `n_cores` cores.
+
+    Limits the BLAS/OpenMP thread pools that are already loaded and sets the environment
+    variables, so libraries loaded later and child processes (pynisher, Dask, amltk
+    workers) start with the quota as well. Returns the quota.
+    """
+    quota = max(1, min(int(n_cores), get_available_cores()))
+    os.environ[core_quota_variable] = str(quota)
+    for variable in thread_variables:
+        os.environ[variable] = str(quota)
+    threadpool_limits(limits=quota)
+    return quota
+
+
+@contextmanager
+def core_quota(n_cores):
+    """Run the `with` block under a quota of `n_cores` cores, restoring the previous quota afterwards."""
+    previous = {variable: os.environ.get(variable) for variable in [core_quota_variable, *thread_variables]}
+    with threadpool_limits(limits=max(1, int(n_cores))):
+        set_core_quota(n_cores)
+        try:
+            yield get_core_quota()
+        finally:
+            for variable, value in previous.items():
+                if value is None:
+                    os.environ.pop(variable, None)
+                else:
+                    os.environ[variable] = value
+
+
+def get_n_jobs(n_jobs=-1) -> int:
+    """The `n_jobs` of an estimator or FE method, within the core quota of this process.
+
+    -1 (or None) means the whole quota, larger values are capped by it. The BLAS/OpenMP
+    thread pools are limited to the quota as well, as the wrappers call this right before
+    their parallel work, possibly in a fresh pynisher subprocess.
+    """
+    quota = get_core_quota()
+    threadpool_limits(limits=quota)
+    if n_jobs is None or n_jobs < 0:
+        return quota
+    return max(1, min(int(n_jobs), quota))
+
+
+def get_core_split(n_rows, n_features, n_cores) -> tuple[int, int]:
+    """Split the cores into worker processes and estimator threads per worker.
+
+    Small datasets are evaluated best by many single threaded workers, as the
+    estimators barely profit from threads there. Every tenfold increase of the
+    number of cells above 250k doubles the threads per estimator.
+
+    Returns:
+        The number of workers and the number of threads (n_jobs) per worker.
+    """
+    n_cells = max(1, n_rows * n_features)
+    n_jobs = 2 ** int(np.clip(np.floor(np.log10(n_cells / 2.5e5)) + 1, 0, 3))
+    n_jobs = int(min(n_jobs, n_cores))
+    n_workers = max(1, n_cores // n_jobs)
+    return n_workers, n_jobs
+
+
+class CoreAllocation:
+    """Split of the cores between workers and estimator threads that adapts during a run.
+
+    The median duration of the last `window` trials decides the split: if trials take
+    longer than `long_trial_time` seconds, fewer workers with twice the threads are used,
+    if they are faster than `short_trial_time` seconds, the threads are halved again.
+    """
+
+    def __init__(self, n_cores, n_workers, n_jobs, long_trial_time=300.0, short_trial_time=30.0, window=8):
+        self.n_cores = n_cores
+        self.n_workers = n_workers
+        self.n_jobs = n_jobs
+        self.long_trial_time = long_trial_time
+        self.short_trial_time = short_trial_time
+        self._durations = deque(maxlen=window)
+
+    @classmethod
+    def for_data(cls, n_rows, n_features, n_cores=None, **kwargs) -> "CoreAllocation":
+        n_cores = get_core_quota() if n_cores is None else n_cores
+        n_workers, n_jobs = get_core_split(n_rows, n_features, n_cores)
+        return cls(n_cores, n_workers, n_jobs, **kwargs)
+
+    def update(self, duration) -> bool:
+        """Record the duration of a finished trial and return whether the split changed."""
+        self._durations.append(duration)
+        if len(self._durations) < self._durations.maxlen:
+            return False
+        median = float(np.median(self._durations))
+        if median > self.long_trial_time and self.n_jobs * 2 <= self.n_cores:
+            n_jobs = self.n_jobs * 2
+        elif median < self.short_trial_time and self.n_jobs > 1:
+            n_jobs = self.n_jobs // 2
+        else:
+            return False
+        self.n_jobs = n_jobs
+        self.n_workers = max(1, self.n_cores // n_jobs)
+        # Trials evaluated under the old split must not decide the next change
+        self._durations.clear()
+        print(f"Switching to {self.n_workers} workers with {self.n_jobs} threads each (median trial {median:.1f}s)")
+        return True
@@ -0,0 +1,258 @@
+import _thread
+import os
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+import psutil
+from amltk.pipeline import Node
+
+from src.amltk.resources.Cores import get_available_cores
+
+worker_overhead = 300 * 2 ** 20  # Memory of an idle worker process with sklearn and lightgbm imported
+float_size = 8
+memory_limit_exit_code = 75  # Exit code of a process stopped by the MemoryWatchdog
+
+
+def get_cgroup_directories() -> list[Path]:
+    """Memory cgroup directories of this process, from its own cgroup up to the root.
+
+    SLURM puts the memory limit of a job on the cgroup of the job or step, not on the root
+    cgroup, and the process may sit in a child cgroup (e.g. of its task) without a limit.
+    """
+    root = Path("/sys/fs/cgroup")
+    try:
+        lines = Path("/proc/self/cgroup").read_text().splitlines()
+    except OSError:
+        return [root]
+    for line in lines:
+        _, controllers, path = line.split(":", 2)
+        if controllers == "":  # cgroup v2
+            directory, base = root / path.lstrip("/"), root
+        elif "memory" in controllers.split(","):  # cgroup v1
+            directory, base = root / "memory" / path.lstrip("/"), root / "memory"
+        else:
+            continue
+        directories = [directory, *directory.parents]
+        return directories[:directories.index(base) + 1] if base in directories else [directory]
+    return [root]
+
+
+def get_cgroup_available_memory() -> int | None:
+    """Memory in bytes left under the tightest memory limit of the cgroups of this process, None without a limit."""
+    available = None
+    for directory in get_cgroup_directories():
+        for limit_file, usage_file in (("memory.max", "memory.current"), ("memory.limit_in_bytes", "memory.usage_in_bytes")):
+            try:
+                limit = (directory / limit_file).read_text().strip()
+                if limit == "max" or int(limit) >= 2 ** 62:  # no limit (cgroup v1 writes a huge number)
+                    continue
+                left = int(limit) - int((directory / usage_file).read_text())
+            except (OSError, ValueError):
+                continue
+            available = left if available is None else min(available, left)
+    return available
+
+
+def get_slurm_memory() -> int | None:
+    """Memory in bytes of the SLURM job on this node, from --mem or --mem-per-cpu, None outside SLURM."""
+    memory_per_node = os.environ.get("SLURM_MEM_PER_NODE")  # in MB
+    if memory_per_node is not None:
+        return int(memory_per_node) * 2 ** 20
+    memory_per_cpu = os.environ.get("SLURM_MEM_PER_CPU")  # in MB
+    if memory_per_cpu is not None:
+        n_cpus = os.environ.get("SLURM_CPUS_ON_NODE")
+        n_cpus = int(n_cpus) if n_cpus is not None else get_available_cores()
+        return int(memory_per_cpu) * n_cpus * 2 ** 20
+    return None
+
+
+def get_available_memory() -> int:
+    """Free memory in bytes, respecting the memory limit of the SLURM job (cgroup) if there is one."""
+    available = psutil.virtual_memory().available
+    cgroup_memory = get_cgroup_available_memory()
+    if cgroup_memory is not None:
+        available = min(available, cgroup_memory)
+    slurm_memory = get_slurm_memory()
+    if slurm_memory is not None:
+        available = min(available, slurm_memory)
+    return max(0, available)
+
+
+def get_config_value(pipeline: Node, config: dict, key_suffix: str, default=None):
+    """Value of a hyperparameter from the trial config, or from the fixed config of its component."""
+    for key, value in config.items():
+        if key.endswith(f":{key_suffix}"):
+            return value
+    component_name, _, parameter = key_suffix.rpartition(":")
+    for node in pipeline.iter():
+        if node.name == component_name and node.config is not None and parameter in node.config:
+            return node.config[parameter]
+    return default
+
+
+class MemoryEstimator:
+    """Rough upper bound of the memory a trial needs, from the size of the data and the estimator.
+
+    The estimate covers the data in the worker, the preprocessed matrix (a dense one-hot
+    encoding with `max_categories` columns per categorical feature) and the fitted model,
+    e.g. 512 fully grown trees for a random forest.
+    """
+
+    def __init__(self, n_rows, n_numerical, n_categorical, n_classes):
+        self.n_rows = n_rows
+        self.n_numerical = n_numerical
+        self.n_categorical = n_categorical
+        self.n_classes = max(2, n_classes)
+
+    @classmethod
+    def for_data(cls, train_x: pd.DataFrame, train_y, test_x: pd.DataFrame) -> "MemoryEstimator":
+        categorical = train_x.select_dtypes(include=["category", "object", "bool"]).shape[1]
+        return cls(
+            n_rows=len(train_x) + len(test_x),
+            n_numerical=train_x.shape[1] - categorical,
+            n_categorical=categorical,
+            n_classes=pd.Series(train_y).nunique(),
+        )
+
+    def estimate(self, pipeline: Node, config: dict) -> int:
+        """Estimated peak memory in bytes of evaluating the pipeline with this config."""
+        n_features = self.n_numerical + self.n_categorical
+        data = self.n_rows * n_features * float_size
+        one_hot = get_config_value(pipeline, config, "one_hot:__choice__") == "OneHotEncoder"
+        categories = get_config_value(pipeline, config, "OneHotEncoder:max_categories", 20) if one_hot else 1
+        n_preprocessed = self.n_numerical + self.n_categorical * categories
+        # Imputed and encoded parts are concatenated into a new matrix
+        preprocessed = 2 * self.n_rows * n_preprocessed * float_size
+        model = self.estimate_model(pipeline, config, n_preprocessed)
+        return int(worker_overhead + 2 * data + preprocessed + model)
+
+    def estimate_model(self, pipeline: Node, config: dict, n_features) -> int:
+        estimator = pipeline.nodes[-1]
+        estimator_name = getattr(estimator.item, "__name__", estimator.name)
+        matrix = self.n_rows * n_features * float_size
+        if estimator_name == "RandomForestClassifier":
+            n_estimators = get_config_value(pipeline, config, f"{estimator.name}:n_estimators", 100)
+            min_samples_leaf = get_config_value(pipeline, config, f"{estimator.name}:min_samples_leaf", 1)
+            n_nodes = 2 * self.n_rows / min_samples_leaf
+            # A node stores its split (~64 bytes) and the class distribution
+            return int(n_estimators * n_nodes * (64 + self.n_classes * float_size))
+        elif estimator_name in ("LGBMClassifier", "LGBMRegressor"):
+            n_estimators = get_config_value(pipeline, config, f"{estimator.name}:n_estimators", 100)
+            num_leaves = get_config_value(pipeline, config, f"{estimator.name}:num_leaves", 31)
+            binned = self.n_rows * n_features
+            histograms = num_leaves * n_features * 255 * 3 * float_size
+            trees = n_estimators * self.n_classes * num_leaves * 128
+            return int(binned + histograms + trees)
+        elif estimator_name == "KNeighborsClassifier":
+            # Distances are computed in chunks of sklearn's working memory (1 GB)
+            return int(matrix + min(self.n_rows ** 2 * float_size, 2 ** 30))
+        elif estimator_name == "SVC":
+            cache_size = get_config_value(pipeline, config, f"{estimator.name}:cache_size", 200)
+            return int(matrix + cache_size * 2 ** 20)
+        return int(matrix)
+
+
+class MemoryBudget:
+    """Memory of the node that is shared by the running trials.
+
+    A trial is admitted if its estimate fits next to the estimates of the running trials
+    and into the currently free memory. Trials that do not even fit into the whole budget
+    can never run.
+    """
+
+    def __init__(self, total):
+        self.total = total
+        self._reserved = {}
+
+    @classmethod
+    def for_node(cls, fraction=0.8) -> "MemoryBudget":
+        return cls(int(get_available_memory() * fraction))
+
+    @property
+    def reserved(self) -> int:
+        return sum(self._reserved.values())
+
+    def can_ever_fit(self, estimate) -> bool:
+        return estimate <= self.total
+
+    def fits(self, estimate) -> bool:
+        return self.reserved + estimate <= self.total and estimate <= get_available_memory()
+
+    def reserve(self, name, estimate) -> None:
+        self._reserved[name] = estimate
+
+    def release(self, name) -> None:
+        self._reserved.pop(name, None)
+
+
+def get_job_memory_limit(n_concurrent_jobs=1, fraction=0.8) -> int:
+    """Memory in bytes of one of `n_concurrent_jobs` jobs sharing the free memory of the node."""
+    return MemoryBudget.for_node(fraction).total // max(1, n_concurrent_jobs)
+
+
+def get_tree_memory(process: psutil.Process) -> int:
+    """Resident memory in bytes of a process and all of its child processes."""
+    total = 0
+    for member in [process, *process.children(recursive=True)]:
+        try:
+            total += member.memory_info().rss
+        except psutil.Error:  # Exited in the meantime
+            pass
+    return total
+
+
+class MemoryWatchdog:
+    """Stops the current process tree when its memory exceeds the limit, before the OOM killer does.
+
+    A thread checks the memory of this process and its children every `interval` seconds.
+    If the limit is exceeded, the child processes are killed and a KeyboardInterrupt is
+    raised in the main thread, so the run can record a memory-limit outcome (check
+    `exceeded`). If the main thread is still above the limit after `grace_period`
+    seconds, `on_kill` is called and the process exits with `memory_limit_exit_code`.
+    Once the memory is back under the limit, the next excess starts a new grace period.
+    """
+
+    def __init__(self, limit, interval=1.0, grace_period=30.0, on_kill=None):
+        self.limit = int(limit)
+        self.interval = interval
+        self.grace_period = grace_period
+        self.on_kill = on_kill
+        self.exceeded = False
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self) -> "MemoryWatchdog":
+        self._thread = threading.Thread(target=self._watch, name="memory-watchdog", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _watch(self) -> None:
+        process = psutil.Process()
+        exceeded_at = None
+        while not self._stop.wait(self.interval):
+            memory = get_tree_memory(process)
+            self.peak = max(self.peak, memory)
+            if memory <= self.limit:
+                exceeded_at = None  # The run got back under the limit, a later excess gets a new grace period
+                continue
+            if exceeded_at is None:
+                print(f"Memory limit exceeded: {memory / 2 ** 30:.1f} GB of {self.limit / 2 ** 30:.1f} GB, stopping the run")
+                self.exceeded = True
+                exceeded_at = time.monotonic()
+                for child in process.children(recursive=True):
+                    try:
+                        child.kill()
+                    except psutil.Error:
+                        pass
+                _thread.interrupt_main()
+            elif time.monotonic() - exceeded_at > self.grace_period:
+                if self.on_kill is not None:
+                    self.on_kill()
+                os._exit(memory_limit_exit_code)
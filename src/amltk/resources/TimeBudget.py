@@ -0,0 +1,124 @@
+import functools
+import resource
+import threading
+import time
+
+import numpy as np
+import psutil
+
+benchmark_size = 2 ** 20
+
+
+def get_cpu_time() -> float:
+    """CPU seconds of this process and its finished child processes (e.g. the pynisher subprocesses)."""
+    usages = [resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)]
+    return sum(usage.ru_utime + usage.ru_stime for usage in usages)
+
+
+class CPUTimer:
+    """CPU seconds of this process and all its descendants between `start` and `stop`.
+
+    `get_cpu_time` only sees child processes that were waited for, not detached ones like
+    the JVM of H2O or Dask workers. So a thread also sums the CPU times of all descendants
+    every `interval` seconds, and the larger of both totals is returned. Descendants that
+    exit between two polls are covered by `get_cpu_time` once they were waited for.
+    """
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self.cpu_time = None
+        self._process = psutil.Process()
+        self._baseline: dict[tuple, float] = {}
+        self._latest: dict[tuple, float] = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self) -> "CPUTimer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _poll(self) -> None:
+        for process in [self._process, *self._get_descendants()]:
+            try:
+                with process.oneshot():
+                    key = (process.pid, process.create_time())
+                    times = process.cpu_times()
+            except psutil.Error:  # Exited in the meantime
+                continue
+            self._latest[key] = times.user + times.system
+
+    def _get_descendants(self) -> list[psutil.Process]:
+        try:
+            return self._process.children(recursive=True)
+        except psutil.Error:
+            return []
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._poll()
+
+    def start(self) -> "CPUTimer":
+        self._start_cpu_time = get_cpu_time()
+        self._poll()
+        self._baseline = dict(self._latest)
+        self._thread = threading.Thread(target=self._watch, name="cpu-timer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> float:
+        self._stop.set()
+        self._thread.join()
+        self._poll()
+        tree_cpu_time = sum(value - self._baseline.get(key, 0.0) for key, value in self._latest.items())
+        self.cpu_time = max(get_cpu_time() - self._start_cpu_time, tree_cpu_time)
+        return self.cpu_time
+
+
+@functools.cache
+def get_node_speed(repeats=5) -> float:
+    """Single core speed of this node, in runs per second of a fixed numpy workload (best of `repeats`).
+
+    Only the ratio of the speeds of two nodes is meaningful. The workload (sorting, elementwise
+    math and a reduction) does not use BLAS threads, so it does not depend on their number.
+    """
+    data = np.random.default_rng(0).random(benchmark_size)
+    best = np.inf
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        np.sort(data)
+        np.exp(data).sum()
+        best = min(best, time.perf_counter() - start_time)
+    return 1.0 / best
+
+
+class TimeBudget:
+    """Split of the time budget of a benchmark job between feature engineering and AutoGluon.
+
+    The FE stage records the CPU seconds of a method, its core quota and the speed of its
+    node (see `save_features`). FE is charged its CPU seconds per core of the quota,
+    converted to this node by the ratio of the node speeds. So the charge neither depends
+    on the load of the FE node nor on how fast that node was. Artifacts without CPU seconds
+    or core quota are charged their wall clock time.
+    """
+
+    def __init__(self, total=14400, min_remaining=300, warn_fraction=0.9):
+        self.total = total
+        self.min_remaining = min_remaining  # AutoGluon gets at least this many seconds
+        self.warn_fraction = warn_fraction
+
+    def get_fe_charge(self, entry) -> float:
+        """Seconds on this node the FE method of the manifest entry (or artifact meta) is charged."""
+        if entry.get("cpu_time") is None or entry.get("node_speed") is None or entry.get("core_quota") is None:
+            return float(entry.get("execution_time") or 0.0)
+        speed_ratio = entry["node_speed"] / get_node_speed()
+        return entry["cpu_time"] * speed_ratio / entry["core_quota"]
+
+    def get_remaining(self, entry, warn=True) -> tuple[float, float]:
+        """The seconds left for AutoGluon and the seconds charged for FE."""
+        charge = self.get_fe_charge(entry)
+        if warn and charge >= self.warn_fraction * self.total:
+            print(f"Warning: {entry['method']} used {charge:.0f}s ({charge / self.total:.0%}) of the "
+                  f"{self.total}s budget on {entry['dataset']}, AutoGluon gets at least {self.min_remaining}s")
+        return max(self.min_remaining, self.total - charge), charge
@@ -3,53 +3,21 @@ from __future__ import annotations
 import warnings
 from pathlib import Path
 import os.path
+import sys
 
+import pandas as pd
 from amltk.optimization import Metric
-from amltk.pipeline import Choice, Sequential, Split
-from sklearn.metrics import get_scorer
-from sklearn.preprocessing import *
+from sklearn.metrics import make_scorer
 
-from src.amltk.classifiers.Classifiers import *
-from src.datasets.Datasets import *
+from src.amltk.classifiers.Pipelines import get_pipeline
+from src.datasets.FeatureStore import get_or_compute_features
 from src.amltk.evaluation.Evaluator import get_cv_evaluator
+from src.amltk.evaluation.Metrics import roc_auc_ovo_score
 from src.amltk.optimizer.RandomSearch import RandomSearch
-
-from src.feature_engineering.OpenFE.OpenFE import get_openFE_features
+from src.amltk.resources.Memory import MemoryBudget
 
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
-preprocessing = Split(
-    {
-        "numerical": Component(SimpleImputer, space={"strategy": ["mean", "median"]}),
-        "categorical": [
-            Component(
-                OrdinalEncoder,
-                config={
-                    "categories": "auto",
-                    "handle_unknown": "use_encoded_value",
-                    "unknown_value": -1,
-                    "encoded_missing_value": -2,
-                },
-            ),
-            Choice(
-                "passthrough",
-                Component(
-                    OneHotEncoder,
-                    space={"max_categories": (2, 20)},
-                    config={
-                        "categories": "auto",
-                        "drop": None,
-                        "sparse_output": False,
-                        "handle_unknown": "infrequent_if_exist",
-                    },
-                ),
-                name="one_hot",
-            ),
-        ],
-    },
-    name="preprocessing",
-)
-
 
 def safe_dataframe(df, working_dir, dataset_name, fold_number, method_name):
     file_string = "results_" + str(dataset_name) + "_" + str(method_name) + "_" + str(fold_number) + ".parquet"
@@ -61,28 +29,6 @@ def safe_dataframe(df, working_dir, dataset_name, fold_number, method_name):
     df.to_parquet(results_to)
 
 
-rf_classifier = get_rf_classifier()
-rf_pipeline = Sequential(preprocessing, rf_classifier, name="rf_pipeline")
-
-# works on dataset 2 (not for continuous data)
-mlp_classifier = get_mlp_classifier()
-mlp_pipeline = Sequential(preprocessing, mlp_classifier, name="mlp_pipeline")
-
-# works on dataset 2 (not on continuous data)
-svc_classifier = get_svc_classifier()
-svc_pipeline = Sequential(preprocessing, svc_classifier, name="svc_pipeline")
-
-# works on dataset 2 (not on continuous data)
-knn_classifier = get_knn_classifier()
-knn_pipeline = Sequential(preprocessing, knn_classifier, name="knn_pipeline")
-
-lgbm_classifier = get_lgbm_classifier()
-lgbm_classifier_pipeline = Sequential(preprocessing, lgbm_classifier, name="lgbm_classifier_pipeline")
-
-lgbm_regressor = get_lgbm_regressor()
-lgbm_regressor_pipeline = Sequential(preprocessing, lgbm_regressor, name="lgbm_regressor_pipeline")
-
-
 def main() -> None:
     rerun = False        # Decide if you want to re-execute the methods on a dataset or use the existing files
     debugging = False    # Decide if you want ot raise trial exceptions
@@ -105,16 +51,16 @@ def main() -> None:
     test_new_method_datasets = [17]  # [18]  # [18]  # [16]
 
     optimizer_cls = RandomSearch
-    pipeline = lgbm_classifier_pipeline
+    pipeline = get_pipeline("lgbm_classifier_pipeline")  # Only the chosen pipeline is built, see Pipelines
 
     metric_definition = Metric(
         "roc_auc_ovo",
         minimize=False,
         bounds=(0, 1),
-        fn=get_scorer("roc_auc_ovo")
+        fn=make_scorer(roc_auc_ovo_score, response_method="predict_proba")  # same values as get_scorer("roc_auc_ovo")
     )
 
-    per_process_memory_limit = None  # (4, "GB")  # NOTE: May have issues on Mac
+    memory_fraction = 0.8  # Share of the free memory the trials may use, see MemoryBudget
     per_process_walltime_limit = None  # (60, "s")
 
     if debugging:
@@ -134,6 +80,16 @@ def main() -> None:
         display = True
         wait_for_all_workers_to_finish = False
 
+    # Each worker gets an equal share of the memory, trials above it are recorded as failed
+    if sys.platform == "darwin":
+        per_process_memory_limit = None  # NOTE: Memory limits do not work on Mac
+    else:
+        per_process_memory_limit = (MemoryBudget.for_node(memory_fraction).total // n_workers, "B")
+
+    # Not imported by the worker processes, which import this module again
+    from src.datasets.Datasets import get_dataset
+    from src.feature_engineering.OpenFE.OpenFE import get_openFE_features
+
     for fold in range(folds):
         print("\n\n\n*******************************\n Fold " + str(fold) + "\n*******************************\n")
         inner_fold_seed = random_seed + fold
@@ -149,9 +105,11 @@ def main() -> None:
             if rerun or not os.path.isfile(file):
                 print("Run OpenFE Method on Dataset")
                 # train_x, train_y, test_x, test_y = get_splits(train_x, train_y, test_x, test_y)
-                train_x_xxx, test_x_xxx = get_openFE_features(train_x, train_y, test_x, 1)
+                train_x_xxx, test_x_xxx = get_or_compute_features(
+                    name, "openfe", 0, lambda: get_openFE_features(train_x, train_y, test_x, 1), base=(train_x, test_x)
+                )
                 evaluator = get_cv_evaluator(train_x_xxx, train_y, test_x_xxx, test_y, inner_fold_seed,
-                                             on_trial_exception, task_hint)
+                                             on_trial_exception, task_hint, time_budget=max_time)
                 history_xxx = pipeline.optimize(
                     target=evaluator.fn,
                     metric=metric_definition,
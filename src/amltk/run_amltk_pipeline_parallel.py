@@ -4,96 +4,90 @@ import warnings
 import os.path
 from pathlib import Path
 import argparse
+import json
 import os
+import re
+import shutil
+from functools import partial
 
 import pandas as pd
 from amltk.optimization import Metric
-from amltk.pipeline import Choice, Sequential, Split
-from sklearn.metrics import get_scorer
-from sklearn.preprocessing import *
 
-from src.amltk.classifiers.Classifiers import *
-
-from src.amltk.classifiers.Classifiers import get_rf_classifier
-from src.datasets.Datasets import *
-from src.amltk.evaluation.Evaluator import get_cv_evaluator
+from src.amltk.classifiers.Pipelines import get_pipeline
+from src.datasets.FeatureStore import get_or_compute_features
+from src.amltk.evaluation.EnsembleSelection import get_ensemble_score, get_ensemble_selection
+from src.amltk.evaluation.Evaluator import get_evaluator
+from src.amltk.evaluation.Instrumentation import AnytimeLog, get_timed_scorer
+from src.amltk.evaluation.Metrics import roc_auc_ovo_score
+from src.amltk.evaluation.SVCEvaluator import get_calibrated_result
+from src.amltk.evaluation.Profiling import SampledCall, TraceRecorder
+from src.amltk.optimizer.Optimization import optimize
 from src.amltk.optimizer.RandomSearch import RandomSearch
-
-from src.feature_engineering.autofeat.Autofeat import get_autofeat_features
-from src.feature_engineering.AutoGluon.AutoGluon import get_autogluon_features
-from src.feature_engineering.BioAutoML.BioAutoML import get_bioautoml_features
-from src.feature_engineering.Boruta.Boruta import get_boruta_features
-# CAAFE
-from src.feature_engineering.CorrelationBasedFS.CorrelationBasedFS import get_correlationbased_features
-# DIFER
-# ExploreKit
-from src.feature_engineering.Featuretools.Featuretools import get_featuretools_features
-# from src.feature_engineering.Featurewiz.Featurewiz import get_featurewiz_features
-from src.feature_engineering.H2O.H2O import get_h2o_features
-from src.feature_engineering.MLJAR.MLJAR import get_mljar_features
-from src.feature_engineering.OpenFE.OpenFE import get_openFE_features
+from src.amltk.resources.Cores import CoreAllocation, get_available_cores, set_core_quota
+from src.amltk.resources.Memory import MemoryBudget, MemoryEstimator
+from src.amltk.storage.PredictionStore import PredictionStore
+from src.amltk.storage.ResultsStore import ResultsStore
+from src.amltk.storage.TrialMemo import TrialMemo, get_frame_hash, get_run_key
 
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
-preprocessing = Split(
-    {
-        "numerical": Component(SimpleImputer, space={"strategy": ["mean", "median"]}),
-        "categorical": [
-            Component(
-                OrdinalEncoder,
-                config={
-                    "categories": "auto",
-                    "handle_unknown": "use_encoded_value",
-                    "unknown_value": -1,
-                    "encoded_missing_value": -2,
-                },
-            ),
-            Choice(
-                "passthrough",
-                Component(
-                    OneHotEncoder,
-                    space={"max_categories": (2, 20)},
-                    config={
-                        "categories": "auto",
-                        "drop": None,
-                        "sparse_output": False,
-                        "handle_unknown": "infrequent_if_exist",
-                    },
-                ),
-                name="one_hot",
-            ),
-        ],
-    },
-    name="preprocessing",
-)
-
-
-def safe_dataframe(df, working_dir, dataset_name, fold_number, method_name, classifier_name):
-    file_string = f"results_{dataset_name}_{method_name}_{classifier_name}_{fold_number}.parquet"
-    results_to = working_dir / file_string
-    pd.set_option('display.max_rows', None)
-    pd.set_option('display.max_columns', None)
-    print(df)
-    print(f"Saving dataframe of results to path: {results_to}")
-    df.to_parquet(results_to)
-
-
-rf_classifier = get_rf_classifier()
-rf_pipeline = Sequential(preprocessing, rf_classifier, name="rf_pipeline")
-
-# works on dataset 2 (not for continuous data)
-mlp_classifier = get_mlp_classifier()
-mlp_pipeline = Sequential(preprocessing, mlp_classifier, name="mlp_pipeline")
-
-# works on dataset 2 (not on continuous data)
-svc_classifier = get_svc_classifier()
-svc_pipeline = Sequential(preprocessing, svc_classifier, name="svc_pipeline")
-
-knn_classifier = get_knn_classifier()
-knn_pipeline = Sequential(preprocessing, knn_classifier, name="knn_pipeline")
-
-lgbm_classifier = get_lgbm_classifier()
-lgbm_classifier_pipeline = Sequential(preprocessing, lgbm_classifier, name="lgbm_classifier_pipeline")
+feat_eng_steps = 2  # Number of feature engineering steps for autofeat
+feat_sel_steps = 5  # Number of feature selection steps for autofeat
+n_jobs = 1  # Number of jobs for OpenFE
+num_features = 500  # Number of features for MLJAR
+num_features_mafese = 50  # Number of features for MAFESE
+estimations = 50    # Number of estimations for BioAutoML, default = 50
+
+
+def engineer_features(method_name, train_x, train_y, test_x, test_y, task_hint, name) -> tuple[
+    pd.DataFrame,
+    pd.DataFrame
+]:
+    # Every method is imported only when it is run, as the worker processes import this module again
+    if method_name == "autofeat":
+        from src.feature_engineering.autofeat.Autofeat import get_autofeat_features
+        return get_autofeat_features(train_x, train_y, test_x, task_hint, feat_eng_steps, feat_sel_steps)
+    elif method_name == "autogluon":
+        from src.feature_engineering.AutoGluon.AutoGluon import get_autogluon_features
+        return get_autogluon_features(train_x, train_y, test_x)
+    elif method_name == "bioautoml":
+        from src.feature_engineering.BioAutoML.BioAutoML import get_bioautoml_features
+        return get_bioautoml_features(train_x, train_y, test_x, estimations)
+    elif method_name == "boruta":
+        from src.feature_engineering.Boruta.Boruta import get_boruta_features
+        return get_boruta_features(train_x, train_y, test_x)
+    elif method_name == "correlationBasedFS":
+        from src.feature_engineering.CorrelationBasedFS.CorrelationBasedFS import get_correlationbased_features
+        return get_correlationbased_features(train_x, train_y, test_x)
+    elif method_name == "featuretools":
+        from src.feature_engineering.Featuretools.Featuretools import get_featuretools_features
+        return get_featuretools_features(train_x, train_y, test_x, test_y, name)
+    elif method_name == "h2o":
+        from src.feature_engineering.H2O.H2O import get_h2o_features
+        return get_h2o_features(train_x, train_y, test_x)
+    elif method_name == "macfe":
+        from src.feature_engineering.MACFE.MACFE import get_macfe_features
+        return get_macfe_features(train_x, train_y, test_x, test_y, name)
+    elif method_name == "mafese":
+        from src.feature_engineering.MAFESE.MAFESE import get_mafese_features
+        return get_mafese_features(train_x, train_y, test_x, test_y, name, num_features_mafese)
+    elif method_name == "mljar":
+        from src.feature_engineering.MLJAR.MLJAR import get_mljar_features
+        return get_mljar_features(train_x, train_y, test_x, num_features)
+    elif method_name == "openfe":
+        from src.feature_engineering.OpenFE.OpenFE import get_openFE_features
+        return get_openFE_features(train_x, train_y, test_x, n_jobs)
+    # CAAFE
+    # DIFER
+    # ExploreKit
+    # Featurewiz: from src.feature_engineering.Featurewiz.Featurewiz import get_featurewiz_features
+    raise ValueError(f"Unknown feature engineering method {method_name}")
+
+
+def split_method(method) -> tuple[str, int]:
+    """Split a job name like "boruta22" (or "boruta104" for a synthetic dataset) into the method name and the dataset option."""
+    method_name, option = re.fullmatch(r"(.*?)(\d+)", method).groups()
+    return method_name, int(option)
 
 
 def main(args):
@@ -101,14 +95,10 @@ def main(args):
 
     rerun = False  # Decide if you want to re-execute the methods on a dataset or use the existing files
     debugging = False  # Decide if you want ot raise trial exceptions
-    feat_eng_steps = 2  # Number of feature engineering steps for autofeat
-    feat_sel_steps = 5  # Number of feature selection steps for autofeat
-    n_jobs = 1  # Number of jobs for OpenFE
-    num_features = 500  # Number of features for MLJAR
-    estimations = 50    # Number of estimations for BioAutoML, default = 50
     working_dir = Path("src/amltk/results/third_try")  # Path
     random_seed = 42  # Set seed
     folds = 10  # Set number of folds (normal 10, test 1)
+    outer_fold = 0  # get_dataset always uses the first outer fold of the OpenML task
 
     # Choose set of datasets
     all_datasets = [1, 5, 14, 15, 16, 17, 18, 21, 22, 23, 24, 27, 28, 29, 31, 35, 36]  # 17
@@ -118,17 +108,19 @@ def main(args):
     test_new_method_datasets = [18]  # [16]
 
     optimizer_cls = RandomSearch
-    # pipelines = [lgbm_classifier_pipeline, knn_pipeline, svc_pipeline, mlp_pipeline, rf_classifier]
-    pipeline = lgbm_classifier_pipeline
+    # pipelines = ["lgbm_classifier_pipeline", "knn_pipeline", "svc_pipeline", "mlp_pipeline", "rf_pipeline"]
+    pipeline = get_pipeline("lgbm_classifier_pipeline")  # Only the chosen pipeline is built, see Pipelines
 
     metric_definition = Metric(
         "roc_auc_ovo",
         minimize=False,
         bounds=(0, 1),
-        fn=get_scorer("roc_auc_ovo")
+        fn=get_timed_scorer(roc_auc_ovo_score, "predict_proba")  # same values as get_scorer("roc_auc_ovo")
     )
 
-    per_process_memory_limit = None  # (4, "GB")  # NOTE: May have issues on Mac
+    memory_fraction = 0.8  # Share of the free memory the trials may use, see MemoryBudget
+    warm_start_k = 10  # Number of the best configs of the original data run to start FE runs with
+    store_predictions = True  # Keep out-of-fold and test predictions of all trials for ensemble selection
     per_process_walltime_limit = None  # (60, "s")
 
     if debugging:
@@ -142,422 +134,143 @@ def main(args):
     else:
         max_trials = 100000  # trade-off between exploration and resource usage
         max_time = 3600  # one hour
-        n_workers = 4
+        n_workers = None  # chosen from the dataset size and the available cores, see CoreAllocation
         # Just mark the trial as fail and move on to the next one
         on_trial_exception = "continue"
         display = True
         wait_for_all_workers_to_finish = False
 
-    for fold in range(folds):
-        print(f"\n\n\n*******************************\n Fold {fold}\n*******************************\n")
-        inner_fold_seed = random_seed + fold
-        # for pipeline in pipelines:
+    # Core quota of the run, the FE methods use it and every trial gets its share (n_jobs)
+    set_core_quota(get_available_cores())
+
+    method_name, option = split_method(method)
+    pipeline_name = pipeline.name
+    print(f"{method_name} Data")
+
+    # Spans of the stages, written to the profiles directory of the run once the dataset name is known
+    trace = TraceRecorder(working_dir / "profiles" / f"{method}_trace.json" if args.profile else None)
+
+    # The data does not depend on the fold, so it is loaded and feature engineered once for all folds
+    from src.datasets.Datasets import get_dataset  # Not imported by the worker processes
+    with trace.span("load dataset", option=option):
+        train_x, train_y, test_x, test_y, task_hint, name = get_dataset(option=option)
+    print(name)
+    profile_dir = working_dir / "profiles" / f"{name}_{method}_{pipeline_name}"
+    trace.move(profile_dir / "trace.json")
+    dataset_hash = get_frame_hash(train_x, train_y, test_x, test_y)
+    results_store = ResultsStore()
+    # Folds of earlier runs are either in the results store or in a results file of the working dir
+    pending_folds = [
+        fold for fold in range(folds)
+        if rerun or not (
+            results_store.is_done(name, method_name, fold, pipeline_name)
+            or os.path.isfile(working_dir / f"results_{name}_{method}_{pipeline_name}_{fold}.parquet")
+        )
+    ]
+    if not pending_folds:
+        print("All folds exist, nothing to do")
+        return
+
+    if method_name != "original":
+        compute = partial(engineer_features, method_name, train_x, train_y, test_x, test_y, task_hint, name)
+        if trace.enabled:
+            compute = SampledCall(compute, profile_dir / "feature_engineering.folded")  # flamegraph of the method
         try:
-            if method.startswith("original"):
-                print("Original Data")
-                option = method[-2:]
-                try:
-                    int(option)
-                except ValueError:
-                    option = method[-1:]
-                int(option)
-                method.replace(option, "")
-                pipeline_name = pipeline.name
-                train_x, train_y, test_x, test_y, task_hint, name = get_dataset(option=int(option))
-                print(name)
-                file_name = f"results_{name}_{method}_{pipeline_name}_{fold}.parquet"
-                file = working_dir / file_name
-                if rerun or not os.path.isfile(file):
-                    evaluator = get_cv_evaluator(train_x, train_y, test_x, test_y, inner_fold_seed,
-                                                 on_trial_exception, task_hint)
-                    history = pipeline.optimize(
-                        target=evaluator.fn,
-                        metric=metric_definition,
-                        optimizer=optimizer_cls,
-                        seed=inner_fold_seed,
-                        max_trials=max_trials,
-                        timeout=max_time,
-                        display=display,
-                        wait=wait_for_all_workers_to_finish,
-                        n_workers=n_workers,
-                        on_trial_exception=on_trial_exception
-                    )
-                    if history.df() is None:
-                        df = pd.DataFrame()
-                    else:
-                        df = history.df()
-                    safe_dataframe(df, working_dir, name, fold, method, pipeline_name)
-
-            elif method.startswith("autofeat"):
-                print("autofeat Data")
-                option = method[-2:]
-                try:
-                    int(option)
-                except ValueError:
-                    option = method[-1:]
-                int(option)
-                method.replace(option, "")
-                pipeline_name = pipeline.name
-                try:
-                    train_x, train_y, test_x, test_y, task_hint, name = get_dataset(option=int(option))
-                    print(name)
-                    file_name = f"results_{name}_{method}_{pipeline_name}_{fold}.parquet"
-                    file = working_dir / file_name
-                    if rerun or not os.path.isfile(file):
-                        train_x, test_x = get_autofeat_features(train_x, train_y, test_x, task_hint, feat_eng_steps, feat_sel_steps)
-                        evaluator = get_cv_evaluator(train_x, train_y, test_x, test_y, inner_fold_seed,
-                                                     on_trial_exception, task_hint)
-                except:
-                    train_x, train_y, test_x, test_y, task_hint, name = get_dataset(option=int(option))
-                    print(name)
-                    file_name = f"results_{name}_{method}_{pipeline_name}_{fold}.parquet"
-                    file = working_dir / file_name
-                    if rerun or not os.path.isfile(file):
-                        train_x, test_x = get_autofeat_features(train_x, train_y, test_x, task_hint, feat_eng_steps-1,
-                                                                feat_sel_steps)
-                        evaluator = get_cv_evaluator(train_x, train_y, test_x, test_y, inner_fold_seed,
-                                                     on_trial_exception, task_hint)
-                    history = pipeline.optimize(
-                        target=evaluator.fn,
-                        metric=metric_definition,
-                        optimizer=optimizer_cls,
-                        seed=inner_fold_seed,
-                        max_trials=max_trials,
-                        timeout=max_time,
-                        display=display,
-                        wait=wait_for_all_workers_to_finish,
-                        n_workers=n_workers,
-                        on_trial_exception=on_trial_exception
-                    )
-                    if history.df() is None:
-                        df = pd.DataFrame()
-                    else:
-                        df = history.df()
-                    safe_dataframe(df, working_dir, name, fold, method, pipeline_name)
-
-            elif method.startswith("autogluon"):
-                print("autogluon Data")
-                option = method[-2:]
-                try:
-                    int(option)
-                except ValueError:
-                    option = method[-1:]
-                int(option)
-                method.replace(option, "")
-                pipeline_name = pipeline.name
-                train_x, train_y, test_x, test_y, task_hint, name = get_dataset(option=int(option))
-                print(name)
-                file_name = f"results_{name}_{method}_{pipeline_name}_{fold}.parquet"
-                file = working_dir / file_name
-                if rerun or not os.path.isfile(file):
-                    train_x, test_x = get_autogluon_features(train_x, train_y, test_x)
-                    evaluator = get_cv_evaluator(train_x, train_y, test_x, test_y, inner_fold_seed,
-                                                 on_trial_exception, task_hint)
-                    history = pipeline.optimize(
-                        target=evaluator.fn,
-                        metric=metric_definition,
-                        optimizer=optimizer_cls,
-                        seed=inner_fold_seed,
-                        max_trials=max_trials,
-                        timeout=max_time,
-                        display=display,
-                        wait=wait_for_all_workers_to_finish,
-                        n_workers=n_workers,
-                        on_trial_exception=on_trial_exception
-                    )
-                    if history.df() is None:
-                        df = pd.DataFrame()
-                    else:
-                        df = history.df()
-                    safe_dataframe(df, working_dir, name, fold, method, pipeline_name)
-
-            elif method.startswith("bioautoml"):
-                print("BioAutoML Data")
-                option = method[-2:]
-                try:
-                    int(option)
-                except ValueError:
-                    option = method[-1:]
-                int(option)
-                method.replace(option, "")
-                pipeline_name = pipeline.name
-                train_x, train_y, test_x, test_y, task_hint, name = get_dataset(option=int(option))
-                print(name)
-                file_name = f"results_{name}_{method}_{pipeline_name}_{fold}.parquet"
-                file = working_dir / file_name
-                if rerun or not os.path.isfile(file):
-                    train_x, test_x = get_bioautoml_features(train_x, train_y, test_x, estimations)
-                    evaluator = get_cv_evaluator(train_x, train_y, test_x, test_y, inner_fold_seed,
-                                                 on_trial_exception,
-                                                 task_hint)
-                    history = pipeline.optimize(
-                        target=evaluator.fn,
-                        metric=metric_definition,
-                        optimizer=optimizer_cls,
-                        seed=inner_fold_seed,
-                        max_trials=max_trials,
-                        timeout=max_time,
-                        display=display,
-                        wait=wait_for_all_workers_to_finish,
-                        n_workers=n_workers,
-                        on_trial_exception=on_trial_exception
-                    )
-                    if history.df() is None:
-                        df = pd.DataFrame()
-                    else:
-                        df = history.df()
-                    safe_dataframe(df, working_dir, name, fold, method, pipeline_name)
-
-            elif method.startswith("boruta"):
-                print("boruta Data")
-                option = method[-2:]
-                try:
-                    int(option)
-                except ValueError:
-                    option = method[-1:]
-                int(option)
-                method.replace(option, "")
-                pipeline_name = pipeline.name
-                train_x, train_y, test_x, test_y, task_hint, name = get_dataset(option=int(option))
-                print(name)
-                file_name = f"results_{name}_{method}_{pipeline_name}_{fold}.parquet"
-                file = working_dir / file_name
-                if rerun or not os.path.isfile(file):
-                    train_x, test_x = get_boruta_features(train_x, train_y, test_x)
-                    evaluator = get_cv_evaluator(train_x, train_y, test_x, test_y, inner_fold_seed,
-                                                 on_trial_exception, task_hint)
-                    history = pipeline.optimize(
-                        target=evaluator.fn,
-                        metric=metric_definition,
-                        optimizer=optimizer_cls,
-                        seed=inner_fold_seed,
-                        max_trials=max_trials,
-                        timeout=max_time,
-                        display=display,
-                        wait=wait_for_all_workers_to_finish,
-                        n_workers=n_workers,
-                        on_trial_exception=on_trial_exception
-                    )
-                    if history.df() is None:
-                        df = pd.DataFrame()
-                    else:
-                        df = history.df()
-                    safe_dataframe(df, working_dir, name, fold, method, pipeline_name)
-            elif method.startswith("caafe"):
-                print("CAAFE Data")
-                option = method[-2:]
-                try:
-                    int(option)
-                except ValueError:
-                    option = method[-1:]
-                int(option)
-                method.replace(option, "")
-                pipeline_name = pipeline.name
-                train_x, train_y, test_x, test_y, task_hint, name = get_dataset(option=int(option))
-                print(name)
-                file_name = f"results_{name}_{method}_{pipeline_name}_{fold}.parquet"
-                file = working_dir / file_name
-                if rerun or not os.path.isfile(file):
-                    train_x, test_x = get_correlationbased_features(train_x, train_y, test_x)
-                    evaluator = get_cv_evaluator(train_x, train_y, test_x, test_y, inner_fold_seed,
-                                                 on_trial_exception, task_hint)
-                    history = pipeline.optimize(
-                        target=evaluator.fn,
-                        metric=metric_definition,
-                        optimizer=optimizer_cls,
-                        seed=inner_fold_seed,
-                        max_trials=max_trials,
-                        timeout=max_time,
-                        display=display,
-                        wait=wait_for_all_workers_to_finish,
-                        n_workers=n_workers,
-                        on_trial_exception=on_trial_exception
-                    )
-                    if history.df() is None:
-                        df = pd.DataFrame()
-                    else:
-                        df = history.df()
-                    safe_dataframe(df, working_dir, name, fold, method, pipeline_name)
-
-            elif method.startswith("correlationBasedFS"):
-                print("CorrelationBasedFS Data")
-                option = method[-2:]
-                try:
-                    int(option)
-                except ValueError:
-                    option = method[-1:]
-                int(option)
-                method.replace(option, "")
-                pipeline_name = pipeline.name
-                train_x, train_y, test_x, test_y, task_hint, name = get_dataset(option=int(option))
-                print(name)
-                file_name = f"results_{name}_{method}_{pipeline_name}_{fold}.parquet"
-                file = working_dir / file_name
-                if rerun or not os.path.isfile(file):
-                    train_x, test_x = get_correlationbased_features(train_x, train_y, test_x)
-                    evaluator = get_cv_evaluator(train_x, train_y, test_x, test_y, inner_fold_seed,
-                                                 on_trial_exception, task_hint)
-                    history = pipeline.optimize(
-                        target=evaluator.fn,
-                        metric=metric_definition,
-                        optimizer=optimizer_cls,
-                        seed=inner_fold_seed,
-                        max_trials=max_trials,
-                        timeout=max_time,
-                        display=display,
-                        wait=wait_for_all_workers_to_finish,
-                        n_workers=n_workers,
-                        on_trial_exception=on_trial_exception
-                    )
-                    if history.df() is None:
-                        df = pd.DataFrame()
-                    else:
-                        df = history.df()
-                    safe_dataframe(df, working_dir, name, fold, method, pipeline_name)
-
-            elif method.startswith("featuretools"):
-                print("Featuretools Data")
-                option = method[-2:]
-                try:
-                    int(option)
-                except ValueError:
-                    option = method[-1:]
-                int(option)
-                method.replace(option, "")
-                pipeline_name = pipeline.name
-                train_x, train_y, test_x, test_y, task_hint, name = get_dataset(option=int(option))
-                print(name)
-                file_name = f"results_{name}_{method}_{pipeline_name}_{fold}.parquet"
-                file = working_dir / file_name
-                if rerun or not os.path.isfile(file):
-                    train_x, test_x = get_featuretools_features(train_x, train_y, test_x, test_y, name)
-                    evaluator = get_cv_evaluator(train_x, train_y, test_x, test_y, inner_fold_seed,
-                                                 on_trial_exception, task_hint)
-                    history = pipeline.optimize(
-                        target=evaluator.fn,
-                        metric=metric_definition,
-                        optimizer=optimizer_cls,
-                        seed=inner_fold_seed,
-                        max_trials=max_trials,
-                        timeout=max_time,
-                        display=display,
-                        wait=wait_for_all_workers_to_finish,
-                        n_workers=n_workers,
-                        on_trial_exception=on_trial_exception
-                    )
-                    if history.df() is None:
-                        df = pd.DataFrame()
-                    else:
-                        df = history.df()
-                    safe_dataframe(df, working_dir, name, fold, method, pipeline_name)
+            with trace.span("feature engineering", method=method_name):
+                train_x, test_x = get_or_compute_features(
+                    name, method_name, outer_fold, compute, base=(train_x, test_x)
+                )
+        except Exception as e:
+            print(e)
+            return
 
-            elif method.startswith("h2o"):
-                print("H2O Data")
-                option = method[-2:]
-                try:
-                    int(option)
-                except ValueError:
-                    option = method[-1:]
-                int(option)
-                method.replace(option, "")
-                pipeline_name = pipeline.name
-                train_x, train_y, test_x, test_y, task_hint, name = get_dataset(option=int(option))
-                print(name)
-                file_name = f"results_{name}_{method}_{pipeline_name}_{fold}.parquet"
-                file = working_dir / file_name
-                if rerun or not os.path.isfile(file):
-                    train_x, test_x = get_h2o_features(train_x, train_y, test_x)
-                    evaluator = get_cv_evaluator(train_x, train_y, test_x, test_y, inner_fold_seed,
-                                                 on_trial_exception, task_hint)
-                    history = pipeline.optimize(
-                        target=evaluator.fn,
-                        metric=metric_definition,
-                        optimizer=optimizer_cls,
-                        seed=inner_fold_seed,
-                        max_trials=max_trials,
-                        timeout=max_time,
-                        display=display,
-                        wait=wait_for_all_workers_to_finish,
-                        n_workers=n_workers,
-                        on_trial_exception=on_trial_exception
-                    )
-                    if history.df() is None:
-                        df = pd.DataFrame()
-                    else:
-                        df = history.df()
-                    safe_dataframe(df, working_dir, name, fold, method, pipeline_name)
+    features_hash = get_frame_hash(train_x, test_x)
 
-            elif method.startswith("mljar"):
-                print("MLJAR Data")
-                option = method[-2:]
-                try:
-                    int(option)
-                except ValueError:
-                    option = method[-1:]
-                int(option)
-                method.replace(option, "")
-                pipeline_name = pipeline.name
-                train_x, train_y, test_x, test_y, task_hint, name = get_dataset(option=int(option))
-                print(name)
-                file_name = f"results_{name}_{method}_{pipeline_name}_{fold}.parquet"
-                file = working_dir / file_name
-                if rerun or not os.path.isfile(file):
-                    train_x, test_x = get_mljar_features(train_x, train_y, test_x, num_features)
-                    evaluator = get_cv_evaluator(train_x, train_y, test_x, test_y, inner_fold_seed,
-                                                 on_trial_exception, task_hint)
-                    history = pipeline.optimize(
-                        target=evaluator.fn,
-                        metric=metric_definition,
-                        optimizer=optimizer_cls,
-                        seed=inner_fold_seed,
-                        max_trials=max_trials,
-                        timeout=max_time,
-                        display=display,
-                        wait=wait_for_all_workers_to_finish,
-                        n_workers=n_workers,
-                        on_trial_exception=on_trial_exception
-                    )
-                    if history.df() is None:
-                        df = pd.DataFrame()
-                    else:
-                        df = history.df()
-                    safe_dataframe(df, working_dir, name, fold, method, pipeline_name)
+    if n_workers is None:
+        allocation = CoreAllocation.for_data(*train_x.shape)
+    else:
+        allocation = CoreAllocation(n_cores=n_workers, n_workers=n_workers, n_jobs=1)
+    print(f"Using {allocation.n_workers} workers with {allocation.n_jobs} threads each")
+    memory_estimator = MemoryEstimator.for_data(train_x, train_y, test_x)
 
-            elif method.startswith("openfe"):
-                print("OpenFE Data")
-                option = method[-2:]
-                try:
-                    int(option)
-                except ValueError:
-                    option = method[-1:]
-                int(option)
-                method.replace(option, "")
-                pipeline_name = pipeline.name
-                train_x, train_y, test_x, test_y, task_hint, name = get_dataset(option=int(option))
-                print(name)
-                file_name = f"results_{name}_{method}_{pipeline_name}_{fold}.parquet"
-                file = working_dir / file_name
-                if rerun or not os.path.isfile(file):
-                    train_x, test_x = get_openFE_features(train_x, train_y, test_x, 1)
-                    evaluator = get_cv_evaluator(train_x, train_y, test_x, test_y, inner_fold_seed,
-                                                 on_trial_exception, task_hint)
-                    history = pipeline.optimize(
-                        target=evaluator.fn,
-                        metric=metric_definition,
-                        optimizer=optimizer_cls,
-                        seed=inner_fold_seed,
-                        max_trials=max_trials,
-                        timeout=max_time,
-                        display=display,
-                        wait=wait_for_all_workers_to_finish,
-                        n_workers=n_workers,
-                        on_trial_exception=on_trial_exception
-                    )
-                    if history.df() is None:
-                        df = pd.DataFrame()
-                    else:
-                        df = history.df()
-                    safe_dataframe(df, working_dir, name, fold, method, pipeline_name)
+    for fold in pending_folds:
+        print(f"\n\n\n*******************************\n Fold {fold}\n*******************************\n")
+        inner_fold_seed = random_seed + fold
+        # for pipeline in pipelines:
+        try:
+            evaluator = get_evaluator(pipeline, train_x, train_y, test_x, test_y, inner_fold_seed,
+                                      on_trial_exception, task_hint, store_predictions, max_time)
+            anytime_log = AnytimeLog(
+                working_dir / "anytime_logs" / f"{name}_{method}_{pipeline_name}_{fold}",
+                name, method, fold, metric_definition.name, metric_definition.minimize,
+            )
+            memory_budget = MemoryBudget.for_node(memory_fraction)
+            results = results_store.writer(name, method_name, fold, pipeline_name)
+            # Reports of an earlier, killed run of the fold are replayed, only its remaining time is spent
+            memo = TrialMemo(get_run_key(dataset_hash, features_hash, fold, pipeline_name))
+            if rerun:
+                memo.clear()
+            remaining_time = max(1.0, max_time - memo.get_elapsed())
+            predictions_dir = working_dir / "predictions" / f"{name}_{method}_{pipeline_name}_{fold}"
+            if len(memo) == 0:
+                shutil.rmtree(predictions_dir, ignore_errors=True)  # Predictions of an earlier run of the fold
+            predictions = PredictionStore(predictions_dir)
+            warm_start_configs = []
+            if method_name != "original":
+                warm_start_configs = results_store.get_top_configs(
+                    warm_start_k, dataset=name, method="original", fold=fold, classifier=pipeline_name
+                )
+                print(f"Warm starting with {len(warm_start_configs)} configs of the original data")
+
+            def on_report(report):
+                if not {"replayed_from", "duplicate_of"} & report.summary.keys():
+                    anytime_log.add(report)
+                results.add(report)
+                if store_predictions:
+                    predictions.add(report)
+
+            with trace.span("optimize", fold=fold, timeout=remaining_time):
+                history = optimize(
+                    pipeline,
+                    evaluator.fn,
+                    metric_definition,
+                    optimizer_cls,
+                    allocation,
+                    seed=inner_fold_seed,
+                    max_trials=max_trials,
+                    timeout=remaining_time,
+                    display=display,
+                    wait=wait_for_all_workers_to_finish,
+                    on_trial_exception=on_trial_exception,
+                    on_report=on_report,
+                    memory_budget=memory_budget,
+                    memory_estimator=memory_estimator,
+                    optimizer_kwargs={"warm_start_configs": warm_start_configs, "memo": memo},
+                )
+            anytime_log.close()
+            results.close()
+            results_store.compact(name, method_name, fold)
+            print(f"Stored {len(history)} trials of fold {fold} in {results.path}")
+            if pipeline.nodes[-1].item.__name__ == "SVC":
+                # SVC trials are scored by the decision function, the final config by calibrated probabilities
+                with trace.span("calibration", fold=fold):
+                    calibrated = get_calibrated_result(history, pipeline, metric_definition, train_x, train_y,
+                                                       test_x, test_y, inner_fold_seed)
+                if calibrated is not None:
+                    print(f"Calibrated SVC of {calibrated['trial']}: test "
+                          f"{calibrated[f'test_{metric_definition.name}']:.4f}")
+                    predictions_dir.mkdir(parents=True, exist_ok=True)
+                    with open(predictions_dir / "calibrated_svc.json", "w") as f:
+                        json.dump(calibrated, f, indent=2, default=str)
+            if len(predictions) > 0:
+                with trace.span("ensemble selection", fold=fold):
+                    weights, val_score, test_predictions = get_ensemble_selection(predictions, train_y)
+                print(f"Ensemble of {len(weights)} trials: val {val_score:.4f}", end="")
+                if test_predictions is not None:
+                    print(f", test {get_ensemble_score(test_y, test_predictions):.4f}", end="")
+                print()
+                with open(predictions.directory / "ensemble_weights.json", "w") as f:
+                    json.dump(weights, f, indent=2)
         except Exception as e:
             print(e)
 
@@ -565,5 +278,7 @@ def main(args):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Run feature engineering methods')
     parser.add_argument('--method', type=str, required=True, help='Feature engineering method to use')
+    parser.add_argument('--profile', action='store_true',
+                        help='Write a Chrome trace of the stages and a flamegraph of the FE method to the working dir')
     args = parser.parse_args()
     main(args)
@@ -0,0 +1,45 @@
+import time
+from pathlib import Path
+
+import pandas as pd
+
+
+class PartWriter:
+    """Append records to a directory of parquet part files.
+
+    Records are buffered and written as a new part file every `flush_every` records or
+    `flush_interval` seconds, so everything up to the last flush survives a killed job.
+    The directory can be read as a whole with `pd.read_parquet(directory)`.
+    """
+
+    def __init__(self, directory, flush_every=50, flush_interval=60.0, prefix="part"):
+        self.directory = Path(directory)
+        self.prefix = prefix
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._records = []
+        self._last_flush = time.time()
+
+    def append(self, record: dict) -> None:
+        self._records.append(record)
+        if len(self._records) >= self.flush_every or time.time() - self._last_flush > self.flush_interval:
+            self.flush()
+
+    def flush(self) -> Path | None:
+        self._last_flush = time.time()
+        if not self._records:
+            return None
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = write_part(pd.DataFrame(self._records), self.directory, self.prefix)
+        self._records = []
+        return path
+
+
+def write_part(df: pd.DataFrame, directory, prefix="part") -> Path:
+    """Write a dataframe as a new part file of the directory."""
+    path = Path(directory) / f"{prefix}-{time.time_ns()}.parquet"
+    # Write to a hidden name first, so readers never see a half written part
+    tmp_path = path.with_name(f".{path.name}")
+    df.to_parquet(tmp_path, index=False)
+    tmp_path.rename(path)
+    return path
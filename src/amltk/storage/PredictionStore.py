@@ -0,0 +1,127 @@
+import json
+from pathlib import Path
+
+import numpy as np
+from amltk import Trial
+
+oof_file = "oof_predictions.npy"
+test_file = "test_predictions.npy"
+
+
+def add_split_predictions(trial: Trial, n_rows, val_index, val_predictions, test_predictions=None) -> None:
+    """Collect the predictions of one split of a trial, inside the worker.
+
+    Validation predictions fill the out-of-fold rows of the split, rows that are validated in
+    several splits (repeated k-fold) and the test predictions are averaged over the splits.
+    """
+    val_predictions = np.asarray(val_predictions, dtype=np.float32)
+    if "oof_predictions" not in trial.extras:
+        trial.extras["oof_predictions"] = np.zeros((n_rows, val_predictions.shape[1]), dtype=np.float32)
+        trial.extras["n_oof_predictions"] = np.zeros(n_rows, dtype=np.int32)
+        trial.extras["test_predictions"] = None
+        trial.extras["n_test_predictions"] = 0
+    trial.extras["oof_predictions"][val_index] += val_predictions
+    trial.extras["n_oof_predictions"][val_index] += 1
+    if test_predictions is not None:
+        test_predictions = np.asarray(test_predictions, dtype=np.float32)
+        if trial.extras["test_predictions"] is None:
+            trial.extras["test_predictions"] = np.zeros_like(test_predictions)
+        trial.extras["test_predictions"] += test_predictions
+        trial.extras["n_test_predictions"] += 1
+
+
+def store_trial_predictions(report: Trial.Report) -> None:
+    """Move the collected predictions of a successful trial to its bucket, so they are not sent back with the report.
+
+    Rows that were in no validation split (holdout) are NaN.
+    """
+    trial = report.trial
+    oof_predictions = trial.extras.pop("oof_predictions", None)
+    n_oof_predictions = trial.extras.pop("n_oof_predictions", None)
+    test_predictions = trial.extras.pop("test_predictions", None)
+    n_test_predictions = trial.extras.pop("n_test_predictions", 0)
+    if oof_predictions is None or report.status != Trial.Status.SUCCESS:
+        return
+    with np.errstate(invalid="ignore"):
+        files = {oof_file: oof_predictions / n_oof_predictions[:, np.newaxis]}
+    if test_predictions is not None:
+        files[test_file] = test_predictions / n_test_predictions
+    trial.store(files)
+
+
+class PredictionStore:
+    """Out-of-fold and test predictions of the trials of a run, as float32 memory maps.
+
+    Rows of the arrays are trials, in the order they were added. The arrays are split
+    into files of `chunk_size` trials, so the store can grow without knowing the number
+    of trials in advance. The trial names are appended to `trials.txt` after their
+    predictions are written, so an interrupted write never shows up as a trial.
+    """
+
+    def __init__(self, directory, chunk_size=256):
+        self.directory = Path(directory)
+        self.chunk_size = chunk_size
+        self.meta = None
+        self.names = []
+        self._chunks = {}
+        if (self.directory / "meta.json").is_file():
+            self.meta = json.loads((self.directory / "meta.json").read_text())
+            self.chunk_size = self.meta["chunk_size"]
+        if (self.directory / "trials.txt").is_file():
+            self.names = (self.directory / "trials.txt").read_text().splitlines()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _get_chunk(self, kind, chunk) -> np.memmap:
+        if (kind, chunk) not in self._chunks:
+            path = self.directory / f"{kind}-{chunk}.npy"
+            if path.is_file():
+                self._chunks[kind, chunk] = np.load(path, mmap_mode="r+")
+            else:
+                n_rows = self.meta["n_rows"] if kind == "oof" else self.meta["n_test"]
+                self._chunks[kind, chunk] = np.lib.format.open_memmap(
+                    path, mode="w+", dtype=np.float32, shape=(self.chunk_size, n_rows, self.meta["n_classes"])
+                )
+        return self._chunks[kind, chunk]
+
+    def add_predictions(self, name, oof_predictions, test_predictions=None) -> None:
+        if self.meta is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self.meta = {
+                "n_rows": oof_predictions.shape[0],
+                "n_test": 0 if test_predictions is None else test_predictions.shape[0],
+                "n_classes": oof_predictions.shape[1],
+                "chunk_size": self.chunk_size,
+            }
+            (self.directory / "meta.json").write_text(json.dumps(self.meta))
+        chunk, row = divmod(len(self.names), self.chunk_size)
+        oof = self._get_chunk("oof", chunk)
+        oof[row] = oof_predictions
+        oof.flush()
+        if test_predictions is not None and self.meta["n_test"] > 0:
+            test = self._get_chunk("test", chunk)
+            test[row] = test_predictions
+            test.flush()
+        with open(self.directory / "trials.txt", "a") as f:
+            f.write(f"{name}\n")
+        self.names.append(name)
+
+    def add(self, report: Trial.Report) -> None:
+        """Move the predictions of a finished trial from its bucket into the store."""
+        bucket = report.trial.bucket
+        if oof_file not in bucket:
+            return
+        oof_predictions = bucket[oof_file].load()
+        test_predictions = bucket[test_file].load() if test_file in bucket else None
+        self.add_predictions(report.name, oof_predictions, test_predictions)
+        bucket[oof_file].remove()
+        if test_predictions is not None:
+            bucket[test_file].remove()
+
+    def get_oof_predictions(self, rows) -> np.ndarray:
+        """Out-of-fold predictions of the trials at the given rows, shape (trials, n_rows, n_classes)."""
+        return np.stack([self._get_chunk("oof", row // self.chunk_size)[row % self.chunk_size] for row in rows])
+
+    def get_test_predictions(self, rows) -> np.ndarray:
+        return np.stack([self._get_chunk("test", row // self.chunk_size)[row % self.chunk_size] for row in rows])
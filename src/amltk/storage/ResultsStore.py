@@ -0,0 +1,217 @@
+import re
+from pathlib import Path
+
+import pandas as pd
+import pyarrow.parquet as pq
+from amltk import Trial
+
+from src.amltk.storage.Parquet import PartWriter, write_part
+
+results_store_dir = Path("src/amltk/results/results_store")
+roc_auc_column = "metric:roc_auc_ovo [0.0, 1.0] (maximize)"
+partition_keys = ["dataset", "method", "fold", "classifier"]
+
+
+def get_dataset_label(dataset) -> str:
+    """Dataset name as in `tabular_data.parquet`, e.g. "credit_g_dataset" -> "creditg".
+
+    The partitions keep the names of the runs (see `get_dataset`), so runs find their results.
+    """
+    return str(dataset).removesuffix("_dataset").replace("_", "")
+
+
+class ResultsWriter:
+    """Streams the reports of one (dataset, method, fold, classifier) run into the store."""
+
+    def __init__(self, store, dataset, method, fold, classifier, **writer_kwargs):
+        self.store = store
+        self.keys = {"dataset": str(dataset), "method": str(method), "fold": int(fold), "classifier": str(classifier)}
+        self.path = store.get_partition_path(dataset, method, fold)
+        self.writer = PartWriter(self.path, prefix=classifier, **writer_kwargs)
+
+    def add(self, report: Trial.Report) -> None:
+        record = report.df().reset_index().iloc[0].to_dict()
+        self.writer.append({**self.keys, **record})
+
+    def close(self, done=True) -> None:
+        """Flush the remaining reports and mark the run as complete."""
+        self.writer.flush()
+        if done:
+            self.path.mkdir(parents=True, exist_ok=True)
+            (self.path / f"_{self.keys['classifier']}.done").touch()
+
+
+class ResultsStore:
+    """Append-only store of AMLTK trial histories, partitioned by dataset, method and fold.
+
+    Every partition is a directory `dataset=<name>/method=<method>/fold=<fold>` holding
+    one or more part files per classifier, named `<classifier>-<time>.parquet`. Runs
+    stream their reports into new part files as trials finish and `compact` merges the
+    parts of each partition into a single file. Reads only open the partitions and
+    columns they need.
+    """
+
+    def __init__(self, directory=results_store_dir):
+        self.directory = Path(directory)
+
+    def get_partition_path(self, dataset, method, fold) -> Path:
+        return self.directory / f"dataset={dataset}" / f"method={method}" / f"fold={fold}"
+
+    def writer(self, dataset, method, fold, classifier, **writer_kwargs) -> ResultsWriter:
+        """Start a run, the parts of a previous unfinished run of the same classifier are removed."""
+        for file in self.get_files(dataset, method, fold, classifier):
+            file.unlink()
+        return ResultsWriter(self, dataset, method, fold, classifier, **writer_kwargs)
+
+    def is_done(self, dataset, method, fold, classifier) -> bool:
+        return (self.get_partition_path(dataset, method, fold) / f"_{classifier}.done").is_file()
+
+    def get_partitions(self, dataset=None, method=None, fold=None) -> list[Path]:
+        pattern = "/".join([
+            f"dataset={'*' if dataset is None else dataset}",
+            f"method={'*' if method is None else method}",
+            f"fold={'*' if fold is None else fold}",
+        ])
+        return sorted(path for path in self.directory.glob(pattern) if path.is_dir())
+
+    def get_files(self, dataset=None, method=None, fold=None, classifier=None) -> list[Path]:
+        files = []
+        for partition in self.get_partitions(dataset, method, fold):
+            files += sorted(partition.glob(f"{'*' if classifier is None else classifier}-*.parquet"))
+        return files
+
+    def load(self, columns=None, dataset=None, method=None, fold=None, classifier=None) -> pd.DataFrame:
+        """Load the trials of the selected partitions.
+
+        Args:
+            columns: Columns to read besides the partition keys and the trial name, all if None.
+            dataset: Only load this dataset, all if None.
+            method: Only load this feature engineering method, all if None.
+            fold: Only load this fold, all if None.
+            classifier: Only load this classifier (pipeline name), all if None.
+        """
+        dfs = []
+        for file in self.get_files(dataset, method, fold, classifier):
+            file_columns = None
+            if columns is not None:
+                names = pq.read_schema(file).names
+                file_columns = [column for column in partition_keys + ["name"] + list(columns) if column in names]
+            dfs.append(pd.read_parquet(file, columns=file_columns))
+        if not dfs:
+            return pd.DataFrame()
+        df = pd.concat(dfs, ignore_index=True)
+        # A compaction that was interrupted before removing its parts leaves duplicate trials
+        return df.drop_duplicates(subset=partition_keys + ["name"], keep="last").reset_index(drop=True)
+
+    def compact(self, dataset=None, method=None, fold=None) -> int:
+        """Merge the part files of each classifier in the selected partitions into one file.
+
+        Partitions that already hold a single file per classifier are skipped, so repeated
+        calls only touch what was written since the last compaction.
+
+        Returns:
+            The number of files that were merged.
+        """
+        n_merged = 0
+        for partition in self.get_partitions(dataset, method, fold):
+            files_per_classifier = {}
+            for file in sorted(partition.glob("*-*.parquet")):
+                files_per_classifier.setdefault(file.name.rsplit("-", 1)[0], []).append(file)
+            for classifier, files in files_per_classifier.items():
+                if len(files) < 2:
+                    continue
+                df = pd.concat([pd.read_parquet(file) for file in files], ignore_index=True)
+                df = df.drop_duplicates(subset=["name"], keep="last")
+                write_part(df, partition, prefix=classifier)
+                for file in files:
+                    file.unlink()
+                n_merged += len(files)
+        return n_merged
+
+    def get_fold_values(self, metric_column=roc_auc_column, **filters) -> pd.DataFrame:
+        """Average metric value of the successful trials of every (dataset, method, fold, classifier)."""
+        df = self.load(columns=["status", metric_column], **filters)
+        if df.empty or metric_column not in df.columns:
+            return pd.DataFrame(columns=partition_keys + ["Value"])
+        df = df[df["status"] == "success"]
+        return (
+            df.groupby(partition_keys)[metric_column].mean()
+            .rename("Value")
+            .reset_index()
+        )
+
+    def get_top_configs(self, k, metric_column=roc_auc_column, minimize=False, **filters) -> list[dict]:
+        """Configs of the k best successful trials, without the "config:" prefix of their keys."""
+        df = self.load(**filters)
+        if df.empty or metric_column not in df.columns:
+            return []
+        df = df[df["status"] == "success"].sort_values(metric_column, ascending=minimize).head(k)
+        config_columns = [column for column in df.columns if column.startswith("config:")]
+        return [
+            {column[len("config:"):]: value for column, value in row.items() if not pd.isna(value)}
+            for row in df[config_columns].astype(object).to_dict("records")
+        ]
+
+    def get_tabular_data(self, metric_column=roc_auc_column, **filters) -> pd.DataFrame:
+        """Table of "mean ± std" over the folds per dataset (rows) and method (columns).
+
+        This is the table of `tabular_data.parquet`, with its dataset names (see
+        `get_dataset_label`), missing combinations are "Failed".
+        """
+        df = self.get_fold_values(metric_column, **filters)
+        df["dataset"] = df["dataset"].map(get_dataset_label)
+        df_summary = df.groupby(["dataset", "method"])["Value"].agg(["mean", "std"]).reset_index()
+        df_summary["std"] = df_summary["std"].fillna(0)
+        df_summary["Value_with_StdDev"] = [
+            f"{mean} ± {std}" for mean, std in zip(df_summary["mean"], df_summary["std"])
+        ]
+        pivot_table = df_summary.pivot(index="dataset", columns="method", values="Value_with_StdDev").fillna("Failed")
+        pivot_table.index.name = "Dataset"
+        pivot_table.columns.name = "Method"
+        return pivot_table.reset_index()
+
+
+def import_results(directory, store: ResultsStore) -> int:
+    """Copy the `results_<dataset>_<method>_<classifier>_<fold>.parquet` files of a directory into the store.
+
+    The datasets keep the names of the runs (e.g. "credit_g_dataset"), like the partitions
+    the runner writes, `get_tabular_data` turns them into the names of the old table.
+
+    Returns:
+        The number of imported files.
+    """
+    n_imported = 0
+    pattern = re.compile(r"results_(?P<dataset>.+_dataset)_(?P<method>[^_]+)_(?P<classifier>.+)_(?P<fold>\d+)\.parquet")
+    for file in sorted(Path(directory).glob("results_*.parquet")):
+        match = pattern.fullmatch(file.name)
+        if match is None:
+            print(f"Skipping {file}, the name does not match the results pattern")
+            continue
+        df = pd.read_parquet(file)
+        if df.empty:
+            continue
+        keys = match.groupdict()
+        method = keys["method"].rstrip("0123456789")
+        df = df.reset_index() if "name" not in df.columns else df
+        df.insert(0, "classifier", keys["classifier"])
+        df.insert(0, "fold", int(keys["fold"]))
+        df.insert(0, "method", method)
+        df.insert(0, "dataset", keys["dataset"])
+        for old_file in store.get_files(keys["dataset"], method, keys["fold"], keys["classifier"]):
+            old_file.unlink()
+        partition = store.get_partition_path(keys["dataset"], method, keys["fold"])
+        partition.mkdir(parents=True, exist_ok=True)
+        write_part(df, partition, prefix=keys["classifier"])
+        (partition / f"_{keys['classifier']}.done").touch()
+        n_imported += 1
+    return n_imported
+
+
+if __name__ == "__main__":
+    results_store = ResultsStore()
+    for try_dir in ["first_try", "second_try", "third_try"]:
+        print(f"Imported {import_results(Path('src/amltk/results') / try_dir, results_store)} files of {try_dir}")
+    print(f"Merged {results_store.compact()} files")
+    tabular_data = results_store.get_tabular_data()
+    print(tabular_data)
+    tabular_data.to_parquet(results_store.directory / "tabular_data.parquet")
@@ -0,0 +1,83 @@
+import hashlib
+import json
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+from amltk import Trial
+
+trial_memo_dir = Path("src/amltk/results/trial_memo")
+
+
+def get_frame_hash(*frames) -> str:
+    """Fingerprint of the content of data frames or arrays, e.g. of a dataset or its feature engineered version."""
+    hashes = [
+        int(pd.util.hash_pandas_object(pd.DataFrame(frame), index=False).sum()) if frame is not None else None
+        for frame in frames
+    ]
+    return hashlib.sha1(repr(hashes).encode()).hexdigest()
+
+
+def get_run_key(dataset_hash, features_hash, fold, pipeline_name) -> str:
+    return hashlib.sha1(repr((dataset_hash, features_hash, int(fold), str(pipeline_name))).encode()).hexdigest()
+
+
+class TrialMemo:
+    """Reports of the finished trials of one run, so a restarted run does not evaluate them again.
+
+    The memo of a run is a JSON lines file named by the run key (dataset, feature
+    engineered data, fold and pipeline, see `get_run_key`). Every successful report is
+    appended as soon as it arrives, under its config hash and trial seed, so a killed run
+    loses at most the trials that were running. Pass the memo to `RandomSearch`, which
+    replays the reports of the configs it asks for again.
+    """
+
+    def __init__(self, run_key, directory=trial_memo_dir):
+        self.path = Path(directory) / f"{run_key}.jsonl"
+        self.started_at = datetime.now().isoformat()
+        self._reports: dict[str, dict] = {}
+        self._sessions: dict[str, list[str]] = defaultdict(list)  # Report times of every earlier run
+        if self.path.is_file():
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Last line of a killed run
+                    self._sessions[record.pop("memo_session")].append(record["reported_at"])
+                    self._reports[record.pop("memo_key")] = record
+            print(f"Loaded {len(self._reports)} reports of an earlier run from {self.path}")
+
+    def __len__(self) -> int:
+        return len(self._reports)
+
+    @staticmethod
+    def get_key(config_hash, seed) -> str:
+        return f"{config_hash}-{seed}"
+
+    def get(self, config_hash, seed) -> Trial.Report | None:
+        record = self._reports.get(self.get_key(config_hash, seed))
+        return Trial.Report.from_dict(record) if record is not None else None
+
+    def add(self, config_hash, report: Trial.Report) -> None:
+        key = self.get_key(config_hash, report.trial.seed)
+        if report.status is not Trial.Status.SUCCESS or key in self._reports:
+            return
+        record = json.loads(report.df().reset_index().to_json(orient="records", date_format="iso", lines=True))
+        self._reports[key] = record
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps({"memo_key": key, "memo_session": self.started_at, **record}) + "\n")
+
+    def get_elapsed(self) -> float:
+        """Seconds the earlier runs spent, from their start to their last stored report."""
+        return sum(
+            (max(pd.Timestamp(time) for time in reported_at) - pd.Timestamp(started_at)).total_seconds()
+            for started_at, reported_at in self._sessions.items()
+        )
+
+    def clear(self) -> None:
+        self._reports.clear()
+        self._sessions.clear()
+        self.path.unlink(missing_ok=True)
@@ -0,0 +1,157 @@
+import shutil
+import tempfile
+import time
+
+import pandas as pd
+from autogluon.tabular import TabularDataset, TabularPredictor
+
+from src.amltk.evaluation.Profiling import TraceRecorder
+from src.amltk.resources.Cores import get_core_quota, set_core_quota
+from src.amltk.resources.Memory import MemoryWatchdog, get_job_memory_limit
+from src.amltk.resources.TimeBudget import TimeBudget
+from src.autogluon.AutoGluonResults import save_leaderboard, save_result
+from src.datasets.Manifest import load_manifest_entry
+
+eval_metrics = {
+    "regression": "root_mean_squared_error",
+    "binary": "roc_auc",
+    "multiclass": "log_loss",
+}
+
+
+def get_typed_data(x: pd.DataFrame, y: pd.Series, label) -> TabularDataset:
+    """Features and target in one frame for AutoGluon, with the categorical columns kept and float ones as float32.
+
+    AutoGluon's feature generators handle categories and missing values themselves, so
+    nothing is encoded or imputed. Rows without a target are dropped.
+    """
+    x = x.astype(dict.fromkeys(x.select_dtypes(include="float64").columns, "float32"))
+    x[label] = y.to_numpy()
+    if y.isna().any():
+        x = x[y.notna().to_numpy()]
+    return TabularDataset(x)
+
+
+def run_autogluon_job(
+        entry,
+        time_budget=14400,
+        num_cpus=8,
+        memory_limit=None,
+        max_memory_usage_ratio=1.0,
+        disk_lean=False,
+        preprocess=False,
+        trace=None,
+) -> dict:
+    """Fit and evaluate AutoGluon on the feature engineered dataset of one manifest entry.
+
+    The time the FE method needed, normalised to this node, is subtracted from the time
+    budget (in seconds), see TimeBudget. The job gets a core quota of `num_cpus` (at most
+    the quota of its process). The run may use `memory_limit` bytes (the free
+    memory of the node if None), AutoGluon plans its models for that limit and a
+    MemoryWatchdog stops the run if it exceeds it anyway.
+
+    The typed frames are given to AutoGluon as they are (see `get_typed_data`), unless
+    `preprocess`, which factorizes and imputes them first like the earlier runs.
+
+    With a TraceRecorder as `trace`, the stages of the job are recorded as spans.
+
+    With `disk_lean`, the models are written to a temporary directory (on the local scratch
+    of the node, see TMPDIR) that is deleted after a successful run, only the leaderboard
+    and the result with the timings and the best model are kept.
+
+    Returns:
+        The result of the run, which is also stored, with its status ("success" or
+        "memory-limit"), the test metrics, fit and predict times, the best model and the
+        peak memory.
+    """
+    dataset, method, task_type, label = entry["dataset"], entry["method"], entry["task_type"], entry["label"]
+    trace = TraceRecorder() if trace is None else trace
+    print(f"\n****************************************\n{dataset} - {method}\n****************************************")
+    time_limit, fe_charge = TimeBudget(time_budget).get_remaining(entry)
+    memory_limit = get_job_memory_limit() if memory_limit is None else int(memory_limit)
+    # AutoGluon's model workers and their BLAS/OpenMP threads stay within num_cpus
+    num_cpus = set_core_quota(min(num_cpus, get_core_quota()))
+    print(f"Time limit: {time_limit:.0f}s (FE charged {fe_charge:.0f}s), memory limit: {memory_limit / 2 ** 30:.1f} GB")
+
+    with trace.span("load data", dataset=dataset, method=method):
+        # The train and test split of the dataset, the one the FE method was fit on
+        train_x, train_y, test_x, test_y = load_manifest_entry(entry)
+
+    with trace.span("prepare data", preprocess=preprocess):
+        if preprocess:
+            # Imported on demand, Datasets also imports the dataset downloaders
+            from src.datasets.Datasets import preprocess_data, preprocess_target
+            train_x, test_x = preprocess_data(train_x, test_x)
+            train_y = preprocess_target(train_y)
+            test_y = preprocess_target(test_y)
+            train_data = TabularDataset(pd.concat([train_x, train_y], axis=1))
+            test_data = TabularDataset(pd.concat([test_x, test_y], axis=1))
+        else:
+            train_data = get_typed_data(train_x, train_y, label)
+            test_data = get_typed_data(test_x, test_y, label)
+
+    model_dir = tempfile.mkdtemp(prefix=f"autogluon-{dataset}-{method}-") if disk_lean else None
+    result = {
+        "status": "memory-limit",
+        "time_limit": time_limit,
+        "fe_charge": fe_charge,
+        "memory_limit": memory_limit,
+        "metrics": None,
+    }
+
+    def on_kill():
+        # The watchdog exits the process, as the run did not stop in time
+        save_result(entry, {**result, "peak_memory": watchdog.peak})
+
+    with MemoryWatchdog(memory_limit, on_kill=on_kill) as watchdog:
+        try:
+            start_time = time.time()
+            with trace.span("fit", time_limit=time_limit):
+                predictor = TabularPredictor(
+                    label=label,
+                    verbosity=0,
+                    problem_type=task_type,
+                    eval_metric=eval_metrics[task_type],
+                    path=model_dir,
+                ).fit(
+                    train_data,
+                    time_limit=time_limit,
+                    num_cpus=num_cpus,
+                    memory_limit=memory_limit / 2 ** 30,  # in GB
+                    ag_args_fit={"max_memory_usage_ratio": max_memory_usage_ratio},
+                )
+            fit_time = time.time() - start_time
+            start_time = time.time()
+            with trace.span("evaluate"):
+                metrics = predictor.evaluate(test_data)
+            predict_time = time.time() - start_time
+            with trace.span("leaderboard"):
+                leaderboard = predictor.leaderboard(test_data)
+            best_model = leaderboard[leaderboard["model"] == predictor.model_best].iloc[0]
+            result = {
+                **result,
+                "status": "success",
+                "metrics": metrics,
+                "fit_time": fit_time,
+                "predict_time": predict_time,
+                "best_model": {
+                    "model": best_model["model"],
+                    "score_val": best_model["score_val"],
+                    "fit_time": best_model["fit_time"],
+                    "pred_time_val": best_model["pred_time_val"],
+                },
+                "n_models": len(leaderboard),
+                "model_dir": None if disk_lean else predictor.path,
+            }
+            save_leaderboard(entry, leaderboard)
+        except KeyboardInterrupt:
+            if not watchdog.exceeded:
+                raise
+    result["peak_memory"] = watchdog.peak
+    print(result)
+    save_result(entry, result)
+    if disk_lean and result["status"] == "success":
+        shutil.rmtree(model_dir, ignore_errors=True)
+    elif disk_lean:
+        print(f"Keeping the models of the failed run in {model_dir}")
+    return result
@@ -0,0 +1,55 @@
+import json
+from pathlib import Path
+
+import pandas as pd
+
+autogluon_results_dir = Path("src/autogluon/results")
+
+
+def get_result_path(dataset, method, fold, directory=autogluon_results_dir) -> Path:
+    return Path(directory) / str(dataset) / str(method) / f"fold_{fold}.json"
+
+
+def save_result(entry, result, directory=autogluon_results_dir) -> Path:
+    """Store the outcome of the AutoGluon run on a manifest entry, e.g. its status and test metrics."""
+    path = get_result_path(entry["dataset"], entry["method"], entry["fold"], directory)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    record = {"dataset": entry["dataset"], "method": entry["method"], "fold": entry["fold"], **result}
+    # Written to a temporary file first, a result is never half written
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(record, f, default=float)
+    tmp_path.replace(path)
+    return path
+
+
+def save_leaderboard(entry, leaderboard: pd.DataFrame, directory=autogluon_results_dir) -> Path:
+    """Store the AutoGluon leaderboard (validation and test score and times of every model) next to the result."""
+    path = get_result_path(entry["dataset"], entry["method"], entry["fold"], directory).with_suffix(".leaderboard.parquet")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    leaderboard.to_parquet(path)
+    return path
+
+
+def load_leaderboards(directory=autogluon_results_dir) -> pd.DataFrame:
+    """All stored leaderboards as one table, with the dataset, method and fold of every row."""
+    leaderboards = []
+    for path in sorted(Path(directory).glob("*/*/fold_*.leaderboard.parquet")):
+        leaderboard = pd.read_parquet(path)
+        leaderboard.insert(0, "fold", int(path.name.split(".")[0].removeprefix("fold_")))
+        leaderboard.insert(0, "method", path.parent.name)
+        leaderboard.insert(0, "dataset", path.parent.parent.name)
+        leaderboards.append(leaderboard)
+    return pd.concat(leaderboards, ignore_index=True) if leaderboards else pd.DataFrame()
+
+
+def load_results(directory=autogluon_results_dir) -> pd.DataFrame:
+    """All stored AutoGluon results as one table, one row per (dataset, method, fold).
+
+    Nested values are flattened into columns, e.g. "metrics.roc_auc" or "best_model.model".
+    """
+    records = []
+    for path in sorted(Path(directory).glob("*/*/fold_*.json")):
+        with open(path) as f:
+            records.append(json.load(f))
+    return pd.json_normalize(records)
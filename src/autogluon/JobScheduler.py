@@ -0,0 +1,96 @@
+import multiprocessing
+import time
+from multiprocessing.connection import wait
+
+from src.amltk.resources.Cores import get_available_cores
+from src.amltk.resources.Memory import MemoryBudget, memory_limit_exit_code
+from src.amltk.resources.TimeBudget import TimeBudget
+
+
+class JobScheduler:
+    """Packs concurrent AutoGluon fits into the cores and memory of one node.
+
+    Every job declares `job_cpus` cores and `job_memory` bytes, by default an equal share of
+    the memory budget for every job that fits into the cores, and gets that memory as the
+    limit its MemoryWatchdog enforces. Jobs are started longest predicted duration first,
+    as long as their declaration fits next to the running jobs, and every finished job
+    immediately frees its share for the next ones. A job is predicted to use its whole time
+    limit until a job on the same dataset has finished, then it is predicted to take as
+    long as the slowest of those, so the queue is reordered as small datasets turn out to
+    finish far before their time limit.
+    """
+
+    def __init__(self, run, n_cores=None, memory_budget=None, job_cpus=8, job_memory=None, time_budget=14400):
+        self.run = run  # Called with the manifest index and the memory limit of a job in a new process
+        self.n_cores = get_available_cores() if n_cores is None else n_cores
+        self.memory_budget = MemoryBudget.for_node() if memory_budget is None else memory_budget
+        self.job_cpus = min(job_cpus, self.n_cores)
+        n_concurrent_jobs = self.n_cores // self.job_cpus
+        self.job_memory = self.memory_budget.total // n_concurrent_jobs if job_memory is None else job_memory
+        self.time_budget = TimeBudget(time_budget)
+        self.durations: dict[str, list[float]] = {}
+
+    def get_predicted_duration(self, entry) -> float:
+        durations = self.durations.get(entry["dataset"])
+        if durations:
+            return max(durations)
+        return self.time_budget.get_remaining(entry, warn=False)[0]
+
+    def get_queue(self, jobs: dict[int, dict]) -> list[int]:
+        """Indices of the jobs, longest predicted duration first, larger datasets first on ties."""
+        return sorted(
+            jobs,
+            key=lambda index: (
+                -self.get_predicted_duration(jobs[index]),
+                -jobs[index]["n_train"] * jobs[index]["n_features"],
+                index,
+            ),
+        )
+
+    def run_all(self, jobs: dict[int, dict]) -> dict[int, dict]:
+        """Run all jobs, given as manifest index -> manifest entry.
+
+        Returns:
+            The status ("success", "memory-limit" or "failed"), exit code and duration in
+            seconds of every job.
+        """
+        if not self.memory_budget.can_ever_fit(self.job_memory):
+            raise ValueError(f"A job needs {self.job_memory} bytes, but the node only has {self.memory_budget.total}")
+        context = multiprocessing.get_context("spawn")
+        pending = dict(jobs)
+        running = {}  # sentinel -> (index, process, start time)
+        results = {}
+        while pending or running:
+            used_cpus = len(running) * self.job_cpus
+            for index in self.get_queue(pending):
+                if used_cpus + self.job_cpus > self.n_cores or not self.memory_budget.fits(self.job_memory):
+                    break
+                process = context.Process(target=self.run, args=(index, self.job_memory), name=f"autogluon-{index}")
+                process.start()
+                self.memory_budget.reserve(index, self.job_memory)
+                running[process.sentinel] = (index, process, time.monotonic())
+                used_cpus += self.job_cpus
+                del pending[index]
+                print(f"Started job {index} ({jobs[index]['dataset']} - {jobs[index]['method']}), "
+                      f"{len(running)} running, {len(pending)} pending")
+            if not running:
+                # Not even a single job fits into the free memory, wait until other processes free some
+                time.sleep(10)
+                continue
+            for sentinel in wait(list(running)):
+                index, process, start_time = running.pop(sentinel)
+                process.join()
+                duration = time.monotonic() - start_time
+                self.memory_budget.release(index)
+                if process.exitcode == 0:
+                    status = "success"
+                    # Only finished jobs predict the duration of the other jobs on the dataset
+                    self.durations.setdefault(jobs[index]["dataset"], []).append(duration)
+                elif process.exitcode == memory_limit_exit_code:
+                    # Stopped by its MemoryWatchdog, which stored the result of the run
+                    status = "memory-limit"
+                else:
+                    status = "failed"
+                results[index] = {"status": status, "exitcode": process.exitcode, "duration": duration}
+                print(f"Finished job {index} ({status}, exit code {process.exitcode}) after {duration:.0f}s")
+        return results
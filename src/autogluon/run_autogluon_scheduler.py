@@ -0,0 +1,47 @@
+import argparse
+
+from src.amltk.resources.Memory import MemoryBudget
+from src.autogluon.JobScheduler import JobScheduler
+from src.datasets.Manifest import read_manifest
+
+
+def run_job(index, memory_limit):
+    # Imported in the job process only, the scheduler does not need AutoGluon
+    from src.autogluon.run_autogluon_parallel import main as run_autogluon
+    run_autogluon(argparse.Namespace(job=index, memory_limit=memory_limit, profile=False))
+
+
+def main(args):
+    n_cores = None  # all cores of the node (or of the SLURM allocation)
+    memory_fraction = 0.8  # share of the free memory of the node the jobs may reserve
+    job_cpus = 8  # num_cpus of every TabularPredictor.fit
+    job_memory = None  # bytes, None for an equal share of the memory budget per concurrent job
+    time_budget = 14400  # 4h in seconds, minus the time needed for feature engineering
+
+    entries = read_manifest()
+    first = args.first
+    last = len(entries) - 1 if args.last is None else min(args.last, len(entries) - 1)
+    jobs = {index: entries[index] for index in range(first, last + 1)}
+    print(f"Scheduling {len(jobs)} of {len(entries)} manifest entries")
+
+    scheduler = JobScheduler(
+        run_job,
+        n_cores=n_cores,
+        memory_budget=MemoryBudget.for_node(memory_fraction),
+        job_cpus=job_cpus,
+        job_memory=job_memory,
+        time_budget=time_budget,
+    )
+    results = scheduler.run_all(jobs)
+    out_of_memory = sorted(index for index, result in results.items() if result["status"] == "memory-limit")
+    failed = sorted(index for index, result in results.items() if result["status"] == "failed")
+    print(f"{len(results) - len(out_of_memory) - len(failed)} jobs finished, "
+          f"{len(out_of_memory)} ran out of memory: {out_of_memory}, {len(failed)} failed: {failed}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run AutoGluon on the manifest entries concurrently on one node')
+    parser.add_argument('--first', type=int, default=0, help='Index of the first manifest entry to run')
+    parser.add_argument('--last', type=int, default=None, help='Index of the last manifest entry to run')
+    args = parser.parse_args()
+    main(args)
@@ -7,6 +7,8 @@ from sklearn.impute import SimpleImputer
 from sklearn.model_selection import train_test_split
 from ucimlrepo import fetch_ucirepo
 
+from src.datasets.Synthetic import get_synthetic_dataset, synthetic_options
+
 
 def get_california_housing_dataset() -> tuple[
     pd.DataFrame,
@@ -449,6 +451,11 @@ def get_dataset(option) -> tuple[
         outer_fold_number = 0
         train_x, train_y, test_x, test_y = get_openml_dataset(openml_task_id=openml_task_id, fold=outer_fold_number)
         return train_x, train_y, test_x, test_y, task_hint, name
+    #### SYNTHETIC ####
+    # generated offline for scaling curves (options 101 - 125, see synthetic_options)
+    elif option in synthetic_options:
+        train_x, train_y, test_x, test_y, name, task_hint = get_synthetic_dataset(**synthetic_options[option])
+        return train_x, train_y, test_x, test_y, task_hint, name
 
 
 def get_old_dataset(option) -> tuple[
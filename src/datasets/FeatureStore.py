@@ -0,0 +1,210 @@
+import json
+import time
+from pathlib import Path
+from typing import Callable
+
+import pandas as pd
+
+from src.amltk.resources.Cores import get_core_quota
+from src.amltk.resources.TimeBudget import CPUTimer, get_node_speed
+
+artifact_dir = Path("src/datasets/feature_engineered_datasets/artifacts")
+base_method = "original"  # Method name of the unchanged dataset, the base of the delta artifacts
+
+
+def get_artifact_path(dataset_name, method, fold, directory=artifact_dir) -> Path:
+    return Path(directory) / str(dataset_name) / str(method) / f"fold_{fold}"
+
+
+def get_target(y) -> pd.Series:
+    """The target as a series, also if it is given as a single column data frame."""
+    return y.iloc[:, 0] if isinstance(y, pd.DataFrame) else pd.Series(y)
+
+
+def get_base_path(path, base_method=base_method) -> Path:
+    """Artifact directory of the base data (the original dataset) of the same dataset and fold."""
+    path = Path(path)
+    return path.parent.parent / base_method / path.name
+
+
+def get_meta(path) -> dict | None:
+    path = Path(path)
+    if not (path / "meta.json").is_file():
+        return None
+    with open(path / "meta.json") as f:
+        return json.load(f)
+
+
+def get_shared_columns(train_x, test_x, base_train_x, base_test_x) -> list[str]:
+    """Columns that are unchanged copies (same name, dtype and values) of columns of the base data."""
+    return [
+        column for column in train_x.columns
+        if column in base_train_x.columns
+        and train_x[column].equals(base_train_x[column])
+        and test_x[column].equals(base_test_x[column])
+    ]
+
+
+def save_features(
+        train_x,
+        test_x,
+        dataset_name,
+        method,
+        fold,
+        execution_time,
+        directory=artifact_dir,
+        train_y=None,
+        test_y=None,
+        cpu_time=None,
+) -> Path:
+    """Store the feature engineered train and test data of one (dataset, method, fold).
+
+    Columns are stored with string names, as parquet does not support anything else.
+    The targets are stored next to the features if given, e.g. for the AutoGluon stage.
+    With the CPU seconds of the method, its core quota and the speed of the node are stored,
+    so the time budget of later stages can charge FE independently of the node (see TimeBudget).
+
+    If the original data of the dataset and fold is stored (as method "original"), only the
+    delta to it is written: the names of the original columns the method kept unchanged and
+    the columns it added. Selection methods (e.g. boruta) then store a list of names only,
+    additive ones (e.g. openfe) only their new columns. `load_artifact` builds the frames on read.
+    """
+    path = get_artifact_path(dataset_name, method, fold, directory)
+    path.mkdir(parents=True, exist_ok=True)
+    train_x = pd.DataFrame(train_x).reset_index(drop=True)
+    test_x = pd.DataFrame(test_x).reset_index(drop=True)
+    train_x.columns = train_x.columns.astype(str)
+    test_x.columns = test_x.columns.astype(str)
+
+    base_path = get_base_path(path)
+    base_meta = get_meta(base_path) if str(method) != base_method else None
+    shared_columns = []
+    if (
+            base_meta is not None
+            and base_meta["n_train"] == len(train_x)
+            and base_meta["n_test"] == len(test_x)
+            and train_x.columns.is_unique
+    ):
+        base_train_x, base_test_x = load_artifact(base_path)
+        shared_columns = get_shared_columns(train_x, test_x, base_train_x, base_test_x)
+    if shared_columns:
+        added_columns = [column for column in train_x.columns if column not in set(shared_columns)]
+        train_x[added_columns].to_parquet(path / "added_train_x.parquet")
+        test_x[added_columns].to_parquet(path / "added_test_x.parquet")
+        for file in ["train_x.parquet", "test_x.parquet"]:
+            (path / file).unlink(missing_ok=True)  # of an earlier full write
+    else:
+        train_x.to_parquet(path / "train_x.parquet")
+        test_x.to_parquet(path / "test_x.parquet")
+
+    label = None
+    targets_in_base = False
+    if train_y is not None and test_y is not None:
+        train_y, test_y = get_target(train_y), get_target(test_y)
+        label = str(train_y.name) if train_y.name is not None else "target"
+        train_y = train_y.rename(label).reset_index(drop=True)
+        test_y = test_y.rename(label).reset_index(drop=True)
+        if base_meta is not None and base_meta.get("label") == label:
+            base_train_y, base_test_y = load_targets(base_path)
+            targets_in_base = train_y.equals(base_train_y) and test_y.equals(base_test_y)
+        if not targets_in_base:
+            train_y.to_frame().to_parquet(path / "train_y.parquet")
+            test_y.to_frame().to_parquet(path / "test_y.parquet")
+    meta = {
+        "dataset": str(dataset_name),
+        "method": str(method),
+        "fold": int(fold),
+        "execution_time": float(execution_time),
+        "cpu_time": None if cpu_time is None else float(cpu_time),
+        "node_speed": None if cpu_time is None else get_node_speed(),
+        "core_quota": None if cpu_time is None else get_core_quota(),
+        "n_train": len(train_x),
+        "n_test": len(test_x),
+        "n_features": train_x.shape[1],
+        "label": label,
+        "storage": "delta" if shared_columns else "full",
+        "base": base_method if shared_columns or targets_in_base else None,
+        "base_columns": shared_columns,
+        "columns": list(train_x.columns),
+        "targets_in_base": targets_in_base,
+    }
+    # Written last, a directory without meta.json is an interrupted write
+    with open(path / "meta.json", "w") as f:
+        json.dump(meta, f)
+    return path
+
+
+def load_artifact(path) -> tuple[
+    pd.DataFrame,
+    pd.DataFrame
+]:
+    """Load the train and test features stored in the artifact directory `path`, full or as delta to the base data."""
+    path = Path(path)
+    meta = get_meta(path)
+    if meta.get("storage", "full") == "full":
+        return pd.read_parquet(path / "train_x.parquet"), pd.read_parquet(path / "test_x.parquet")
+    base_path = get_base_path(path, meta["base"])
+    frames = []
+    for split in ["train", "test"]:
+        base = pd.read_parquet(base_path / f"{split}_x.parquet", columns=meta["base_columns"])
+        added = pd.read_parquet(path / f"added_{split}_x.parquet")
+        frames.append(pd.concat([base, added], axis=1)[meta["columns"]])
+    return frames[0], frames[1]
+
+
+def load_features(dataset_name, method, fold, directory=artifact_dir) -> tuple[
+    pd.DataFrame,
+    pd.DataFrame
+] | None:
+    path = get_artifact_path(dataset_name, method, fold, directory)
+    if not (path / "meta.json").is_file():
+        return None
+    return load_artifact(path)
+
+
+def load_targets(path) -> tuple[pd.Series, pd.Series]:
+    """Load the train and test targets stored in the artifact directory `path` (or in its base data)."""
+    path = Path(path)
+    meta = get_meta(path)
+    if meta is not None and meta.get("targets_in_base"):
+        path = get_base_path(path, meta["base"])
+    train_y = pd.read_parquet(path / "train_y.parquet").iloc[:, 0]
+    test_y = pd.read_parquet(path / "test_y.parquet").iloc[:, 0]
+    return train_y, test_y
+
+
+def get_or_compute_features(
+        dataset_name,
+        method,
+        fold,
+        compute: Callable[[], tuple[pd.DataFrame, pd.DataFrame]],
+        directory=artifact_dir,
+        base=None,
+) -> tuple[
+    pd.DataFrame,
+    pd.DataFrame
+]:
+    """Load the stored features of (dataset, method, fold) or compute and store them once.
+
+    Args:
+        dataset_name: Name of the dataset.
+        method: Name of the feature engineering method.
+        fold: Outer fold of the dataset the features were computed on.
+        compute: Called without arguments if no artifact exists, returns train_x, test_x.
+        directory: Root directory of the artifact store.
+        base: The original train_x, test_x, stored once so the features are stored as delta to them.
+    """
+    features = load_features(dataset_name, method, fold, directory)
+    if features is not None:
+        print(f"Loading stored {method} features of {dataset_name} (fold {fold})")
+        return features
+    print(f"Computing {method} features of {dataset_name} (fold {fold})")
+    if base is not None and get_meta(get_artifact_path(dataset_name, base_method, fold, directory)) is None:
+        save_features(base[0], base[1], dataset_name, base_method, fold, 0, directory)
+    start_time = time.time()
+    with CPUTimer() as cpu_timer:
+        train_x, test_x = compute()
+    execution_time = time.time() - start_time
+    cpu_time = cpu_timer.cpu_time
+    save_features(train_x, test_x, dataset_name, method, fold, execution_time, directory, cpu_time=cpu_time)
+    return load_features(dataset_name, method, fold, directory)
@@ -0,0 +1,66 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.datasets.FeatureStore import get_target, load_artifact, load_targets
+
+manifest_path = Path("src/datasets/feature_engineered_datasets/manifest.jsonl")
+
+
+def get_task_type(task_hint, y) -> str:
+    """The problem type of AutoGluon ("regression", "binary" or "multiclass") from the task hint and the target."""
+    if "regression" in task_hint:
+        return "regression"
+    return "binary" if len(np.unique(get_target(y).dropna())) <= 2 else "multiclass"
+
+
+def add_to_manifest(artifact_path, task_type, manifest=manifest_path) -> dict:
+    """Append the artifact of one (dataset, method, fold), written by `save_features` with targets, to the manifest.
+
+    Every line of the manifest is one JSON record with the dataset, method, fold, task type,
+    label column, artifact path and FE runtime, so later stages never parse file names.
+    """
+    artifact_path = Path(artifact_path)
+    with open(artifact_path / "meta.json") as f:
+        meta = json.load(f)
+    if meta.get("label") is None:
+        raise ValueError(f"The artifact {artifact_path} holds no targets, store them with save_features")
+    entry = {**meta, "task_type": task_type, "path": str(artifact_path)}
+    manifest = Path(manifest)
+    manifest.parent.mkdir(parents=True, exist_ok=True)
+    # A single short append per line, so concurrent FE jobs can share the manifest
+    with open(manifest, "a") as f:
+        f.write(json.dumps(entry) + "\n")
+    return entry
+
+
+def read_manifest(manifest=manifest_path) -> list[dict]:
+    """All entries of the manifest, the latest one of every (dataset, method, fold), sorted by them.
+
+    The order is stable for a given manifest, so an entry can be chosen by its index, e.g.
+    by the SLURM array task id.
+    """
+    entries = {}
+    if Path(manifest).is_file():
+        with open(manifest) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Line of a killed FE job
+                entries[(entry["dataset"], entry["method"], entry["fold"])] = entry
+    return [entries[key] for key in sorted(entries)]
+
+
+def load_manifest_entry(entry) -> tuple[
+    pd.DataFrame,
+    pd.Series,
+    pd.DataFrame,
+    pd.Series
+]:
+    """Load the train and test features and targets of a manifest entry."""
+    train_x, test_x = load_artifact(entry["path"])
+    train_y, test_y = load_targets(entry["path"])
+    return train_x, train_y, test_x, test_y
@@ -303,29 +303,20 @@ def get_splits(X, y) -> tuple[
     pd.DataFrame,
     pd.Series
 ]:
-    column_names = X.columns
-    target_name = y.name
-
-    X = np.array(X)
-    y = np.array(y)
-
+    """Split the data in half, keeping the dtypes of the columns (e.g. categorical ones)."""
     splits = get_cv_split_for_data(
-        X,
-        y,
+        np.arange(len(X)).reshape(-1, 1),  # Only the number of rows matters for the split
+        np.array(y),
         splits_seed=42,
         n_splits=2,
         stratified_split=False,
         # auto_fix_stratified_splits=True
     )
 
-    train_x = pd.DataFrame(X[splits[0][0]])
-    train_x.columns = column_names
-    train_y = pd.Series(y[splits[0][0]])
-    train_y.name = target_name
+    train_x = X.iloc[splits[0][0]].reset_index(drop=True)
+    train_y = y.iloc[splits[0][0]].reset_index(drop=True)
 
-    test_x = pd.DataFrame(X[splits[0][1]])
-    test_x.columns = column_names
-    test_y = pd.Series(y[splits[0][1]])
-    test_y.name = target_name
+    test_x = X.iloc[splits[0][1]].reset_index(drop=True)
+    test_y = y.iloc[splits[0][1]].reset_index(drop=True)
 
     return train_x, train_y, test_x, test_y
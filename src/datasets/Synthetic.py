@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+from scipy.special import ndtr
+
+# Dataset options of get_dataset for scaling curves, with the arguments of get_synthetic_dataset
+synthetic_options = {
+    # n scaling (p = 100)
+    101: {"n_samples": 1_000, "n_features": 100},
+    102: {"n_samples": 10_000, "n_features": 100},
+    103: {"n_samples": 100_000, "n_features": 100},
+    104: {"n_samples": 1_000_000, "n_features": 100},
+    105: {"n_samples": 10_000_000, "n_features": 100},
+    # p scaling (n = 10000)
+    111: {"n_samples": 10_000, "n_features": 10},
+    112: {"n_samples": 10_000, "n_features": 1_000},
+    113: {"n_samples": 10_000, "n_features": 10_000},
+    # data quality (n = 10000, p = 100)
+    121: {"n_samples": 10_000, "n_features": 100, "cardinality": 1_000},
+    122: {"n_samples": 10_000, "n_features": 100, "missing_rate": 0.2},
+    123: {"n_samples": 10_000, "n_features": 100, "imbalance": 20.0},
+    124: {"n_samples": 10_000, "n_features": 100, "n_classes": 5},
+    125: {"n_samples": 10_000, "n_features": 100, "n_classes": 0},
+}
+
+
+def get_synthetic_name(n_samples, n_features, n_classes, categorical_fraction, cardinality, missing_rate,
+                       imbalance, informative_fraction, redundant_fraction, noise, test_size, seed) -> str:
+    task = "regression" if n_classes == 0 else f"classes{n_classes}"
+    return (f"synthetic_{task}_n{n_samples}_p{n_features}_cat{categorical_fraction:g}_card{cardinality}"
+            f"_miss{missing_rate:g}_imb{imbalance:g}_inf{informative_fraction:g}_red{redundant_fraction:g}"
+            f"_noise{noise:g}_test{test_size:g}_seed{seed}")
+
+
+def get_synthetic_dataset(
+        n_samples=10_000,
+        n_features=100,
+        n_classes=2,
+        categorical_fraction=0.2,
+        cardinality=10,
+        missing_rate=0.0,
+        imbalance=1.0,
+        informative_fraction=0.1,
+        redundant_fraction=0.1,
+        noise=0.1,
+        test_size=0.2,
+        seed=0,
+) -> tuple[
+    pd.DataFrame,
+    pd.Series,
+    pd.DataFrame,
+    pd.Series,
+    str,
+    str
+]:
+    """Generate a synthetic tabular task, without downloads and the same for the same arguments.
+
+    The features are standard normal (float32). Of them, `informative_fraction` decide the
+    target, half of those linearly and half in products of pairs, so feature engineering can
+    find them. `redundant_fraction` are noisy sums of two different informative features (a
+    noisy copy if there is only one), the rest is noise. `categorical_fraction` of all features
+    are binned into `cardinality` categories and `missing_rate` of the values of every feature
+    are missing. With `n_classes` = 0 the task is regression, otherwise the target is split
+    into classes whose sizes fall off geometrically from the largest to the smallest one by
+    a factor of `imbalance`.
+
+    Every column is drawn from its own seed, so the frame is built one column at a time into
+    the numeric block (n_samples * n_features * 4 bytes at most). Adding the categorical
+    columns with pd.concat copies that block before pandas 3 (which copies on write only),
+    so the memory peak can be twice the frame.
+    The rows are independent, the last `test_size` of them are the test set.
+
+    Returns:
+        The train and test features and targets, the name and the task hint, "classification" or
+        "regression" as CVEvaluation expects it.
+    """
+    rng = np.random.default_rng([seed, 0])
+    n_informative = max(1, int(round(informative_fraction * n_features)))
+    n_redundant = min(int(round(redundant_fraction * n_features)), n_features - n_informative)
+    roles = np.array(["informative"] * n_informative + ["redundant"] * n_redundant
+                     + ["noise"] * (n_features - n_informative - n_redundant))
+    rng.shuffle(roles)
+    informative = np.flatnonzero(roles == "informative")
+    categorical = np.zeros(n_features, dtype=bool)
+    categorical[rng.choice(n_features, int(round(categorical_fraction * n_features)), replace=False)] = True
+    name = get_synthetic_name(n_samples, n_features, n_classes, categorical_fraction, cardinality, missing_rate,
+                              imbalance, informative_fraction, redundant_fraction, noise, test_size, seed)
+    print(f"Generating {name}")
+
+    def get_column(position) -> np.ndarray:
+        return np.random.default_rng([seed, 1, position]).standard_normal(n_samples, dtype=np.float32)
+
+    # Target from the informative columns, linear terms first, then products of pairs
+    n_linear = (len(informative) + 1) // 2
+    score = np.zeros(n_samples)
+    for position in informative[:n_linear]:
+        score += rng.normal() * get_column(position)
+    for first, second in zip(informative[n_linear::2], informative[n_linear + 1::2]):
+        score += rng.normal() * get_column(first) * get_column(second)
+    score /= max(1.0, score.std())
+    score += noise * np.random.default_rng([seed, 2]).standard_normal(n_samples)
+    if n_classes == 0:
+        task_hint = "regression"
+        y = pd.Series(score, name="target")
+    else:
+        task_hint = "classification"
+        proportions = imbalance ** -np.linspace(0, 1, n_classes)
+        thresholds = np.quantile(score, np.cumsum(proportions / proportions.sum())[:-1])
+        # Lowest scores first, class_0 is the largest class
+        codes = np.searchsorted(thresholds, score)
+        y = pd.Series(pd.Categorical.from_codes(codes, categories=[f"class_{k}" for k in range(n_classes)]),
+                      name="target")
+
+    numeric_positions = np.flatnonzero(~categorical)
+    numeric = np.empty((n_samples, len(numeric_positions)), dtype=np.float32, order="F")
+    categorical_columns = {}
+    code_dtype = np.int16 if cardinality < 2 ** 15 else np.int32
+    categories = [f"c{k}" for k in range(cardinality)]
+    numeric_index = {position: index for index, position in enumerate(numeric_positions)}
+    for position in range(n_features):
+        if roles[position] == "redundant":
+            sources = np.random.default_rng([seed, 3, position]).choice(
+                informative, min(2, len(informative)), replace=False
+            )
+            column = sum(get_column(source) for source in sources)
+            column += np.float32(noise) * get_column(position)
+            column /= np.float32(np.sqrt(len(sources) + noise ** 2))
+        else:
+            column = get_column(position)
+        missing = np.random.default_rng([seed, 4, position]).random(n_samples) < missing_rate
+        if categorical[position]:
+            # Equally likely categories, in the order of the latent values
+            codes = np.minimum(ndtr(column) * cardinality, cardinality - 1).astype(code_dtype)
+            codes[missing] = -1
+            categorical_columns[f"f{position}"] = pd.Categorical.from_codes(codes, categories=categories)
+        else:
+            column[missing] = np.nan
+            numeric[:, numeric_index[position]] = column
+
+    # The transposed Fortran array is the block pandas stores, so the frame itself does not copy it
+    X = pd.DataFrame(numeric, columns=[f"f{position}" for position in numeric_positions], copy=False)
+    if categorical_columns:
+        X = pd.concat([X, pd.DataFrame(categorical_columns)], axis=1)
+    n_train = n_samples - int(round(test_size * n_samples))
+    train_x, test_x = X.iloc[:n_train], X.iloc[n_train:].reset_index(drop=True)
+    train_y, test_y = y.iloc[:n_train], y.iloc[n_train:].reset_index(drop=True)
+    return train_x, train_y, test_x, test_y, name, task_hint
+
+
+def get_synthetic_task(task_id) -> tuple[
+    pd.DataFrame,
+    pd.Series,
+    pd.DataFrame,
+    pd.Series,
+    str,
+    str
+]:
+    """Synthetic task of a task id like "synthetic:104" (an option of `synthetic_options`) or
+    "synthetic:n_samples=100000,n_features=1000,missing_rate=0.1" (arguments of get_synthetic_dataset)."""
+    spec = task_id.removeprefix("synthetic:")
+    if spec.isdigit():
+        return get_synthetic_dataset(**synthetic_options[int(spec)])
+    kwargs = {}
+    for item in filter(None, spec.split(",")):
+        key, value = item.split("=")
+        value = float(value)
+        kwargs[key] = int(value) if value.is_integer() else value
+    return get_synthetic_dataset(**kwargs)
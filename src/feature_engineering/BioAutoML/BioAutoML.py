@@ -11,6 +11,8 @@ from sklearn.metrics import f1_score, balanced_accuracy_score
 from sklearn.model_selection import StratifiedKFold, cross_val_score
 from sklearn.metrics import make_scorer
 
+from src.amltk.resources.Cores import get_n_jobs
+
 
 global global_train_y
 
@@ -81,7 +83,7 @@ def feature_engineering(estimations, train, train_labels, test):
 
 def objective_rf(space):
     fasta_label_train = 2
-    n_cpu = 1
+    n_cpu = get_n_jobs(1)
 
     """Automated Feature Engineering - Objective Function - Bayesian Optimization"""
 
@@ -1,4 +1,5 @@
 # https://github.com/scikit-learn-contrib/boruta_py
+from src.amltk.resources.Cores import get_n_jobs
 from src.datasets.Datasets import preprocess_data
 from src.feature_engineering.Boruta.method import BorutaPy
 
@@ -10,7 +11,7 @@ def get_boruta_features(train_x, train_y, test_x) -> tuple[
     pd.DataFrame,
     pd.DataFrame
 ]:
-    rf = RandomForestClassifier(n_jobs=-1, class_weight='balanced', max_depth=5)
+    rf = RandomForestClassifier(n_jobs=get_n_jobs(), class_weight='balanced', max_depth=5)
     feat_selector = BorutaPy(rf, n_estimators="auto", verbose=2)
 
     train_x, test_x = preprocess_data(train_x, test_x)
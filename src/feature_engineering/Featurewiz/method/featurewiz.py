@@ -84,6 +84,7 @@ import dask.dataframe as dd
 #import dask_xgboost
 import xgboost
 from dask.distributed import Client, progress
+from src.amltk.resources.Cores import get_core_quota, get_n_jobs
 import psutil
 import json
 from sklearn.model_selection import train_test_split
@@ -745,7 +746,7 @@ def featurewiz(dataname, target, corr_limit=0.8, verbose=0, sep=",", header=0,
     cpu_tree_method = 'hist'
     tree_method = 'hist'
     n_estimators = 100
-    cpu_params['nthread'] = -1
+    cpu_params['nthread'] = get_n_jobs()
     cpu_params['tree_method'] = 'hist'
     cpu_params['eta'] = 0.01
     cpu_params['subsample'] = 0.5
@@ -761,7 +762,7 @@ def featurewiz(dataname, target, corr_limit=0.8, verbose=0, sep=",", header=0,
     if GPU_exists:
         ### This has been fixed ###
         tree_method = 'gpu_hist'
-        param['nthread'] = -1
+        param['nthread'] = get_n_jobs()
         param['tree_method'] = 'gpu_hist'
         param['eta'] = 0.01
         param['subsample'] = 0.5
@@ -1407,11 +1408,11 @@ def FE_perform_recursive_xgboost(train, target, model_type, multi_label_type,
             
             if multi_label_type:
                 if model_type == 'Regression':
-                    clf = XGBRegressor(n_jobs=-1, n_estimators=100, max_depth=4, random_state=99)
+                    clf = XGBRegressor(n_jobs=get_n_jobs(), n_estimators=100, max_depth=4, random_state=99)
                     clf.set_params(**params)
                     bst = MultiOutputRegressor(clf)
                 else:
-                    clf = XGBClassifier(n_jobs=-1, n_estimators=100, max_depth=4, random_state=99)
+                    clf = XGBClassifier(n_jobs=get_n_jobs(), n_estimators=100, max_depth=4, random_state=99)
                     clf.set_params(**params)
                     bst = MultiOutputClassifier(clf)
                 bst.fit(X_train, y_train)
@@ -1520,7 +1521,8 @@ def FE_perform_recursive_xgboost(train, target, model_type, multi_label_type,
 ################################################################################
 import multiprocessing
 def get_cpu_worker_count():
-    return multiprocessing.cpu_count()
+    # The core quota of the process instead of all cores of the node
+    return get_core_quota()
 #############################################################################################
 from itertools import combinations
 import matplotlib.patches as mpatches
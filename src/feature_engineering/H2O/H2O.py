@@ -5,6 +5,7 @@ import pandas as pd
 from h2o.assembly import *
 from h2o.transforms.preprocessing import *
 
+from src.amltk.resources.Cores import get_n_jobs
 from src.datasets.Datasets import preprocess_data
 
 
@@ -17,7 +18,7 @@ def get_h2o_features(train_x, train_y, test_x) -> tuple[
     for column in test_x.select_dtypes(include=['object', 'category']).columns:
         test_x[column], uniques = pd.factorize(test_x[column])
 
-    h2o.init()
+    h2o.init(nthreads=get_n_jobs())
 
     X_train_h2o = h2o.H2OFrame(train_x)
     X_test_h2o = h2o.H2OFrame(test_x)
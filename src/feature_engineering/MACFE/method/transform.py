@@ -1,4 +1,6 @@
 import numpy as np
+
+from src.amltk.resources.Cores import get_n_jobs
 from sklearn.preprocessing import StandardScaler, MinMaxScaler, RobustScaler
 from src.feature_engineering.MACFE.method.metafeatures import get_metafeatures_dataset, get_histogram
 from src.feature_engineering.MACFE.method.unary_transformations import Transformations as Unary_transformations
@@ -63,7 +65,7 @@ def transform_unary(X, y, column_names, TRM_dataset):
         ds_encodings = np.nan_to_num(ds_encodings)
 
     # Get 1 neighbor for each feature
-    nbrs = NearestNeighbors(n_neighbors=1, algorithm='ball_tree', metric='euclidean', n_jobs=-1).fit(
+    nbrs = NearestNeighbors(n_neighbors=1, algorithm='ball_tree', metric='euclidean', n_jobs=get_n_jobs()).fit(
         TRM_dataset[:, :-1])
     indices = nbrs.kneighbors(ds_encodings, return_distance=False)
 
@@ -104,7 +106,7 @@ def transform_binary(X, y, column_names, TRM_binary_dataset):
     new_column_names = []
     new_features = []
 
-    nbrs = NearestNeighbors(n_neighbors=1, algorithm='ball_tree', metric='euclidean', n_jobs=-1).fit(
+    nbrs = NearestNeighbors(n_neighbors=1, algorithm='ball_tree', metric='euclidean', n_jobs=get_n_jobs()).fit(
         TRM_binary_dataset[:, :-1])
 
     # Get the encodings of all the features in dataset
@@ -163,7 +165,7 @@ def transform_scaler(X, y, column_names, TRM_scaler):
         ds_encoding = np.nan_to_num(ds_encoding)
 
     # get similar dataset
-    nbrs = NearestNeighbors(n_neighbors=1, algorithm='ball_tree', metric='euclidean', n_jobs=-1).fit(TRM_scaler[:, :-1])
+    nbrs = NearestNeighbors(n_neighbors=1, algorithm='ball_tree', metric='euclidean', n_jobs=get_n_jobs()).fit(TRM_scaler[:, :-1])
     neigh_index = nbrs.kneighbors([ds_encoding], return_distance=False)[0]
 
     # get scaler index
@@ -3,11 +3,14 @@
 import pandas as pd
 from openfe import OpenFE, transform
 
+from src.amltk.resources.Cores import get_n_jobs
+
 
 def get_openFE_features(train_x, train_y, test_x, n_jobs) -> tuple[
     pd.DataFrame,
     pd.DataFrame
 ]:
+    n_jobs = get_n_jobs(n_jobs)
     openFE = OpenFE()
     features = openFE.fit(train_x, label=train_y, n_jobs=n_jobs)  # generate new features
     train_x, test_x = transform(train_x, test_x, features, n_jobs=n_jobs)
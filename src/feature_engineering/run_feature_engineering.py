@@ -3,6 +3,7 @@ import time
 import pandas as pd
 from pynisher import limit, WallTimeoutException, MemoryLimitException
 
+from src.amltk.resources.Cores import get_available_cores, set_core_quota
 from src.datasets.Datasets import get_amlb_dataset, construct_dataframe
 from src.feature_engineering.AutoGluon.AutoGluon import get_autogluon_features
 from src.feature_engineering.BioAutoML.BioAutoML import get_bioautoml_features
@@ -48,6 +49,8 @@ def main():
 
     feature_engineering_methods = ["autofeat", "autogluon", "bioautoml", "boruta", "correlationbased", "featuretools",
                                    "featurewiz", "h2o", "macfe", "mafese", "mljar", "openfe"]
+    # Core quota of this run, inherited by the pynisher subprocesses of the methods
+    set_core_quota(get_available_cores())
     for task_id in amlb_task_ids:
         run_and_save(feature_engineering_methods, task_id)
 
@@ -194,7 +197,7 @@ def get_and_save_features(df_times, train_x, train_y, test_x, test_y, name, meth
         fe = limit(get_openFE_features, wall_time=(4, "h"), memory=(32, "GB"))
         try:
             start_time = time.time()  #
-            train_x, test_x = fe(train_x, train_y, test_x, 1)
+            train_x, test_x = fe(train_x, train_y, test_x, -1)  # n_jobs, -1 for the core quota
             end_time = time.time()  #
             execution_time = end_time - start_time
             df = construct_dataframe(train_x, train_y, test_x, test_y)
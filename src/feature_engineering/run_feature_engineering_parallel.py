@@ -6,7 +6,13 @@ import pandas as pd
 from pynisher import limit, WallTimeoutException, MemoryLimitException
 
 # wrong path because of setting home directory in batch script, please do not change
+from src.amltk.evaluation.Profiling import SampledCall, TraceRecorder
+from src.amltk.resources.Cores import get_available_cores, set_core_quota
+from src.amltk.resources.TimeBudget import CPUTimer
 from src.datasets.Datasets import get_amlb_dataset, construct_dataframe
+from src.datasets.FeatureStore import artifact_dir, base_method, get_artifact_path, get_meta, save_features
+from src.datasets.Manifest import add_to_manifest, get_task_type, read_manifest
+from src.datasets.Synthetic import get_synthetic_task
 from src.feature_engineering.autofeat.Autofeat import get_autofeat_features
 from src.feature_engineering.AutoGluon.AutoGluon import get_autogluon_features
 from src.feature_engineering.BioAutoML.BioAutoML import get_bioautoml_features
@@ -23,29 +29,99 @@ from src.feature_engineering.OpenFE.OpenFE import get_openFE_features
 
 def main(args):
     task_id = args.method
+    # Core quota of this task, inherited by the pynisher subprocesses of the methods
+    set_core_quota(get_available_cores())
     feature_engineering_methods = ["autofeat", "autogluon", "bioautoml", "boruta", "correlationbased", "featuretools",
                                    "featurewiz", "h2o", "macfe", "mafese", "mljar", "openfe"]
-    run_and_save(feature_engineering_methods, task_id)
+    run_and_save(feature_engineering_methods, task_id, args.profile)
 
 
-def run_and_save(feature_engineering_methods, task_id):
-    train_x, train_y, test_x, test_y, name, task_hint = get_amlb_dataset(task_id)
-    df = construct_dataframe(train_x, train_y, test_x, test_y)
-    df.to_csv('src/datasets/feature_engineered_datasets/' + task_hint + "_" + name + '_original.csv', index=False)
+def run_and_save(feature_engineering_methods, task_id, profile=False):
+    # Spans of the stages, written to the artifact directory of the dataset once its name is known
+    trace = TraceRecorder(artifact_dir / f"task_{task_id}_trace.json" if profile else None)
+    with trace.span("load dataset", task_id=task_id):
+        if str(task_id).startswith("synthetic"):
+            train_x, train_y, test_x, test_y, name, task_hint = get_synthetic_task(task_id)
+        else:
+            train_x, train_y, test_x, test_y, name, task_hint = get_amlb_dataset(task_id)
+    trace.move(artifact_dir / name / "trace.json")
+    # Base of the delta artifacts of all methods, which only store the columns they changed.
+    # Written once, rewriting it could change the base of existing delta artifacts
+    base_path = get_artifact_path(name, base_method, 0)
+    if get_meta(base_path) is None:
+        with trace.span("save features", method=base_method):
+            save_features(train_x, test_x, name, base_method, 0, 0, train_y=train_y, test_y=test_y)
+    if not any(entry["dataset"] == name and entry["method"] == base_method for entry in read_manifest()):
+        add_to_manifest(base_path, get_task_type(task_hint, train_y))
     df_times = pd.DataFrame()
     for method in feature_engineering_methods:
-        if not os.path.isfile('src/datasets/feature_engineered_datasets/' + task_hint + '_' + name + '_' + method + '.csv'):
-            df_times = get_and_save_features(df_times, train_x, train_y, test_x, test_y, name, method, task_hint)
+        done = get_meta(get_artifact_path(name, method, 0)) is not None
+        failed = False
+        csv_path = 'src/datasets/feature_engineered_datasets/' + task_hint + '_' + name + '_' + method + '.csv'
+        if not done and os.path.isfile(csv_path):
+            # An empty CSV marks a method that failed before, a full one was written by earlier versions
+            df = read_legacy_features(csv_path)
+            failed = df.empty
+            if not failed and len(df) == len(train_x) + len(test_x):
+                with trace.span("import features", method=method):
+                    import_legacy_features(df, len(train_x), name, method, task_hint)
+                done = True
+            elif not failed:
+                print(f"The rows of {csv_path} do not match the dataset, computing the {method} features again")
+        if not done and not failed:
+            with trace.span(method, category="feature engineering", dataset=name):
+                df_times = get_and_save_features(
+                    df_times, train_x, train_y, test_x, test_y, name, method, task_hint, trace
+                )
     df_times.to_csv('src/datasets/feature_engineered_datasets/exec_times.csv', index=False)
 
 
-def get_and_save_features(df_times, train_x, train_y, test_x, test_y, name, method, task_hint):
+def read_legacy_features(csv_path) -> pd.DataFrame:
+    """The full CSV copy of a dataset written by earlier versions, empty for the marker of a failed method."""
+    try:
+        return pd.read_csv(csv_path)
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame()
+
+
+def import_legacy_features(df, n_train, name, method, task_hint):
+    """Store a full CSV copy of earlier versions (train rows, then test rows, the target last) as artifact.
+
+    The execution time is taken from exec_times.csv if it still holds the method, the CPU time
+    is unknown, so the time budget charges the wall time (see TimeBudget).
+    """
+    execution_time = 0
+    times_path = 'src/datasets/feature_engineered_datasets/exec_times.csv'
+    if os.path.isfile(times_path):
+        df_times = read_legacy_features(times_path)
+        if {'Dataset', 'Method', 'Time'} <= set(df_times.columns):
+            times = df_times[(df_times['Dataset'] == name) & (df_times['Method'] == method)]['Time']
+            if not times.empty:
+                execution_time = times.iloc[-1]
+    print(f"Importing the {method} features of {name} from the CSV of an earlier version")
+    x, y = df.iloc[:, :-1], df.iloc[:, -1]
+    path = save_features(x.iloc[:n_train], x.iloc[n_train:], name, method, 0, execution_time,
+                         train_y=y.iloc[:n_train], test_y=y.iloc[n_train:])
+    add_to_manifest(path, get_task_type(task_hint, y))
+    return path
+
+
+def get_and_save_features(df_times, train_x, train_y, test_x, test_y, name, method, task_hint, trace=None):
     execution_time = 0
     df = None
+    trace = TraceRecorder() if trace is None else trace
+
+    def profiled(fe_function):
+        # Samples the stacks inside the pynisher subprocess, for a flamegraph of the method
+        if not trace.enabled:
+            return fe_function
+        return SampledCall(fe_function, get_artifact_path(name, method, 0) / "profile.folded")
+    # The methods run in pynisher subprocesses, which are included with the processes they start
+    cpu_timer = CPUTimer().start()
 
     if method == "autofeat":
         try:
-            fe = limit(get_autofeat_features, wall_time=(4, "h"), memory=(32, "GB"))
+            fe = limit(profiled(get_autofeat_features), wall_time=(4, "h"), memory=(32, "GB"))
             start_time = time.time()  #
             train_x, test_x = fe(train_x, train_y, test_x, task_hint, 2, 5)
             end_time = time.time()  #
@@ -56,7 +132,7 @@ def get_and_save_features(df_times, train_x, train_y, test_x, test_y, name, meth
 
     elif method == "autogluon":
         try:
-            fe = limit(get_autogluon_features, wall_time=(4, "h"), memory=(32, "GB"))
+            fe = limit(profiled(get_autogluon_features), wall_time=(4, "h"), memory=(32, "GB"))
             start_time = time.time()  #
             train_x, test_x = fe(train_x, train_y, test_x)
             end_time = time.time()  #
@@ -68,7 +144,7 @@ def get_and_save_features(df_times, train_x, train_y, test_x, test_y, name, meth
     elif method == "bioautoml":
         estimations = 50
         try:
-            fe = limit(get_bioautoml_features, wall_time=(4, "h"), memory=(32, "GB"))
+            fe = limit(profiled(get_bioautoml_features), wall_time=(4, "h"), memory=(32, "GB"))
             start_time = time.time()  #
             train_x, test_x = fe(train_x, train_y, test_x, estimations)
             end_time = time.time()  #
@@ -79,7 +155,7 @@ def get_and_save_features(df_times, train_x, train_y, test_x, test_y, name, meth
 
     elif method == "boruta":
         try:
-            fe = limit(get_boruta_features, wall_time=(4, "h"), memory=(32, "GB"))
+            fe = limit(profiled(get_boruta_features), wall_time=(4, "h"), memory=(32, "GB"))
             start_time = time.time()  #
             train_x, test_x = fe(train_x, train_y, test_x)
             end_time = time.time()  #
@@ -90,7 +166,7 @@ def get_and_save_features(df_times, train_x, train_y, test_x, test_y, name, meth
 
     elif method == "correlationBasedFS":
         try:
-            fe = limit(get_correlationbased_features, wall_time=(4, "h"), memory=(32, "GB"))
+            fe = limit(profiled(get_correlationbased_features), wall_time=(4, "h"), memory=(32, "GB"))
             start_time = time.time()  #
             train_x, test_x = fe(train_x, train_y, test_x)
             end_time = time.time()  #
@@ -101,7 +177,7 @@ def get_and_save_features(df_times, train_x, train_y, test_x, test_y, name, meth
 
     elif method == "featuretools":
         try:
-            fe = limit(get_featuretools_features, wall_time=(4, "h"), memory=(32, "GB"))
+            fe = limit(profiled(get_featuretools_features), wall_time=(4, "h"), memory=(32, "GB"))
             start_time = time.time()  #
             train_x, test_x = fe(train_x, train_y, test_x, test_y, name)
             end_time = time.time()  #
@@ -112,7 +188,7 @@ def get_and_save_features(df_times, train_x, train_y, test_x, test_y, name, meth
 
     elif method == "featurewiz":
         try:
-            fe = limit(get_featurewiz_features, wall_time=(4, "h"), memory=(32, "GB"))
+            fe = limit(profiled(get_featurewiz_features), wall_time=(4, "h"), memory=(32, "GB"))
             start_time = time.time()  #
             train_x, test_x = fe(train_x, train_y, test_x)
             end_time = time.time()  #
@@ -123,7 +199,7 @@ def get_and_save_features(df_times, train_x, train_y, test_x, test_y, name, meth
 
     elif method == "h2o":
         try:
-            fe = limit(get_h2o_features, wall_time=(4, "h"), memory=(32, "GB"))
+            fe = limit(profiled(get_h2o_features), wall_time=(4, "h"), memory=(32, "GB"))
             start_time = time.time()  #
             train_x, test_x = fe(train_x, train_y, test_x)
             end_time = time.time()  #
@@ -134,7 +210,7 @@ def get_and_save_features(df_times, train_x, train_y, test_x, test_y, name, meth
 
     elif method == "macfe":
         try:
-            fe = limit(get_macfe_features, wall_time=(4, "h"), memory=(32, "GB"))
+            fe = limit(profiled(get_macfe_features), wall_time=(4, "h"), memory=(32, "GB"))
             start_time = time.time()  #
             train_x, test_x = fe(train_x, train_y, test_x, test_y, name)
             end_time = time.time()  #
@@ -146,7 +222,7 @@ def get_and_save_features(df_times, train_x, train_y, test_x, test_y, name, meth
     elif method == "mafese":
         num_features = 50
         try:
-            fe = limit(get_mafese_features, wall_time=(4, "h"), memory=(32, "GB"))
+            fe = limit(profiled(get_mafese_features), wall_time=(4, "h"), memory=(32, "GB"))
             start_time = time.time()  #
             train_x, test_x = fe(train_x, train_y, test_x, test_y, name, num_features)
             end_time = time.time()  #
@@ -158,7 +234,7 @@ def get_and_save_features(df_times, train_x, train_y, test_x, test_y, name, meth
     elif method == "mljar":
         num_features = 50
         try:
-            fe = limit(get_mljar_features, wall_time=(4, "h"), memory=(32, "GB"))
+            fe = limit(profiled(get_mljar_features), wall_time=(4, "h"), memory=(32, "GB"))
             start_time = time.time()  #
             train_x, test_x = fe(train_x, train_y, test_x, num_features)
             end_time = time.time()  #
@@ -169,22 +245,37 @@ def get_and_save_features(df_times, train_x, train_y, test_x, test_y, name, meth
 
     elif method == "openfe":
         try:
-            fe = limit(get_openFE_features, wall_time=(4, "h"), memory=(32, "GB"))
+            fe = limit(profiled(get_openFE_features), wall_time=(4, "h"), memory=(32, "GB"))
             start_time = time.time()  #
-            train_x, test_x = fe(train_x, train_y, test_x, 1)
+            train_x, test_x = fe(train_x, train_y, test_x, -1)  # n_jobs, -1 for the core quota
             end_time = time.time()  #
             execution_time = end_time - start_time
             df = construct_dataframe(train_x, train_y, test_x, test_y)
         except (WallTimeoutException, MemoryLimitException):
             df = pd.DataFrame()
 
-    df.to_csv('src/datasets/feature_engineered_datasets/' + task_hint + '_' + name + '_' + method + '.csv', index=False)
-    df_times = df_times._append({'Dataset': name, 'Method': method, 'Time': execution_time}, ignore_index=True)
+    cpu_time = cpu_timer.stop()
+    if not df.empty:
+        with trace.span("save features", method=method):
+            # amlb datasets use outer fold 0
+            path = save_features(
+                train_x, test_x, name, method, 0, execution_time, train_y=train_y, test_y=test_y, cpu_time=cpu_time
+            )
+            add_to_manifest(path, get_task_type(task_hint, train_y))
+    else:
+        # An empty file marks a method that failed on the dataset, so it is not run again
+        df.to_csv('src/datasets/feature_engineered_datasets/' + task_hint + '_' + name + '_' + method + '.csv', index=False)
+    df_times = df_times._append({'Dataset': name, 'Method': method, 'Time': execution_time, 'CPU Time': cpu_time},
+                                ignore_index=True)
     return df_times
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Run feature engineering methods')
-    parser.add_argument('--method', type=str, required=True, help='Feature engineering method to use')
+    parser.add_argument('--method', type=str, required=True,
+                        help='OpenML task id of the AMLB dataset, or a synthetic task like "synthetic:104" or '
+                             '"synthetic:n_samples=100000,n_features=1000"')
+    parser.add_argument('--profile', action='store_true',
+                        help='Write a Chrome trace of the stages and a flamegraph of every method to the artifacts')
     args = parser.parse_args()
     main(args)
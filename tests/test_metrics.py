@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from sklearn.metrics import log_loss, roc_auc_score, root_mean_squared_error
+
+from src.amltk.evaluation.Metrics import log_loss_score, rmse_score, roc_auc_ovo_score, roc_auc_ovo_split_scores
+
+
+@pytest.mark.parametrize("n_classes", [2, 3, 5])
+def test_roc_auc_ovo_score_matches_sklearn(n_classes):
+    rng = np.random.default_rng(n_classes)
+    y_true = rng.integers(n_classes, size=500)
+    # Rounded scores, so there are ties
+    y_score = np.round(rng.dirichlet(np.ones(n_classes), size=500), 2)
+    y_score /= y_score.sum(axis=1, keepdims=True)
+    if n_classes == 2:
+        expected = roc_auc_score(y_true, y_score[:, 1])
+        assert roc_auc_ovo_score(y_true, y_score[:, 1]) == pytest.approx(expected, abs=1e-12)
+    else:
+        expected = roc_auc_score(y_true, y_score, multi_class="ovo")
+        assert roc_auc_ovo_score(y_true, y_score) == pytest.approx(expected, abs=1e-12)
+
+
+def test_roc_auc_ovo_split_scores_match_sklearn():
+    rng = np.random.default_rng(0)
+    y_true = rng.integers(3, size=600)
+    y_score = rng.dirichlet(np.ones(3), size=600)
+    splits = np.repeat(np.arange(3), 200)
+    expected = [roc_auc_score(y_true[splits == i], y_score[splits == i], multi_class="ovo") for i in range(3)]
+    np.testing.assert_allclose(roc_auc_ovo_split_scores(y_true, y_score, splits), expected, atol=1e-12)
+
+
+@pytest.mark.parametrize("n_classes", [2, 3, 5])
+def test_log_loss_score_matches_sklearn(n_classes):
+    rng = np.random.default_rng(n_classes)
+    y_true = rng.integers(n_classes, size=500)
+    y_pred = rng.dirichlet(np.ones(n_classes), size=500)
+    if n_classes == 2:
+        expected = log_loss(y_true, y_pred[:, 1])
+        assert log_loss_score(y_true, y_pred[:, 1]) == pytest.approx(expected, abs=1e-12)
+    else:
+        expected = log_loss(y_true, y_pred)
+        assert log_loss_score(y_true, y_pred) == pytest.approx(expected, abs=1e-12)
+
+
+def test_rmse_score_matches_sklearn():
+    rng = np.random.default_rng(0)
+    y_true = rng.normal(size=500)
+    y_pred = y_true + rng.normal(scale=0.5, size=500)
+    assert rmse_score(y_true, y_pred) == pytest.approx(root_mean_squared_error(y_true, y_pred), abs=1e-12)
@@ -0,0 +1,18 @@
+import pytest
+from amltk import Component, Sequential
+from sklearn.tree import DecisionTreeClassifier, DecisionTreeRegressor
+
+from src.amltk.evaluation.Evaluator import get_evaluator
+from src.datasets.Synthetic import get_synthetic_dataset, synthetic_options
+
+
+@pytest.mark.parametrize("option", [101, 124, 125])
+def test_evaluator_from_synthetic_option(option, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    kwargs = dict(synthetic_options[option], n_samples=1_000, n_features=20)
+    train_x, train_y, test_x, test_y, name, task_hint = get_synthetic_dataset(**kwargs)
+    estimator = DecisionTreeRegressor if task_hint == "regression" else DecisionTreeClassifier
+    pipeline = Sequential(Component(estimator, space={"max_depth": (1, 5)}))
+    evaluator = get_evaluator(pipeline, train_x, train_y, test_x, test_y, inner_fold_seed=0,
+                              on_trial_exception="raise", task_hint=task_hint)
+    assert evaluator.task_type == ("continuous" if option == 125 else "binary" if option == 101 else "multiclass")
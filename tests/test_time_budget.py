@@ -0,0 +1,40 @@
+import hashlib
+import threading
+import time
+
+import pytest
+
+from src.amltk.resources.TimeBudget import CPUTimer, TimeBudget, get_node_speed
+
+
+def burn(seconds):
+    # hashlib releases the GIL on large buffers, so the threads run in parallel on several cores
+    data = bytes(2 ** 20)
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        hashlib.sha256(data).digest()
+
+
+def test_fe_charge_is_cpu_time_per_core_of_the_quota():
+    n_threads = 4
+    threads = [threading.Thread(target=burn, args=(0.5,)) for _ in range(n_threads)]
+    start_time = time.time()
+    with CPUTimer(interval=0.1) as cpu_timer:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    execution_time = time.time() - start_time
+    assert cpu_timer.cpu_time > 0.4
+
+    entry = {"cpu_time": cpu_timer.cpu_time, "node_speed": get_node_speed(), "core_quota": n_threads,
+             "execution_time": execution_time}
+    charge = TimeBudget().get_fe_charge(entry)
+    assert charge == pytest.approx(cpu_timer.cpu_time / n_threads)
+    # A loaded node stretches the wall clock time, not the charge
+    assert TimeBudget().get_fe_charge({**entry, "execution_time": 10 * execution_time}) == charge
+
+
+def test_fe_charge_without_core_quota_is_wall_time():
+    entry = {"cpu_time": 40.0, "node_speed": get_node_speed(), "core_quota": None, "execution_time": 25.0}
+    assert TimeBudget().get_fe_charge(entry) == 25.0